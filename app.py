@@ -23,7 +23,20 @@ def create_app(config_class=Config):
     login_manager.login_message_category = 'info'
     
     # Import models to ensure they're registered with SQLAlchemy
-    from models import portfolio, product, order, user
+    from models import (portfolio, product, order, user, metrics, analytics, job, webhook, cart, stock, blob,
+                        rate_limit, newsletter)
+    
+    # Opt-in query instrumentation
+    from services.instrumentation import init_instrumentation
+    init_instrumentation(app)
+    
+    # Prometheus metrics
+    from services.metrics import init_metrics
+    init_metrics(app)
+    
+    # Fingerprinted static assets
+    from services.assets import init_assets
+    init_assets(app)
     
     # User loader for Flask-Login
     @login_manager.user_loader
@@ -46,6 +59,32 @@ def create_app(config_class=Config):
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     
+    # CLI commands
+    from services.catalog import catalog_cli
+    from services.counters import metrics_cli
+    from services.analytics import analytics_cli
+    from services.jobs import jobs_cli
+    from services.webhooks import webhooks_cli
+    from services.cart import cart_cli
+    from services.stock import stock_cli
+    from services.blobs import blobs_cli
+    from services.images import images_cli
+    from services.assets import assets_cli
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(metrics_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(webhooks_cli)
+    app.cli.add_command(cart_cli)
+    app.cli.add_command(stock_cli)
+    app.cli.add_command(blobs_cli)
+    app.cli.add_command(images_cli)
+    app.cli.add_command(assets_cli)
+    
+    # Template helpers
+    from services.images import image_sources
+    app.add_template_global(image_sources)
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found_error(error):
@@ -0,0 +1,81 @@
+"""Benchmark catalog search and suggestion latency on synthetic catalogs.
+
+Usage: python benchmarks/bench_search.py [sizes...]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.search import SearchIndex, SuggestIndex  # noqa: E402
+
+WORDS = (
+    'retrato acuarela ilustracion logo marca identidad diseno web print poster '
+    'familia mascota boda lienzo digital minimalista vintage color tipografia '
+    'packaging editorial infantil botanica paisaje urbano retro moderno grafico '
+    'portrait watercolor illustration brand identity design poster custom pet'
+).split()
+CATEGORIES = ['portraits', 'branding', 'design', 'print', 'illustration', 'web']
+QUERIES = ['retrato', 'logo marca', 'acu', 'diseno web', 'pet portrait', 'vint', 'zzz']
+PREFIXES = ['r', 're', 'retr', 'logo ma', 'acuarela bo', 'x']
+
+
+class Item:
+    def __init__(self, item_id):
+        self.id = item_id
+
+
+def synthetic_documents(size, rng):
+    for item_id in range(size):
+        kind = 'product' if item_id % 2 else 'portfolio'
+        yield kind, Item(item_id), {
+            'title': ' '.join(rng.choices(WORDS, k=3)) + f' {item_id}',
+            'description': ' '.join(rng.choices(WORDS, k=20)),
+            'category': rng.choice(CATEGORIES)
+        }
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def run(size, repeat=50):
+    documents = list(synthetic_documents(size, random.Random(size)))
+    start = time.perf_counter()
+    index = SearchIndex(documents)
+    build = time.perf_counter() - start
+
+    print(f'{size:>8} rows  build {build:.2f}s  terms {len(index.terms)}')
+    for query in QUERIES:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            scores = index.match(query)
+            index.rank(scores, limit=12)
+            samples.append((time.perf_counter() - start) * 1000)
+        print(f'    {query!r:<16} hits {len(scores):>7}  '
+              f'p50 {statistics.median(samples):7.2f}ms  p99 {percentile(samples, 99):7.2f}ms')
+
+
+    start = time.perf_counter()
+    suggest = SuggestIndex((kind, item, fields['title']) for kind, item, fields in documents)
+    build = time.perf_counter() - start
+    print(f'{size:>8} rows  suggest build {build:.2f}s  keys {len(suggest.keys)}')
+    for prefix in PREFIXES:
+        samples = []
+        for _ in range(repeat * 10):
+            start = time.perf_counter()
+            results = suggest.suggest(prefix)
+            samples.append((time.perf_counter() - start) * 1000)
+        print(f'    {prefix!r:<16} hits {len(results):>7}  '
+              f'p50 {statistics.median(samples):7.3f}ms  p99 {percentile(samples, 99):7.3f}ms')
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for size in sizes:
+        run(size)
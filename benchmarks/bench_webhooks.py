@@ -0,0 +1,116 @@
+"""Replay signed Stripe webhook events against the ingest endpoint.
+
+Seeds pending orders in a throwaway SQLite database, posts a burst of
+payment events (with a share of redeliveries) to /shop/webhook, then
+applies them with the batch job and checks every order was paid once.
+
+Usage: python benchmarks/bench_webhooks.py [events] [--duplicates 0.2]
+       python benchmarks/bench_webhooks.py 5000 --url http://localhost:8000 --secret whsec_...
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SECRET = 'whsec_bench'
+
+
+def sign(payload, secret):
+    timestamp = int(time.time())
+    digest = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+def synthetic_events(count, duplicates, rng):
+    events = [json.dumps({
+        'id': f'evt_bench_{index}',
+        'type': 'payment_intent.succeeded',
+        'data': {'object': {'id': f'pi_bench_{index}', 'object': 'payment_intent'}}
+    }) for index in range(count)]
+    redeliveries = rng.sample(events, int(count * duplicates))
+    replay = events + redeliveries
+    rng.shuffle(replay)
+    return replay
+
+
+def replay_remote(url, payloads, secret, concurrency):
+    import requests
+
+    session = requests.Session()
+
+    def post(payload):
+        response = session.post(f'{url}/shop/webhook', data=payload,
+                                headers={'Stripe-Signature': sign(payload, secret)})
+        return response.status_code
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(post, payloads))
+
+
+def run(count, duplicates, url=None, secret=SECRET, concurrency=8):
+    payloads = synthetic_events(count, duplicates, random.Random(count))
+
+    if url:
+        start = time.perf_counter()
+        statuses = replay_remote(url, payloads, secret, concurrency)
+        elapsed = time.perf_counter() - start
+        print(f'{len(payloads)} events  {len(payloads) / elapsed:8.0f}/s  '
+              f'non-2xx {sum(status >= 300 for status in statuses)}')
+        return
+
+    from app import create_app, db
+    from config import TestingConfig
+    from models.order import Order
+    from services.webhooks import apply_pending_events
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        CATALOG_GENERATION_FILE = os.path.join(tempfile.mkdtemp(), 'catalog.generation')
+        STRIPE_WEBHOOK_SECRET = secret
+        METRICS_ENABLED = False
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(Order(customer_name='Bench', customer_email='bench@example.com',
+                                 total_amount=10, stripe_payment_intent_id=f'pi_bench_{index}')
+                           for index in range(count))
+        db.session.commit()
+
+    client = app.test_client()
+    start = time.perf_counter()
+    results = {}
+    for payload in payloads:
+        response = client.post('/shop/webhook', data=payload,
+                               headers={'Stripe-Signature': sign(payload, secret)})
+        result = response.get_json().get('result', response.status_code)
+        results[result] = results.get(result, 0) + 1
+    ingest = time.perf_counter() - start
+    print(f'ingest  {len(payloads)} events  {len(payloads) / ingest:8.0f}/s  {results}')
+
+    with app.app_context():
+        start = time.perf_counter()
+        applied = apply_pending_events()
+        db.session.commit()
+        elapsed = time.perf_counter() - start
+        paid = Order.query.filter_by(payment_status='paid').count()
+        print(f'apply   {applied} events  {applied / elapsed:8.0f}/s  paid orders {paid}/{count}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('events', nargs='?', type=int, default=5000)
+    parser.add_argument('--duplicates', type=float, default=0.2, help='Share of events redelivered.')
+    parser.add_argument('--url', help='Replay against a running server instead of in-process.')
+    parser.add_argument('--secret', default=SECRET, help='Webhook signing secret (with --url).')
+    parser.add_argument('--concurrency', type=int, default=8, help='Parallel senders (with --url).')
+    args = parser.parse_args()
+    run(args.events, args.duplicates, args.url, args.secret, args.concurrency)
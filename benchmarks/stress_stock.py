@@ -0,0 +1,113 @@
+"""Stress concurrent checkout of the last units of a physical product.
+
+Many threads (optionally across several processes) each put one unit in
+their cart and create a payment intent against a throwaway SQLite
+database with the fake payment gateway. Exactly ``stock`` checkouts must
+succeed and stock must end at zero.
+
+Usage: python benchmarks/stress_stock.py [--stock 5] [--threads 32] [--processes 1]
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from config import TestingConfig  # noqa: E402
+
+WORKDIR = tempfile.mkdtemp()
+
+
+class StressConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(WORKDIR, 'stress.db')
+    CATALOG_GENERATION_FILE = os.path.join(WORKDIR, 'catalog.generation')
+    STOCK_GENERATION_FILE = os.path.join(WORKDIR, 'stock.generation')
+    METRICS_ENABLED = False
+    CART_STORE = 'database'
+    # One connection per checkout thread, as each gunicorn worker would have
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 128, 'max_overflow': 0}
+
+
+def setup(stock):
+    from models.product import Product
+
+    app = create_app(StressConfig)
+    with app.app_context():
+        db.create_all()
+        product = Product(name='Limited print', price=40, image_url='x', category='print',
+                          digital_product=False, stock_quantity=stock)
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+
+def checkout(client, barrier, results):
+    barrier.wait()
+    start = time.perf_counter()
+    response = client.post('/shop/create-payment-intent',
+                           json={'name': 'Stress', 'email': 'stress@example.com'})
+    results.append((response.status_code, time.perf_counter() - start))
+
+
+def run_process(product_id, threads, barrier, queue):
+    app = create_app(StressConfig)
+    results = []
+    clients = [app.test_client() for _ in range(threads)]
+    for client in clients:
+        client.post('/shop/add_to_cart', json={'product_id': product_id, 'quantity': 1})
+    workers = [threading.Thread(target=checkout, args=(client, barrier, results))
+               for client in clients]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    queue.put(results)
+
+
+def main(stock, threads, processes):
+    product_id = setup(stock)
+    barrier = multiprocessing.Barrier(threads * processes)
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_process, args=(product_id, threads, barrier, queue))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    results = [result for _ in workers for result in queue.get()]
+    for worker in workers:
+        worker.join()
+
+    from models.product import Product
+    from models.stock import StockReservation
+
+    app = create_app(StressConfig)
+    with app.app_context():
+        remaining = db.session.get(Product, product_id).stock_quantity
+        held = db.session.query(db.func.coalesce(db.func.sum(StockReservation.quantity), 0))\
+                         .filter_by(status='held').scalar()
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = sorted(elapsed * 1000 for _, elapsed in results)
+    print(f'{len(results)} checkouts for {stock} units: {statuses}')
+    print(f'stock left {remaining}  units held {held}  '
+          f'latency p50 {statistics.median(latencies):.1f}ms  max {latencies[-1]:.1f}ms')
+
+    sold = statuses.get(200, 0)
+    assert sold == stock and remaining == 0 and held == stock, 'oversold or undersold'
+    print('OK: no oversell')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stock', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=32, help='Concurrent checkouts per process.')
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+    main(args.stock, args.threads, args.processes)
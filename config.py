@@ -17,10 +17,54 @@ class Config:
     # Stripe configuration
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
+    # Per-call timeout (seconds) and network retries (with backoff) for Stripe
+    STRIPE_TIMEOUT = float(os.environ.get('STRIPE_TIMEOUT') or 10)
+    STRIPE_MAX_RETRIES = int(os.environ.get('STRIPE_MAX_RETRIES') or 2)
+    STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_WEBHOOK_TOLERANCE = 300  # max signature age in seconds
+    # Webhook events are applied to orders in batches by the job worker
+    WEBHOOK_BATCH_WINDOW = 1.0
+    WEBHOOK_BATCH_SIZE = 500
+    # Events whose order is not found yet are retried (job backoff) this many
+    # times before being dead-lettered
+    WEBHOOK_MAX_ATTEMPTS = 8
+    # 'stripe' or 'fake' (in-memory gateway for tests and local development)
+    PAYMENT_GATEWAY = os.environ.get('PAYMENT_GATEWAY', 'stripe')
     
     # Upload configuration
     UPLOAD_FOLDER = os.path.join(basedir, 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    CUSTOMER_IMAGE_MAX_SIZE = 5 * 1024 * 1024  # reference photos for portraits
+    CUSTOMER_IMAGE_THUMBNAIL_SIZE = 400  # px, longest side
+    # Content-addressed store for customer images: 'local' (BLOB_STORE_DIR),
+    # 's3' (any S3-compatible endpoint, needs boto3) or 'memory'
+    BLOB_STORE = os.environ.get('BLOB_STORE', 'local')
+    BLOB_STORE_DIR = os.environ.get('BLOB_STORE_DIR') or os.path.join(basedir, 'instance', 'blobs')
+    BLOB_S3_BUCKET = os.environ.get('BLOB_S3_BUCKET')
+    BLOB_S3_PREFIX = os.environ.get('BLOB_S3_PREFIX', 'blobs/')
+    BLOB_S3_ENDPOINT_URL = os.environ.get('BLOB_S3_ENDPOINT_URL')
+    BLOB_ORPHAN_TTL = 24 * 3600  # seconds an unreferenced blob is kept before purge
+    # Let the web server send downloads: 'x-accel-redirect' (nginx, via an
+    # internal location at BLOB_ACCEL_PREFIX) or 'x-sendfile' (local store only)
+    BLOB_DOWNLOAD_OFFLOAD = os.environ.get('BLOB_DOWNLOAD_OFFLOAD') or None
+    BLOB_ACCEL_PREFIX = os.environ.get('BLOB_ACCEL_PREFIX', '/_blobs/')
+    BLOB_DOWNLOAD_MAX_AGE = 24 * 3600  # private browser cache for downloaded images
+    
+    # Responsive images: widths (px) and formats, in order of preference, of the
+    # derivatives generated for local product/portfolio images by `flask images
+    # derive` (formats this Pillow build cannot encode are skipped)
+    IMAGE_WIDTHS = (320, 640, 960, 1280)
+    IMAGE_FORMATS = ('avif', 'webp')
+    IMAGE_QUALITY = 80
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 0) or None  # default: CPU count
+    
+    # Static assets: asset_url() links to content-hashed URLs under ASSET_URL_PREFIX,
+    # cached for a year; the manifest is written by `flask assets build` (or
+    # built at startup when the file is missing)
+    ASSET_FINGERPRINTING = True
+    ASSET_URL_PREFIX = '/assets'
+    ASSET_MANIFEST_FILE = os.environ.get('ASSET_MANIFEST_FILE') or os.path.join(basedir, 'instance', 'assets.json')
+    ASSET_EXCLUDE = ('uploads', 'derivatives')  # top-level static dirs that are not assets
     
     # Email configuration (for contact form)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
@@ -28,17 +72,86 @@ class Config:
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    MAIL_TIMEOUT = 30
+    # Address that receives contact form inquiries
+    CONTACT_EMAIL = os.environ.get('CONTACT_EMAIL') or os.environ.get('MAIL_USERNAME')
+    # Contact form submissions allowed per client IP: (count, window in seconds)
+    CONTACT_RATE_LIMIT = (5, 3600)
+    # Newsletter signups allowed per client IP: (count, window in seconds)
+    NEWSLETTER_RATE_LIMIT = (5, 3600)
+    # Customer image uploads allowed per client IP: (count, window in seconds)
+    UPLOAD_RATE_LIMIT = (20, 3600)
+    # Seconds between purges of expired rate limit counters (0 disables)
+    RATE_LIMIT_PURGE_INTERVAL = 3600
     
     TEMPLATES_AUTO_RELOAD = True
 
+    # Server-side carts: 'database' (shared by all workers) or 'memory'
+    # (single process only); idle carts are removed by `flask cart purge`
+    CART_STORE = os.environ.get('CART_STORE', 'database')
+    CART_TTL_DAYS = 30
+
+    # Seconds checkout holds physical stock for an unpaid order
+    STOCK_RESERVATION_TTL = 30 * 60
+    # New stock-holding orders allowed per client IP: (count, window in seconds)
+    STOCK_HOLD_RATE_LIMIT = (10, 3600)
+
+    # Background jobs (flask jobs work): idle poll interval, seconds before a
+    # running job is considered abandoned, and retry backoff bounds
+    JOB_POLL_INTERVAL = 1.0
+    JOB_TIMEOUT = 600
+    JOB_MAX_ATTEMPTS = 5
+    JOB_BACKOFF_BASE = 10
+    JOB_BACKOFF_MAX = 3600
+
+    # Seconds between the dashboard counter reconciliations workers schedule (0 disables)
+    METRICS_RECONCILE_INTERVAL = 6 * 3600
+
+    # Sales rollup refreshes re-read orders updated this many seconds before
+    # the last watermark, to catch transactions that committed late
+    ROLLUP_WATERMARK_OVERLAP = 300
+
+    # Catalog cache: file holding the generation counter shared by all workers
+    # (defaults to instance/catalog.generation)
+    CATALOG_GENERATION_FILE = os.environ.get('CATALOG_GENERATION_FILE')
+    # Stock changes advance their own counter (defaults to instance/stock.generation)
+    STOCK_GENERATION_FILE = os.environ.get('STOCK_GENERATION_FILE')
+    
+    # Search: number of recent suggestion queries kept per worker
+    SEARCH_SUGGEST_CACHE_SIZE = 512
+    SEARCH_SUGGEST_LIMIT = 8
+    
+    # Rendered page cache for anonymous visitors: memory, filesystem, redis or null
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND') or 'memory'
+    PAGE_CACHE_SIZE = 256  # max entries for the memory and filesystem backends
+    PAGE_CACHE_DIR = os.path.join(basedir, 'instance', 'page_cache')
+    PAGE_CACHE_REDIS_URL = os.environ.get('PAGE_CACHE_REDIS_URL')
+    PAGE_CACHE_TIMEOUT = 3600
+    
+    # Per-request SQL instrumentation (query counts, Server-Timing, slow query log)
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', 'false').lower() in ['true', 'on', '1']
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS') or 100)
+    
+    # Prometheus metrics at /metrics, off by default; scrapers must send
+    # "Authorization: Bearer <METRICS_TOKEN>" or connect from METRICS_ALLOWED_IPS
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() in ['true', 'on', '1']
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_ALLOWED_IPS = tuple(ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',')
+                                if ip.strip())
+    
     # Pagination
     POSTS_PER_PAGE = 12
+    API_PAGE_SIZE = 50
+    API_MAX_PAGE_SIZE = 200
+    EXPORT_BATCH_SIZE = 1000
     
     # Security
     WTF_CSRF_ENABLED = True
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    ASSET_FINGERPRINTING = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app-dev.db')
 
@@ -51,6 +164,8 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    PAYMENT_GATEWAY = 'fake'
+    BLOB_STORE = 'memory'
 
 config = {
     'development': DevelopmentConfig,
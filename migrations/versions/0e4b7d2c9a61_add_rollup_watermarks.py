@@ -0,0 +1,32 @@
+"""store the sales rollup watermark as a timestamp
+
+Revision ID: 0e4b7d2c9a61
+Revises: f2c7a4e9b1d3
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0e4b7d2c9a61'
+down_revision = 'f2c7a4e9b1d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'rollup_watermarks' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('rollup_watermarks',
+            sa.Column('name', sa.String(length=64), nullable=False),
+            sa.Column('watermark', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('name')
+        )
+    # The old float watermark lived in metric_counters; without it the next
+    # refresh rebuilds every day once
+    op.execute(sa.text("DELETE FROM metric_counters WHERE key = 'rollup:watermark'"))
+
+
+def downgrade():
+    op.drop_table('rollup_watermarks')
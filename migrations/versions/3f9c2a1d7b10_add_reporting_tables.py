@@ -0,0 +1,56 @@
+"""add dashboard counter and sales rollup tables
+
+Revision ID: 3f9c2a1d7b10
+Revises: 
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a1d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases bootstrapped with db.create_all() may already have these
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'metric_counters' not in existing:
+        op.create_table('metric_counters',
+            sa.Column('key', sa.String(length=64), nullable=False),
+            sa.Column('value', sa.Float(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('key')
+        )
+
+    if 'daily_sales' not in existing:
+        op.create_table('daily_sales',
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('orders', sa.Integer(), nullable=False),
+            sa.Column('items', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('day')
+        )
+
+    if 'daily_product_sales' not in existing:
+        op.create_table('daily_product_sales',
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('product_name', sa.String(length=100), nullable=False),
+            sa.Column('category', sa.String(length=50), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('day', 'product_id')
+        )
+
+
+def downgrade():
+    op.drop_table('daily_product_sales')
+    op.drop_table('daily_sales')
+    op.drop_table('metric_counters')
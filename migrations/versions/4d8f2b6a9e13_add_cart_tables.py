@@ -0,0 +1,45 @@
+"""add server-side cart tables
+
+Revision ID: 4d8f2b6a9e13
+Revises: e7a3b9c1d4f2
+Create Date: 2026-10-16 10:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d8f2b6a9e13'
+down_revision = 'e7a3b9c1d4f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'carts' not in existing:
+        op.create_table('carts',
+            sa.Column('id', sa.String(length=64), nullable=False),
+            sa.Column('item_count', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_carts_updated_at', 'carts', ['updated_at'], unique=False)
+
+    if 'cart_items' not in existing:
+        op.create_table('cart_items',
+            sa.Column('cart_id', sa.String(length=64), nullable=False),
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['cart_id'], ['carts.id'], ),
+            sa.PrimaryKeyConstraint('cart_id', 'product_id')
+        )
+
+
+def downgrade():
+    op.drop_table('cart_items')
+    op.drop_index('ix_carts_updated_at', table_name='carts')
+    op.drop_table('carts')
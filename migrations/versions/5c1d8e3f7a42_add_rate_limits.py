@@ -0,0 +1,34 @@
+"""add rate limit counters
+
+Revision ID: 5c1d8e3f7a42
+Revises: 0e4b7d2c9a61
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d8e3f7a42'
+down_revision = '0e4b7d2c9a61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'rate_limits' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('rate_limits',
+        sa.Column('key', sa.String(length=128), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_rate_limits_expires_at', 'rate_limits', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_rate_limits_expires_at', table_name='rate_limits')
+    op.drop_table('rate_limits')
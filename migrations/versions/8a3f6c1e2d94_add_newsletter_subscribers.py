@@ -0,0 +1,33 @@
+"""add newsletter subscribers
+
+Revision ID: 8a3f6c1e2d94
+Revises: 5c1d8e3f7a42
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a3f6c1e2d94'
+down_revision = '5c1d8e3f7a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'newsletter_subscribers' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('newsletter_subscribers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=254), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email')
+    )
+
+
+def downgrade():
+    op.drop_table('newsletter_subscribers')
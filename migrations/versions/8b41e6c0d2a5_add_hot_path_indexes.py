@@ -0,0 +1,41 @@
+"""add indexes for hot lookup columns
+
+Revision ID: 8b41e6c0d2a5
+Revises: 3f9c2a1d7b10
+Create Date: 2026-10-16 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41e6c0d2a5'
+down_revision = '3f9c2a1d7b10'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_orders_customer_email_created_at', 'orders', ['customer_email', 'created_at']),
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at']),
+    ('ix_orders_payment_status_created_at', 'orders', ['payment_status', 'created_at']),
+    ('ix_orders_created_at', 'orders', ['created_at']),
+    ('ix_orders_updated_at', 'orders', ['updated_at']),
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+    ('ix_order_items_product_id', 'order_items', ['product_id']),
+    ('ix_product_category_is_available', 'product', ['category', 'is_available']),
+    ('ix_product_created_at_id', 'product', ['created_at', 'id']),
+    ('ix_portfolio_featured', 'portfolio', ['featured']),
+    ('ix_portfolio_category', 'portfolio', ['category']),
+    ('ix_portfolio_created_at_id', 'portfolio', ['created_at', 'id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,44 @@
+"""add stock reservations table
+
+Revision ID: 9a6c3e5f1b27
+Revises: 4d8f2b6a9e13
+Create Date: 2026-10-16 10:25:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a6c3e5f1b27'
+down_revision = '4d8f2b6a9e13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'stock_reservations' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('stock_reservations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stock_reservations_status_expires_at', 'stock_reservations',
+                    ['status', 'expires_at'], unique=False)
+    op.create_index('ix_stock_reservations_order_id', 'stock_reservations', ['order_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_stock_reservations_order_id', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_status_expires_at', table_name='stock_reservations')
+    op.drop_table('stock_reservations')
@@ -0,0 +1,38 @@
+"""add blobs table
+
+Revision ID: b3e8d1f6a2c4
+Revises: 9a6c3e5f1b27
+Create Date: 2026-10-16 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8d1f6a2c4'
+down_revision = '9a6c3e5f1b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'blobs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('blobs',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('thumbnail_key', sa.String(length=64), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_blobs_refcount_last_used_at', 'blobs', ['refcount', 'last_used_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_blobs_refcount_last_used_at', table_name='blobs')
+    op.drop_table('blobs')
@@ -0,0 +1,34 @@
+"""add retry columns to webhook events
+
+Revision ID: d6f1a9c3e8b5
+Revises: b3e8d1f6a2c4
+Create Date: 2026-10-16 10:35:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6f1a9c3e8b5'
+down_revision = 'b3e8d1f6a2c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('webhook_events')}
+    with op.batch_alter_table('webhook_events') as batch_op:
+        if 'attempts' not in columns:
+            batch_op.add_column(sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+        if 'retry_at' not in columns:
+            batch_op.add_column(sa.Column('retry_at', sa.DateTime(), nullable=True))
+        if 'last_error' not in columns:
+            batch_op.add_column(sa.Column('last_error', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('webhook_events') as batch_op:
+        batch_op.drop_column('last_error')
+        batch_op.drop_column('retry_at')
+        batch_op.drop_column('attempts')
@@ -0,0 +1,38 @@
+"""add webhook events table
+
+Revision ID: e7a3b9c1d4f2
+Revises: c52e9d4a8f31
+Create Date: 2026-10-16 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3b9c1d4f2'
+down_revision = 'c52e9d4a8f31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'webhook_events' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('webhook_events',
+        sa.Column('id', sa.String(length=255), nullable=False),
+        sa.Column('type', sa.String(length=100), nullable=False),
+        sa.Column('object_id', sa.String(length=255), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_webhook_events_processed_at_received_at', 'webhook_events',
+                    ['processed_at', 'received_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_webhook_events_processed_at_received_at', table_name='webhook_events')
+    op.drop_table('webhook_events')
@@ -0,0 +1,32 @@
+"""backfill missing catalog creation times
+
+Revision ID: f2c7a4e9b1d3
+Revises: d6f1a9c3e8b5
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c7a4e9b1d3'
+down_revision = 'd6f1a9c3e8b5'
+branch_labels = None
+depends_on = None
+
+TABLES = ['product', 'portfolio']
+
+
+def upgrade():
+    # Keyset pages are ordered by (created_at, id) and skip rows without a
+    # creation time; give old rows one so the API keeps listing them
+    for table in TABLES:
+        op.execute(sa.text(
+            f'UPDATE {table} SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) '
+            'WHERE created_at IS NULL'
+        ))
+
+
+def downgrade():
+    pass
@@ -2,5 +2,17 @@ from .portfolio import Portfolio
 from .product import Product
 from .order import Order, OrderItem
 from .user import User
+from .metrics import MetricCounter
+from .analytics import DailySales, DailyProductSales, RollupWatermark
+from .job import Job
+from .webhook import WebhookEvent
+from .cart import Cart, CartItem
+from .stock import StockReservation
+from .blob import Blob
+from .rate_limit import RateLimit
+from .newsletter import NewsletterSubscriber
 
-__all__ = ['Portfolio', 'Product', 'Order', 'OrderItem', 'User']
\ No newline at end of file
+__all__ = ['Portfolio', 'Product', 'Order', 'OrderItem', 'User', 'MetricCounter',
+           'DailySales', 'DailyProductSales', 'RollupWatermark', 'Job', 'WebhookEvent',
+           'Cart', 'CartItem', 'StockReservation', 'Blob', 'RateLimit',
+           'NewsletterSubscriber']
\ No newline at end of file
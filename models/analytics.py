@@ -0,0 +1,39 @@
+from app import db
+from datetime import datetime
+
+class DailySales(db.Model):
+    """Paid order totals rolled up per calendar day."""
+    __tablename__ = 'daily_sales'
+    
+    day = db.Column(db.Date, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    items = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DailySales {self.day} {self.revenue}>'
+
+class DailyProductSales(db.Model):
+    """Paid units and revenue per product and calendar day."""
+    __tablename__ = 'daily_product_sales'
+    
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    product_name = db.Column(db.String(100), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyProductSales {self.day} {self.product_id}>'
+
+class RollupWatermark(db.Model):
+    """Latest order ``updated_at`` already folded into the rollups."""
+    __tablename__ = 'rollup_watermarks'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    watermark = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<RollupWatermark {self.name} {self.watermark}>'
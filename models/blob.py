@@ -0,0 +1,25 @@
+from app import db
+from datetime import datetime
+
+class Blob(db.Model):
+    """A stored file, addressed by the SHA-256 hex digest of its content.
+
+    ``refcount`` counts what refers to the blob (order items, or the
+    original image for a thumbnail). Blobs nothing refers to are deleted by
+    `flask blobs purge` once unused for BLOB_ORPHAN_TTL.
+    """
+    __tablename__ = 'blobs'
+    __table_args__ = (
+        db.Index('ix_blobs_refcount_last_used_at', 'refcount', 'last_used_at'),
+    )
+    
+    key = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    content_type = db.Column(db.String(100))
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    thumbnail_key = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Blob {self.key[:12]} refs={self.refcount}>'
@@ -0,0 +1,35 @@
+from app import db
+from datetime import datetime
+
+class Cart(db.Model):
+    """Server-side shopping cart.
+
+    ``id`` is 'user:<user id>' for logged-in customers (shared across their
+    devices) or 'session:<token>' for anonymous visitors, whose session
+    cookie only carries the token. ``item_count`` is kept in step with the
+    lines so the navbar badge is a primary key read.
+    """
+    __tablename__ = 'carts'
+    __table_args__ = (
+        db.Index('ix_carts_updated_at', 'updated_at'),
+    )
+    
+    id = db.Column(db.String(64), primary_key=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Cart {self.id} ({self.item_count})>'
+
+class CartItem(db.Model):
+    """One product line of a cart."""
+    __tablename__ = 'cart_items'
+    
+    cart_id = db.Column(db.String(64), db.ForeignKey('carts.id'), primary_key=True)
+    # No foreign key: carts outlive product deletions and resolve_cart skips missing products
+    product_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    
+    def __repr__(self):
+        return f'<CartItem {self.cart_id} {self.product_id}x{self.quantity}>'
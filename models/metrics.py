@@ -0,0 +1,17 @@
+from app import db
+from datetime import datetime
+
+class MetricCounter(db.Model):
+    """Denormalized running counter used by the admin dashboard.
+
+    Keys are plain names ('users', 'orders', 'products') or per-day
+    revenue buckets ('revenue:YYYY-MM-DD').
+    """
+    __tablename__ = 'metric_counters'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<MetricCounter {self.key}={self.value}>'
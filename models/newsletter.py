@@ -0,0 +1,13 @@
+from app import db
+from datetime import datetime
+
+class NewsletterSubscriber(db.Model):
+    """An address signed up to the newsletter; the welcome mail goes out once per row."""
+    __tablename__ = 'newsletter_subscribers'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(254), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<NewsletterSubscriber {self.email}>'
@@ -2,8 +2,18 @@ from app import db
 from datetime import datetime
 import uuid
 
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_customer_email_created_at', 'customer_email', 'created_at'),
+        db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_orders_payment_status_created_at', 'payment_status', 'created_at'),
+        db.Index('ix_orders_created_at', 'created_at'),
+        db.Index('ix_orders_updated_at', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
@@ -24,9 +34,68 @@ class Order(db.Model):
     
     def __repr__(self):
         return f'<Order {self.order_number}>'
+    
+    def mark_as_paid(self):
+        """Mark the order as paid, record its revenue and commit its stock, once.
+
+        The status change is a conditional UPDATE, so when a webhook and the
+        success page race only the one that flips it records the revenue.
+        A failed payment can still succeed on retry.
+        """
+        from services.counters import record_order_paid
+        from services.stock import commit_stock
+        result = db.session.execute(
+            update(Order)
+            .where(Order.id == self.id, Order.payment_status.in_(('pending', 'failed')))
+            .values(payment_status='paid', updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        set_committed_value(self, 'payment_status', 'paid')
+        record_order_paid(self)
+        commit_stock(self)
+        return True
+
+    def mark_as_refunded(self):
+        """Mark a paid order as refunded and take it out of the revenue counters, once."""
+        from services.counters import record_order_refunded
+        result = db.session.execute(
+            update(Order)
+            .where(Order.id == self.id, Order.payment_status == 'paid')
+            .values(payment_status='refunded', updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        set_committed_value(self, 'payment_status', 'refunded')
+        record_order_refunded(self)
+        return True
+    
+    def to_dict(self):
+        """Convert order to dictionary for JSON serialization."""
+        return {
+            'id': self.id,
+            'order_number': self.order_number,
+            'user_id': self.user_id,
+            'customer_name': self.customer_name,
+            'customer_email': self.customer_email,
+            'customer_phone': self.customer_phone,
+            'shipping_address': self.shipping_address,
+            'total_amount': self.total_amount,
+            'stripe_payment_intent_id': self.stripe_payment_intent_id,
+            'status': self.status,
+            'payment_status': self.payment_status,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
+    __table_args__ = (
+        db.Index('ix_order_items_order_id', 'order_id'),
+        db.Index('ix_order_items_product_id', 'product_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
@@ -34,10 +103,22 @@ class OrderItem(db.Model):
     product_name = db.Column(db.String(100), nullable=False)
     product_price = db.Column(db.Float, nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
-    customer_image = db.Column(db.String(255))  # Path to uploaded customer image
+    customer_image = db.Column(db.String(255))  # Blob key (SHA-256) of the customer image
     
     # Relationship with Product
     product = db.relationship('Product', backref='order_items', lazy=True)
     
     def __repr__(self):
-        return f'<OrderItem {self.product_name} x {self.quantity}>'
\ No newline at end of file
+        return f'<OrderItem {self.product_name} x {self.quantity}>'
+    
+    def to_dict(self):
+        """Convert order item to dictionary for JSON serialization."""
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'product_id': self.product_id,
+            'product_name': self.product_name,
+            'product_price': self.product_price,
+            'quantity': self.quantity,
+            'customer_image': self.customer_image
+        }
\ No newline at end of file
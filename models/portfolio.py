@@ -1,8 +1,15 @@
 from app import db
 from datetime import datetime
+from services.catalog import get_catalog
 
 class Portfolio(db.Model):
     """Portfolio item model for showcasing work."""
+    __table_args__ = (
+        db.Index('ix_portfolio_featured', 'featured'),
+        db.Index('ix_portfolio_category', 'category'),
+        db.Index('ix_portfolio_created_at_id', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
@@ -20,11 +27,13 @@ class Portfolio(db.Model):
     
     def to_dict(self):
         """Convert portfolio item to dictionary for JSON serialization."""
+        from services.images import image_srcset
         return {
             'id': self.id,
             'title': self.title,
             'description': self.description,
             'image_url': self.image_url,
+            'image_srcset': image_srcset(self.image_url),
             'category': self.category,
             'client': self.client,
             'project_url': self.project_url,
@@ -37,17 +46,26 @@ class Portfolio(db.Model):
     @staticmethod
     def get_categories():
         """Get all unique categories."""
-        categories = db.session.query(Portfolio.category).distinct().all()
-        return [cat[0] for cat in categories]
+        categories = []
+        for work in get_catalog().portfolio:
+            if work.category not in categories:
+                categories.append(work.category)
+        return categories
     
     @staticmethod
     def get_featured():
         """Get featured portfolio items."""
-        return Portfolio.query.filter_by(featured=True).all()
+        return [work for work in get_catalog().portfolio if work.featured]
+    
+    @staticmethod
+    def get_latest(limit):
+        """Get the most recently created portfolio items."""
+        works = sorted(get_catalog().portfolio, key=lambda w: w.created_at, reverse=True)
+        return works[:limit]
     
     @staticmethod
     def get_by_category(category):
         """Get portfolio items by category."""
         if category.lower() == 'all':
-            return Portfolio.query.all()
-        return Portfolio.query.filter_by(category=category).all()
\ No newline at end of file
+            return list(get_catalog().portfolio)
+        return [work for work in get_catalog().portfolio if work.category == category]
\ No newline at end of file
@@ -1,8 +1,14 @@
 from app import db
 from datetime import datetime
+from services.catalog import get_catalog
 
 class Product(db.Model):
     """Product model for e-commerce functionality."""
+    __table_args__ = (
+        db.Index('ix_product_category_is_available', 'category', 'is_available'),
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
@@ -11,7 +17,7 @@ class Product(db.Model):
     category = db.Column(db.String(50), nullable=False)
     is_available = db.Column(db.Boolean, default=True)
     is_featured = db.Column(db.Boolean, default=False)
-    stock_quantity = db.Column(db.Integer, default=0)  # 0 = unlimited for digital products
+    stock_quantity = db.Column(db.Integer, default=0)  # units left to sell; ignored for digital products
     digital_product = db.Column(db.Boolean, default=True)  # Most design work is digital
     delivery_time = db.Column(db.String(50))  # e.g., "3-5 business days"
     requires_image = db.Column(db.Boolean, default=False)  # For portrait products that need customer image
@@ -23,12 +29,14 @@ class Product(db.Model):
     
     def to_dict(self):
         """Convert product to dictionary for JSON serialization."""
+        from services.images import image_srcset
         return {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'price': self.price,
             'image_url': self.image_url,
+            'image_srcset': image_srcset(self.image_url),
             'category': self.category,
             'is_available': self.is_available,
             'is_featured': self.is_featured,
@@ -46,30 +54,40 @@ class Product(db.Model):
     @staticmethod
     def get_categories():
         """Get all unique product categories."""
-        categories = db.session.query(Product.category).distinct().all()
-        return [cat[0] for cat in categories]
+        categories = []
+        for product in get_catalog().products:
+            if product.category not in categories:
+                categories.append(product.category)
+        return categories
     
     @staticmethod
     def get_available():
         """Get all available products."""
-        return Product.query.filter_by(is_available=True).all()
+        return [p for p in get_catalog().products if p.is_available]
     
     @staticmethod
     def get_featured():
         """Get featured products."""
-        return Product.query.filter_by(is_available=True, is_featured=True).all()
+        return [p for p in get_catalog().products if p.is_available and p.is_featured]
+    
+    @staticmethod
+    def get_latest(limit):
+        """Get the most recently created available products."""
+        products = sorted(Product.get_available(), key=lambda p: p.created_at, reverse=True)
+        return products[:limit]
     
     @staticmethod
     def get_by_category(category):
         """Get products by category."""
         if category.lower() == 'all':
-            return Product.query.filter_by(is_available=True).all()
-        return Product.query.filter_by(category=category, is_available=True).all()
+            return Product.get_available()
+        return [p for p in get_catalog().products
+                if p.category == category and p.is_available]
     
     def check_availability(self, quantity=1):
         """Check if product is available in requested quantity."""
         if not self.is_available:
             return False
-        if self.stock_quantity == 0:  # Unlimited stock (digital products)
+        if self.digital_product:  # Unlimited stock
             return True
-        return self.stock_quantity >= quantity
\ No newline at end of file
+        return (self.stock_quantity or 0) >= quantity
\ No newline at end of file
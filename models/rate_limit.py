@@ -0,0 +1,20 @@
+from app import db
+
+class RateLimit(db.Model):
+    """Hits against one rate-limited action in the current fixed window.
+
+    ``key`` combines the action and the client (e.g. 'contact:203.0.113.7').
+    The window restarts on the first hit after ``expires_at``; expired rows
+    are deleted by the ``rate_limit.purge`` job.
+    """
+    __tablename__ = 'rate_limits'
+    __table_args__ = (
+        db.Index('ix_rate_limits_expires_at', 'expires_at'),
+    )
+    
+    key = db.Column(db.String(128), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<RateLimit {self.key}={self.count}>'
@@ -0,0 +1,27 @@
+from app import db
+from datetime import datetime
+
+class StockReservation(db.Model):
+    """Units of a physical product held for a pending order.
+
+    Reserving decrements ``Product.stock_quantity`` up front; the hold is
+    committed when the order is paid or released (restoring the units)
+    when its payment is abandoned.
+    """
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        db.Index('ix_stock_reservations_status_expires_at', 'status', 'expires_at'),
+        db.Index('ix_stock_reservations_order_id', 'order_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='held')  # held, committed, released
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StockReservation order={self.order_id} product={self.product_id}x{self.quantity} {self.status}>'
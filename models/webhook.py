@@ -0,0 +1,28 @@
+from app import db
+from datetime import datetime
+
+class WebhookEvent(db.Model):
+    """A received payment provider event, keyed by its id for deduplication.
+
+    Rows are inserted by the webhook endpoint and applied to orders in
+    batches by the job worker, which stamps ``processed_at``. Events whose
+    order is not found are retried at ``retry_at``; once out of attempts
+    they stay processed with ``last_error`` set (dead-lettered).
+    """
+    __tablename__ = 'webhook_events'
+    __table_args__ = (
+        db.Index('ix_webhook_events_processed_at_received_at', 'processed_at', 'received_at'),
+    )
+    
+    id = db.Column(db.String(255), primary_key=True)
+    type = db.Column(db.String(100), nullable=False)
+    object_id = db.Column(db.String(255))  # payment intent the event refers to
+    payload = db.Column(db.Text, nullable=False)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    retry_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f'<WebhookEvent {self.id} {self.type}>'
@@ -1,10 +1,16 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from models.user import User, db
 from models.order import Order, OrderItem
 from models.product import Product
+from services.catalog import bump_catalog_version
+from services.images import queue_derivatives
+from services.stock import held_quantity, release_stock, set_stock_on_hand
+from services.analytics import PERIODS, refresh_rollups, sales_report
+from services.counters import dashboard_counters, increment
+from services.instrumentation import query_stats
+from sqlalchemy.orm import selectinload
 from functools import wraps
-from datetime import datetime, timedelta
 
 bp = Blueprint('admin', __name__)
 
@@ -20,26 +26,17 @@ def admin_required(f):
 @bp.route('/')
 @admin_required
 def dashboard():
-    # Basic analytics
-    total_users = User.query.count()
-    total_orders = Order.query.count()
-    total_products = Product.query.count()
+    # Totals and last-30-days revenue from the denormalized counters
+    counters = dashboard_counters()
     
     # Recent orders
     recent_orders = Order.query.order_by(Order.created_at.desc()).limit(5).all()
     
-    # Revenue stats (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_revenue = db.session.query(db.func.sum(Order.total_amount)).filter(
-        Order.created_at >= thirty_days_ago,
-        Order.payment_status == 'paid'
-    ).scalar() or 0
-    
     return render_template('admin/dashboard.html', 
-                         total_users=total_users,
-                         total_orders=total_orders,
-                         total_products=total_products,
-                         recent_revenue=recent_revenue,
+                         total_users=counters['users'],
+                         total_orders=counters['orders'],
+                         total_products=counters['products'],
+                         recent_revenue=counters['recent_revenue'],
                          recent_orders=recent_orders)
 
 @bp.route('/orders')
@@ -53,24 +50,25 @@ def orders():
 @bp.route('/orders/<int:order_id>')
 @admin_required
 def order_detail(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(
+        selectinload(Order.items).joinedload(OrderItem.product)
+    ).filter_by(id=order_id).first_or_404()
     return render_template('admin/order_detail.html', order=order)
 
 @bp.route('/orders/<int:order_id>/update-status', methods=['POST'])
 @admin_required
 def update_order_status(order_id):
     order = Order.query.get_or_404(order_id)
-    print(order)
     new_status = request.form.get('status')
-    print(new_status)
     
     if new_status in ['pending', 'processing', 'shipped', 'delivered', 'cancelled']:
-        print("Updating status")
         order.status = new_status
+        if new_status == 'cancelled':
+            # Units still held for the order go back on sale now, not at expiry
+            release_stock(order.id)
         db.session.commit()
         flash(f'Estado del pedido actualizado a: {new_status}', 'success')
     else:
-        print("Invalid status")
         flash('Estado inválido', 'error')
     
     return redirect(url_for('admin.order_detail', order_id=order_id))
@@ -87,7 +85,13 @@ def users():
 @admin_required
 def user_detail(user_id):
     user = User.query.get_or_404(user_id)
-    return render_template('admin/user_detail.html', user=user)
+    order_count = Order.query.filter_by(user_id=user.id).count()
+    recent_orders = Order.query.filter_by(user_id=user.id)\
+                               .order_by(Order.created_at.desc()).limit(5).all()
+    return render_template('admin/user_detail.html', 
+                         user=user,
+                         order_count=order_count,
+                         recent_orders=recent_orders)
 
 @bp.route('/users/<int:user_id>/toggle-status', methods=['POST'])
 @admin_required
@@ -106,8 +110,20 @@ def toggle_user_status(user_id):
 @bp.route('/analytics')
 @admin_required
 def analytics():
-    # This will be expanded later with more detailed analytics
-    return render_template('admin/analytics.html')
+    """Sales analytics from the daily rollup tables."""
+    period = request.args.get('period', 'day')
+    if period not in PERIODS:
+        period = 'day'
+    days = request.args.get('days', 90 if period == 'day' else 365, type=int)
+    
+    # Fold in orders changed since the last refresh; usually a few rows
+    refresh_rollups()
+    report = sales_report(period, min(max(days, 1), 730))
+    
+    return render_template('admin/analytics.html', 
+                         report=report,
+                         period=period,
+                         days=days)
 
 @bp.route('/products')
 @admin_required
@@ -137,7 +153,10 @@ def new_product():
             stock_quantity=int(request.form.get('stock_quantity', 0))
         )
         db.session.add(product)
+        increment('products')
+        queue_derivatives(product.image_url)
         db.session.commit()
+        bump_catalog_version()
         flash('Producto creado exitosamente.', 'success')
         return redirect(url_for('admin.products'))
     
@@ -161,14 +180,21 @@ def edit_product(product_id):
         product.requires_image = bool(request.form.get('requires_image'))
         product.digital_product = bool(request.form.get('digital_product'))
         product.delivery_time = request.form.get('delivery_time')
-        product.stock_quantity = int(request.form.get('stock_quantity', 0))
+        # The form edits units on hand; held units are subtracted so that
+        # releasing them later doesn't push stock past what was entered
+        set_stock_on_hand(product.id, int(request.form.get('stock_quantity', 0)))
         
+        queue_derivatives(product.image_url)
         db.session.commit()
+        bump_catalog_version()
         flash('Producto actualizado exitosamente.', 'success')
         return redirect(url_for('admin.products'))
     
     categories = Product.get_categories()
-    return render_template('admin/product_form.html', product=product, categories=categories)
+    # Digital products have no stock to count; physical ones show held units as on hand
+    stock_on_hand = None if product.digital_product else (product.stock_quantity or 0) + held_quantity(product.id)
+    return render_template('admin/product_form.html', product=product, categories=categories,
+                           stock_on_hand=stock_on_hand)
 
 @bp.route('/products/<int:product_id>/delete', methods=['POST'])
 @admin_required
@@ -176,6 +202,17 @@ def delete_product(product_id):
     """Delete product."""
     product = Product.query.get_or_404(product_id)
     db.session.delete(product)
+    increment('products', -1)
     db.session.commit()
+    bump_catalog_version()
     flash('Producto eliminado exitosamente.', 'success')
     return redirect(url_for('admin.products'))
+
+@bp.route('/query-stats')
+@admin_required
+def query_stats_view():
+    """Per-blueprint SQL statistics collected by this worker."""
+    stats = query_stats()
+    if stats is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'blueprints': stats})
@@ -1,23 +1,45 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
+from flask_login import current_user
+from datetime import datetime
 from models.portfolio import Portfolio
 from models.product import Product
 from models.order import Order
+from services.catalog import catalog_version, stock_version
+from services.counters import paid_order_count
+from services.export import EXPORTS, PRIVATE_EXPORTS, iter_export, ndjson_lines, csv_lines
+from services.http_cache import conditional
+from services.pagination import keyset_page
+from services.search import suggest_catalog
 
 bp = Blueprint('api', __name__)
 
+def _page_limit():
+    """Return the requested page size, clamped to the configured maximum."""
+    default = current_app.config['API_PAGE_SIZE']
+    limit = request.args.get('limit', default, type=int)
+    return min(max(limit, 1), current_app.config['API_MAX_PAGE_SIZE'])
+
 @bp.route('/portfolio')
+@conditional(catalog_version)
 def portfolio_api():
-    """API endpoint for portfolio data."""
+    """API endpoint for portfolio data, paginated by cursor."""
     category = request.args.get('category', 'all')
     
-    if category == 'all':
-        works = Portfolio.query.all()
-    else:
-        works = Portfolio.query.filter_by(category=category).all()
+    query = Portfolio.query
+    if category != 'all':
+        query = query.filter_by(category=category)
+    
+    try:
+        works, next_cursor = keyset_page(query, Portfolio,
+                                         cursor=request.args.get('cursor'),
+                                         limit=_page_limit())
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
     return jsonify({
         'works': [work.to_dict() for work in works],
-        'total': len(works)
+        'count': len(works),
+        'next_cursor': next_cursor
     })
 
 @bp.route('/portfolio/<int:work_id>')
@@ -35,9 +57,13 @@ def portfolio_categories_api():
         'total': len(categories)
     })
 
+def _products_version():
+    return f'{catalog_version()}:{stock_version()}'
+
 @bp.route('/products')
+@conditional(_products_version)
 def products_api():
-    """API endpoint for products data."""
+    """API endpoint for products data, paginated by cursor."""
     category = request.args.get('category', 'all')
     available_only = request.args.get('available', 'true').lower() == 'true'
     
@@ -49,11 +75,17 @@ def products_api():
     if category != 'all':
         query = query.filter_by(category=category)
     
-    products = query.all()
+    try:
+        products, next_cursor = keyset_page(query, Product,
+                                            cursor=request.args.get('cursor'),
+                                            limit=_page_limit())
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
     return jsonify({
         'products': [product.to_dict() for product in products],
-        'total': len(products)
+        'count': len(products),
+        'next_cursor': next_cursor
     })
 
 @bp.route('/products/<int:product_id>')
@@ -63,6 +95,7 @@ def product_api(product_id):
     return jsonify(product.to_dict())
 
 @bp.route('/products/categories')
+@conditional(catalog_version)
 def product_categories_api():
     """API endpoint for product categories."""
     categories = Product.get_categories()
@@ -77,12 +110,56 @@ def order_api(order_id):
     order = Order.query.filter_by(order_id=order_id).first_or_404()
     return jsonify(order.to_dict())
 
+@bp.route('/search/suggest')
+def search_suggest_api():
+    """API endpoint for search-as-you-type title suggestions."""
+    query = request.args.get('q', '').strip()
+    max_limit = current_app.config['SEARCH_SUGGEST_LIMIT']
+    limit = min(max(request.args.get('limit', max_limit, type=int), 1), max_limit)
+    
+    suggestions = suggest_catalog(query, limit) if query else []
+    return jsonify({
+        'query': query,
+        'suggestions': suggestions
+    })
+
+@bp.route('/export/<resource>.<fmt>')
+def export_api(resource, fmt):
+    """Stream a full table export as NDJSON or CSV."""
+    if resource not in EXPORTS or fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'Unknown export'}), 404
+    
+    if resource in PRIVATE_EXPORTS and not (current_user.is_authenticated and current_user.is_admin()):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    updated_since = request.args.get('updated_since')
+    if updated_since:
+        try:
+            updated_since = datetime.fromisoformat(updated_since)
+        except ValueError:
+            return jsonify({'error': 'updated_since must be an ISO 8601 timestamp'}), 400
+    
+    rows = iter_export(resource, updated_since or None,
+                       batch_size=current_app.config['EXPORT_BATCH_SIZE'])
+    if fmt == 'csv':
+        body, mimetype = csv_lines(rows), 'text/csv'
+    else:
+        body, mimetype = ndjson_lines(rows), 'application/x-ndjson'
+    
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={resource}.{fmt}'
+    return response
+
+def _stats_version():
+    return f'{catalog_version()}:{paid_order_count()}'
+
 @bp.route('/stats')
+@conditional(_stats_version)
 def stats_api():
     """API endpoint for general statistics."""
-    portfolio_count = Portfolio.query.count()
-    product_count = Product.query.filter_by(is_available=True).count()
-    order_count = Order.query.filter_by(payment_status='paid').count()
+    portfolio_count = len(Portfolio.get_by_category('all'))
+    product_count = len(Product.get_available())
+    order_count = paid_order_count()
     
     portfolio_categories = len(Portfolio.get_categories())
     product_categories = len(Product.get_categories())
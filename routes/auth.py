@@ -1,7 +1,10 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, session
 from flask_login import login_user, logout_user, login_required, current_user
 from models.user import User, db
-from models.order import Order
+from models.order import Order, OrderItem
+from services.cart import claim_anonymous_cart
+from services.counters import increment
+from sqlalchemy.orm import selectinload
 from functools import wraps
 
 bp = Blueprint('auth', __name__)
@@ -29,6 +32,7 @@ def login():
         if user and user.check_password(password):
             if user.is_active:
                 login_user(user, remember=True)
+                claim_anonymous_cart()
                 next_page = request.args.get('next')
                 if not next_page or not next_page.startswith('/'):
                     next_page = url_for('main.index')
@@ -82,6 +86,7 @@ def register():
         user.set_password(password)
         
         db.session.add(user)
+        increment('users')
         db.session.commit()
         
         flash('¡Registro exitoso! Ya puedes iniciar sesión.', 'success')
@@ -93,6 +98,7 @@ def register():
 @login_required
 def logout():
     logout_user()
+    session.pop('cart_summary', None)
     flash('Has cerrado sesión correctamente.', 'info')
     return redirect(url_for('main.index'))
 
@@ -126,5 +132,7 @@ def edit_profile():
 @bp.route('/orders')
 @login_required
 def my_orders():
-    orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
+    orders = Order.query.options(
+        selectinload(Order.items).joinedload(OrderItem.product)
+    ).filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
     return render_template('auth/my_orders.html', orders=orders)
@@ -1,25 +1,38 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify
+from datetime import datetime
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify, current_app
 from models.portfolio import Portfolio
 from models.product import Product
 from models.order import Order
+from models.newsletter import NewsletterSubscriber
+from app import db
+from services.counters import insert_for_dialect
+from services.mail import queue_mail
+from services.page_cache import cached_page
+from services.rate_limit import hit_from_client
+from services.search import search_catalog
 
 bp = Blueprint('main', __name__)
 
+CONTACT_ACKNOWLEDGEMENT = (
+    "Hi,\n\n"
+    "Thanks for your message. I'll get back to you within 24 hours.\n"
+)
+
 @bp.route('/')
+@cached_page()
 def index():
     """Homepage with featured work and products."""
     # Get featured portfolio works
     featured_works = Portfolio.get_featured()
     if not featured_works:
         # If no featured works, get latest 6 works
-        featured_works = Portfolio.query.order_by(Portfolio.created_at.desc()).limit(6).all()
+        featured_works = Portfolio.get_latest(6)
     
     # Get featured products
     featured_products = Product.get_featured()
     if not featured_products:
         # If no featured products, get latest 3 products
-        featured_products = Product.query.filter_by(is_available=True)\
-                                        .order_by(Product.created_at.desc()).limit(3).all()
+        featured_products = Product.get_latest(3)
     
     return render_template('index.html', 
                          featured_works=featured_works,
@@ -52,24 +65,30 @@ def contact():
             flash('Please enter a valid email address.', 'error')
             return render_template('contact.html')
         
-        # Here you would typically:
-        # 1. Send an email to Elena with the contact details
-        # 2. Save the inquiry to the database
-        # 3. Send an auto-reply to the customer
+        inquiry = '\n'.join([
+            f'Name: {name}',
+            f'Email: {email}',
+            f'Phone: {phone}',
+            f'Subject: {subject}',
+            f'Budget: {budget}',
+            f'Timeline: {timeline}',
+            '',
+            message
+        ])
         
-        # For now, just store in session for demo purposes
-        inquiry_data = {
-            'name': name,
-            'email': email,
-            'phone': phone,
-            'subject': subject,
-            'budget': budget,
-            'timeline': timeline,
-            'message': message
-        }
+        if not hit_from_client('contact'):
+            flash('Too many messages from your connection. Please try again later.', 'error')
+            return render_template('contact.html'), 429
+        
+        # Emails go out from the job worker so the request returns immediately.
+        # The acknowledgement is fixed text: the sender's address is not
+        # verified, so nothing they typed may be mailed back to it.
+        if current_app.config['CONTACT_EMAIL']:
+            queue_mail(current_app.config['CONTACT_EMAIL'], f'New inquiry: {subject or name}',
+                       inquiry, reply_to=email)
+        queue_mail(email, 'Thanks for getting in touch', CONTACT_ACKNOWLEDGEMENT)
+        db.session.commit()
         
-        # In a real application, you would save this to database or send email
-        # For demo, we'll just show success message
         flash(f'Thank you {name}! Your message has been sent successfully. I\'ll get back to you within 24 hours.', 'success')
         
         return redirect(url_for('main.contact'))
@@ -121,27 +140,18 @@ def search():
         flash('Please enter a search term.', 'warning')
         return redirect(url_for('main.index'))
     
-    # Search in portfolio
-    portfolio_results = Portfolio.query.filter(
-        Portfolio.title.contains(query) | 
-        Portfolio.description.contains(query) |
-        Portfolio.category.contains(query)
-    ).all()
-    
-    # Search in products
-    product_results = Product.query.filter(
-        Product.name.contains(query) |
-        Product.description.contains(query) |
-        Product.category.contains(query)
-    ).filter_by(is_available=True).all()
-    
-    total_results = len(portfolio_results) + len(product_results)
+    page = request.args.get('page', 1, type=int)
+    results = search_catalog(query, page=page,
+                             per_page=current_app.config['POSTS_PER_PAGE'])
     
     return render_template('search_results.html',
                          query=query,
-                         portfolio_results=portfolio_results,
-                         product_results=product_results,
-                         total_results=total_results)
+                         results=results['hits'],
+                         portfolio_results=results['portfolio'],
+                         product_results=results['products'],
+                         total_results=results['total'],
+                         page=results['page'],
+                         pages=results['pages'])
 
 @bp.route('/portfolio')
 def portfolio_redirect():
@@ -287,11 +297,18 @@ def newsletter_signup():
     if not email or '@' not in email:
         return jsonify({'error': 'Valid email address required'}), 400
     
-    # In a real application, you would:
-    # 1. Validate email format
-    # 2. Check if already subscribed
-    # 3. Add to email marketing service (Mailchimp, etc.)
-    # 4. Send welcome email
+    if not hit_from_client('newsletter'):
+        return jsonify({'error': 'Too many signups from your connection. Please try again later.'}), 429
+    
+    # Only a new subscriber gets the welcome mail, so repeated signups can't
+    # be used to mail an address over and over
+    statement = insert_for_dialect()(NewsletterSubscriber).values(
+        email=email.lower(), created_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=[NewsletterSubscriber.email])
+    if db.session.execute(statement).rowcount == 1:
+        queue_mail(email, 'Welcome to the newsletter',
+                   'Thanks for subscribing! You will hear about new work and shop releases first.')
+    db.session.commit()
     
     return jsonify({'success': True, 'message': 'Successfully subscribed to newsletter!'})
 
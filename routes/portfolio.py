@@ -1,9 +1,11 @@
 from flask import Blueprint, render_template, request, jsonify
 from models.portfolio import Portfolio
+from services.page_cache import cached_page
 
 bp = Blueprint('portfolio', __name__)
 
 @bp.route('/')
+@cached_page(category=Portfolio.get_categories)
 def index():
     """Portfolio main page with work gallery."""
     category = request.args.get('category', 'all')
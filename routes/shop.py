@@ -1,19 +1,30 @@
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash, current_app, abort
 from flask_login import login_required, current_user
+from sqlalchemy.orm import selectinload
 from models.product import Product
 from models.order import Order, OrderItem
 from models.user import User
+from models.blob import Blob
+from services.cart import (cart_key, cart_summary, current_cart, get_cart_store,
+                           refresh_cart_summary, resolve_cart)
+from services.counters import increment
+from services.page_cache import cached_page
+from services.stock import (OutOfStock, available_stock, cancel_unpaid_order, held_quantity,
+                            reserve_stock)
+from services.blobs import send_blob
+from services.uploads import (UploadError, attach_image, check_upload_quota, consume_upload,
+                              queue_processing, receive_image, remember_upload, uploaded_image_key)
+from services.rate_limit import hit_from_client
+from services.payments import PaymentError, cart_fingerprint, get_payment_gateway, idempotency_key
+from services.webhooks import WebhookError, ingest_event
 from app import db
-import stripe
+import mimetypes
 import os
 
 bp = Blueprint('shop', __name__)
 
-# Initialize Stripe
-def get_stripe_key():
-    return current_app.config.get('STRIPE_SECRET_KEY') or os.environ.get('STRIPE_SECRET_KEY')
-
 @bp.route('/')
+@cached_page(category=Product.get_categories)
 def index():
     """Shop main page with product grid."""
     category = request.args.get('category', 'all')
@@ -41,20 +52,9 @@ def product_detail(product_id):
 @bp.route('/cart')
 def cart():
     """Shopping cart page."""
-    cart = session.get('cart', {})
-    cart_items = []
-    total = 0
-    
-    for product_id, quantity in cart.items():
-        product = Product.query.get(int(product_id))
-        if product and product.is_available:
-            subtotal = product.price * quantity
-            cart_items.append({
-                'product': product,
-                'quantity': quantity,
-                'subtotal': subtotal
-            })
-            total += subtotal
+    resolved = resolve_cart(current_cart())
+    cart_items = resolved['items']
+    total = resolved['total']
     
     stripe_key = current_app.config.get('STRIPE_PUBLISHABLE_KEY') or os.environ.get('STRIPE_PUBLISHABLE_KEY')
     return render_template('cart.html', 
@@ -66,24 +66,14 @@ def cart():
 @login_required
 def checkout():
     """Checkout page - requires login."""
-    cart = session.get('cart', {})
+    cart = current_cart()
     if not cart:
         flash('Tu carrito está vacío.', 'warning')
         return redirect(url_for('shop.cart'))
     
-    cart_items = []
-    total = 0
-    
-    for product_id, quantity in cart.items():
-        product = Product.query.get(int(product_id))
-        if product and product.is_available:
-            subtotal = product.price * quantity
-            cart_items.append({
-                'product': product,
-                'quantity': quantity,
-                'subtotal': subtotal
-            })
-            total += subtotal
+    resolved = resolve_cart(cart)
+    cart_items = resolved['items']
+    total = resolved['total']
     
     if not cart_items:
         flash('No hay productos válidos en tu carrito.', 'warning')
@@ -95,6 +85,23 @@ def checkout():
                          total=total,
                          stripe_key=stripe_key)
 
+def _in_stock(product, quantity):
+    """Check live stock, counting units this session's unpaid order already holds.
+
+    Checkout reserves stock up front, so without them a customer could not
+    change or resubmit a cart holding the last units.
+    """
+    if not product.is_available:
+        return False
+    if product.digital_product:
+        return True
+    # Live stock: products may come from a catalog snapshot older than the last checkout
+    stock = available_stock(product.id)
+    pending = session.get('pending_order')
+    if pending:
+        stock += held_quantity(product.id, order_id=pending['id'])
+    return stock >= quantity
+
 @bp.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
     """Add product to cart."""
@@ -109,26 +116,13 @@ def add_to_cart():
             return jsonify({'error': 'Product not available'}), 400
         
         # Check stock if not digital product
-        if not product.check_availability(quantity):
+        if not _in_stock(product, quantity):
             return jsonify({'error': 'Insufficient stock'}), 400
         
-        # Initialize cart if it doesn't exist
-        if 'cart' not in session:
-            session['cart'] = {}
-        
-        cart = session['cart']
-        
         # Add or update quantity in cart
-        if product_id in cart:
-            cart[product_id] += quantity
-        else:
-            cart[product_id] = quantity
-        
-        session['cart'] = cart
-        session.modified = True
-        
-        # Calculate total items in cart
-        cart_count = sum(cart.values())
+        key = cart_key(create=True)
+        get_cart_store().add(key, product.id, quantity)
+        cart_count = refresh_cart_summary(key)['count']
         
         return jsonify({
             'success': True, 
@@ -148,11 +142,10 @@ def update_cart():
         product_id = str(data.get('product_id'))
         quantity = int(data.get('quantity'))
         
-        if 'cart' not in session:
+        key = cart_key()
+        if key is None:
             return jsonify({'error': 'Cart is empty'}), 400
         
-        cart = session['cart']
-        
         if quantity > 0:
             # Verify product still exists and is available
             product = Product.query.get(int(product_id))
@@ -160,15 +153,11 @@ def update_cart():
                 return jsonify({'error': 'Product no longer available'}), 400
             
             # Check stock availability
-            if not product.check_availability(quantity):
+            if not _in_stock(product, quantity):
                 return jsonify({'error': 'Insufficient stock'}), 400
             
-            cart[product_id] = quantity
-        else:
-            cart.pop(product_id, None)
-        
-        session['cart'] = cart
-        session.modified = True
+        get_cart_store().set(key, product_id, quantity)
+        refresh_cart_summary(key)
         
         return jsonify({'success': True})
         
@@ -183,9 +172,10 @@ def remove_from_cart():
         data = request.get_json()
         product_id = str(data.get('product_id'))
         
-        if 'cart' in session and product_id in session['cart']:
-            del session['cart'][product_id]
-            session.modified = True
+        key = cart_key()
+        if key is not None:
+            get_cart_store().remove(key, product_id)
+            refresh_cart_summary(key)
         
         return jsonify({'success': True})
         
@@ -197,8 +187,10 @@ def remove_from_cart():
 def clear_cart():
     """Clear entire cart."""
     try:
-        session.pop('cart', None)
-        session.modified = True
+        key = cart_key()
+        if key is not None:
+            get_cart_store().clear(key)
+            refresh_cart_summary(key)
         return jsonify({'success': True})
     except Exception as e:
         current_app.logger.error(f"Error clearing cart: {str(e)}")
@@ -207,44 +199,57 @@ def clear_cart():
 @bp.route('/cart_count')
 def cart_count():
     """Get current cart count."""
-    cart = session.get('cart', {})
-    count = sum(cart.values())
+    count = cart_summary()['count']
     return jsonify({'count': count})
 
 @bp.route('/cart_total')
 def cart_total():
     """Get current cart total."""
-    cart = session.get('cart', {})
-    total = 0
+    total = cart_summary()['subtotal']
+    return jsonify({'total': total})
+
+@bp.route('/upload-customer-image', methods=['POST'])
+def upload_customer_image():
+    """Stream a customer reference image to the blob store and return a token for checkout."""
+    try:
+        check_upload_quota()
+        if not hit_from_client('upload'):
+            raise UploadError('Demasiadas imágenes subidas, inténtalo más tarde.', 429)
+        key, size = receive_image(request.stream, request.content_length)
+    except UploadError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
+    except OSError as e:
+        current_app.logger.error(f"Error saving customer image: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Error al guardar la imagen'}), 500
     
-    for product_id, quantity in cart.items():
-        product = Product.query.get(int(product_id))
-        if product and product.is_available:
-            total += product.price * quantity
+    remember_upload(key)
+    queue_processing(key)
+    db.session.commit()
     
-    return jsonify({'total': total})
+    return jsonify({'token': key, 'size': size})
 
 @bp.route('/create-payment-intent', methods=['POST'])
 def create_payment_intent():
     """Create Stripe payment intent."""
     try:
         # Handle both JSON and FormData
-        if request.content_type and 'multipart/form-data' in request.content_type:
-            data = {
-                'name': request.form.get('name'),
-                'email': request.form.get('email'),
-                'address_line1': request.form.get('address_line1'),
-                'address_line2': request.form.get('address_line2'),
-                'address_city': request.form.get('address_city'),
-                'address_postal': request.form.get('address_postal'),
-                'address_country': request.form.get('address_country'),
-            }
-            customer_image_file = request.files.get('customer_image')
-        else:
+        # Images are uploaded beforehand to /upload-customer-image; checkout
+        # only carries the returned token
+        if request.is_json:
             data = request.get_json()
-            customer_image_file = None
+        else:
+            data = request.form.to_dict()
+        
+        customer_image_key = None
+        customer_image_token = data.get('customer_image_token')
+        if customer_image_token:
+            customer_image_key = uploaded_image_key(customer_image_token)
+            if customer_image_key is None:
+                return jsonify({'error': 'Invalid image upload, please upload it again'}), 400
             
-        cart = session.get('cart', {})
+        cart = current_cart()
         
         if not cart:
             return jsonify({'error': 'Cart is empty'}), 400
@@ -257,25 +262,17 @@ def create_payment_intent():
             return jsonify({'error': 'Customer name and email are required'}), 400
         
         # Calculate total amount and validate cart items
-        total_amount = 0
-        order_items = []
+        resolved = resolve_cart(cart)
+        if resolved['unavailable']:
+            product_id = resolved['unavailable'][0]
+            return jsonify({'error': f'Product {product_id} is no longer available'}), 400
         
-        for product_id, quantity in cart.items():
-            product = Product.query.get(int(product_id))
-            if not product or not product.is_available:
-                return jsonify({'error': f'Product {product_id} is no longer available'}), 400
-            
-            if not product.check_availability(quantity):
-                return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
-            
-            subtotal = product.price * quantity
-            total_amount += subtotal
-            order_items.append({
-                'product': product,
-                'quantity': quantity,
-                'unit_price': product.price,
-                'subtotal': subtotal
-            })
+        for item in resolved['items']:
+            if not _in_stock(item['product'], item['quantity']):
+                return jsonify({'error': f"Insufficient stock for {item['product'].name}"}), 400
+        
+        total_amount = resolved['total']
+        order_items = resolved['items']
         
         if total_amount == 0:
             return jsonify({'error': 'Invalid cart items'}), 400
@@ -284,10 +281,9 @@ def create_payment_intent():
         if total_amount < 0.50:
             return jsonify({'error': 'Order total must be at least $0.50'}), 400
         
-        # Initialize Stripe with the secret key
-        stripe.api_key = get_stripe_key()
+        gateway = get_payment_gateway()
         
-        if not stripe.api_key:
+        if not gateway:
             current_app.logger.error("Stripe secret key not configured")
             return jsonify({'error': 'Payment processing is not configured'}), 500
         
@@ -302,102 +298,146 @@ def create_payment_intent():
                 'country': data.get('address_country', '')
             }
         }
-
-        # Create payment intent with Stripe
-        intent = stripe.PaymentIntent.create(
-            amount=int(total_amount * 100),  # Stripe uses cents
-            currency='eur',
-            automatic_payment_methods={'enabled': True},
-            shipping=shipping,
-            metadata={
-                'customer_name': customer_name,
-                'customer_email': customer_email,
-                'item_count': len(order_items)
-            }
-        )
-        
-        # Create order in database
-        # Persist order with shipping address
-        address_line1 = data.get('address_line1', '')
-        address_line2 = data.get('address_line2', '')
-        address_city = data.get('address_city', '')
-        address_postal = data.get('address_postal', '')
-        address_country = data.get('address_country', '')
-        shipping_address = \
-            f"{address_line1}\n{address_line2}\n{address_postal} {address_city}\n{address_country}".strip()
-
-        order = Order(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            customer_name=customer_name,
-            customer_email=customer_email,
-            customer_phone=data.get('phone', ''),
-            shipping_address=shipping_address,
-            total_amount=total_amount,
-            stripe_payment_intent_id=intent.id,
-            status='pending',
-            payment_status='pending'
-        )
-        
-        db.session.add(order)
-        db.session.flush()  # Get the order ID
+        fingerprint = cart_fingerprint(order_items, customer_name, customer_email, shipping,
+                                       customer_image_key)
+        
+        # A resubmitted checkout (double click, client retry) reuses its pending
+        # order, and therefore the same idempotency key and payment intent
+        order = None
+        pending = session.get('pending_order')
+        if pending and pending.get('fingerprint') == fingerprint:
+            order = db.session.get(Order, pending['id'])
+            if order and order.payment_status != 'pending':
+                order = None
+        
+        if order is None:
+            holds_stock = any(not item['product'].digital_product for item in order_items)
+            if holds_stock and not hit_from_client('stock_hold'):
+                db.session.rollback()
+                return jsonify({'error': 'Too many checkouts, please try again later'}), 429
+            try:
+                if pending:
+                    # The cart or details changed: the superseded order must not
+                    # keep its units off sale until its hold expires
+                    cancel_unpaid_order(pending['id'])
+                order = _create_pending_order(data, customer_name, customer_email, total_amount,
+                                              order_items, customer_image_key)
+            except (OutOfStock, UploadError) as e:
+                db.session.rollback()
+                return jsonify({'error': str(e)}), 400
+            session['pending_order'] = {'id': order.id, 'fingerprint': fingerprint,
+                                        'image': customer_image_key}
+            consume_upload(customer_image_key)
+        
+        order_id = order.id
+        key = idempotency_key(order.order_number, fingerprint)
+        # Release the DB connection before calling out to the payment provider
+        db.session.commit()
         
-        # Add order items
-        for item_data in order_items:
-            customer_image_path = None
-            
-            # Handle customer image upload for products that require it
-            if item_data['product'].requires_image and customer_image_file:
-                import os
-                from datetime import datetime
-                from werkzeug.utils import secure_filename
-                
-                # Create uploads directory if it doesn't exist
-                upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'customer_images')
-                os.makedirs(upload_dir, exist_ok=True)
-                
-                # Generate unique filename
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                original_filename = secure_filename(customer_image_file.filename)
-                file_extension = os.path.splitext(original_filename)[1] or '.jpg'
-                filename = f"customer_{order.id}_{item_data['product'].id}_{timestamp}{file_extension}"
-                filepath = os.path.join(upload_dir, filename)
-                
-                # Save the uploaded file
-                try:
-                    customer_image_file.save(filepath)
-                    customer_image_path = f"uploads/customer_images/{filename}"
-                except Exception as e:
-                    current_app.logger.error(f"Error saving customer image: {str(e)}")
-                    return jsonify({'error': 'Error al guardar la imagen'}), 500
-            
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item_data['product'].id,
-                product_name=item_data['product'].name,
-                product_price=item_data['unit_price'],
-                quantity=item_data['quantity'],
-                customer_image=customer_image_path
+        try:
+            intent = gateway.create_payment_intent(
+                amount=int(round(total_amount * 100)),  # Stripe uses cents
+                currency='eur',
+                idempotency_key=key,
+                shipping=shipping,
+                metadata={
+                    'order_id': order_id,
+                    'customer_name': customer_name,
+                    'customer_email': customer_email,
+                    'item_count': len(order_items)
+                }
             )
-            db.session.add(order_item)
+        except PaymentError as e:
+            # The order stays pending so a retry reuses the same idempotency key
+            current_app.logger.error(f"Stripe error: {str(e)}")
+            return jsonify({'error': 'Payment processing error. Please try again.'}), 500
         
-        # Commit the order
+        order = db.session.get(Order, order_id)
+        order.stripe_payment_intent_id = intent.id
         db.session.commit()
         
         return jsonify({
             'client_secret': intent.client_secret,
-            'order_id': order.id,
+            'order_id': order_id,
             'amount': total_amount
         })
         
-    except stripe.error.StripeError as e:
-        current_app.logger.error(f"Stripe error: {str(e)}")
-        db.session.rollback()
-        return jsonify({'error': 'Payment processing error. Please try again.'}), 500
     except Exception as e:
         current_app.logger.error(f"Error creating payment intent: {str(e)}")
         db.session.rollback()
         return jsonify({'error': 'An unexpected error occurred'}), 500
 
+def _create_pending_order(data, customer_name, customer_email, total_amount, order_items,
+                          customer_image_key):
+    """Persist a pending order, its items and stock holds.
+
+    Raises OutOfStock if a physical item sold out since the cart was priced,
+    and UploadError if the customer image is no longer stored.
+    """
+    # Persist order with shipping address
+    address_line1 = data.get('address_line1', '')
+    address_line2 = data.get('address_line2', '')
+    address_city = data.get('address_city', '')
+    address_postal = data.get('address_postal', '')
+    address_country = data.get('address_country', '')
+    shipping_address = \
+        f"{address_line1}\n{address_line2}\n{address_postal} {address_city}\n{address_country}".strip()
+
+    order = Order(
+        user_id=current_user.id if current_user.is_authenticated else None,
+        customer_name=customer_name,
+        customer_email=customer_email,
+        customer_phone=data.get('phone', ''),
+        shipping_address=shipping_address,
+        total_amount=total_amount,
+        status='pending',
+        payment_status='pending'
+    )
+    
+    db.session.add(order)
+    increment('orders')
+    db.session.flush()  # Get the order ID
+    
+    # Hold physical stock until the order is paid or the hold expires
+    reserve_stock(order, order_items)
+    
+    # Add order items
+    image_items = 0
+    for item_data in order_items:
+        requires_image = bool(customer_image_key) and item_data['product'].requires_image
+        order_item = OrderItem(
+            order_id=order.id,
+            product_id=item_data['product'].id,
+            product_name=item_data['product'].name,
+            product_price=item_data['unit_price'],
+            quantity=item_data['quantity'],
+            customer_image=customer_image_key if requires_image else None
+        )
+        db.session.add(order_item)
+        image_items += 1 if requires_image else 0
+    
+    # Every item showing the image holds a reference to the stored blob
+    if image_items:
+        attach_image(customer_image_key, image_items)
+    
+    return order
+
+def _payment_succeeded(order):
+    """Ask the gateway whether the order's own payment intent has been paid in full.
+
+    The redirect to the success page proves nothing by itself; when the
+    answer is no (or unknown) the order stays pending for the webhook.
+    """
+    gateway = get_payment_gateway()
+    if gateway is None or not order.stripe_payment_intent_id:
+        return False
+    try:
+        intent = gateway.retrieve_payment_intent(order.stripe_payment_intent_id)
+    except PaymentError as e:
+        current_app.logger.error(f"Could not check payment for order {order.id}: {str(e)}")
+        return False
+    return intent.status == 'succeeded' and intent.amount == int(round(order.total_amount * 100))
+
 @bp.route('/payment-success')
 def payment_success():
     """Payment success page."""
@@ -406,20 +446,23 @@ def payment_success():
     
     if order_id:
         order = Order.query.get(order_id)
-        if order and order.payment_status == 'pending':
-            order.payment_status = 'paid'
+        if order and order.payment_status == 'pending' and _payment_succeeded(order):
+            order.mark_as_paid()
             db.session.commit()
             
             # Clear the cart after successful payment
-            session.pop('cart', None)
-            session.modified = True
+            key = cart_key()
+            if key is not None:
+                get_cart_store().clear(key)
+                refresh_cart_summary(key)
     
     return render_template('payment_success.html', order=order)
 
 @bp.route('/order/<order_id>')
 def order_detail(order_id):
     """Order detail page."""
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(selectinload(Order.items))\
+                       .filter_by(id=order_id).first_or_404()
     return render_template('order_detail.html', order=order)
 
 @bp.route('/my-orders')
@@ -430,17 +473,16 @@ def my_orders():
         flash('Please provide your email address to view orders.', 'warning')
         return redirect(url_for('main.contact'))
     
-    orders = Order.query.filter_by(customer_email=email)\
+    orders = Order.query.options(selectinload(Order.items).joinedload(OrderItem.product))\
+                       .filter_by(customer_email=email)\
                        .order_by(Order.created_at.desc()).all()
     
-    return render_template('my_orders.html', orders=orders, email=email)
+    return render_template('auth/my_orders.html', orders=orders, email=email)
 
 @bp.route('/download-customer-image/<int:order_item_id>')
 @login_required
 def download_customer_image(order_item_id):
-    """Download customer image for admin."""
-    from flask import send_from_directory
-    
+    """Download customer image for admin (``?thumbnail=1`` for an inline preview)."""
     order_item = OrderItem.query.get_or_404(order_item_id)
     
     if not order_item.customer_image:
@@ -452,41 +494,27 @@ def download_customer_image(order_item_id):
         flash('No tienes permisos para acceder a esta imagen.', 'error')
         return redirect(url_for('main.index'))
     
-    upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'customer_images')
-    filename = os.path.basename(order_item.customer_image)
+    blob = db.session.get(Blob, order_item.customer_image)
+    if blob is None:
+        abort(404)
     
-    return send_from_directory(upload_dir, filename, as_attachment=True)
+    thumbnail = bool(request.args.get('thumbnail')) and blob.thumbnail_key
+    if thumbnail:
+        blob = db.session.get(Blob, blob.thumbnail_key) or abort(404)
+    extension = mimetypes.guess_extension(blob.content_type or '') or ''
+    
+    # Bytes are sent by send_blob, or by the web server when offloading is configured
+    return send_blob(blob,
+                     download_name=f'pedido_{order_item.order_id}_{order_item.id}{extension}',
+                     as_attachment=not thumbnail)
 
 @bp.route('/webhook', methods=['POST'])
 def stripe_webhook():
-    """Handle Stripe webhooks for payment confirmations."""
-    payload = request.get_data(as_text=True)
-    sig_header = request.headers.get('Stripe-Signature')
-    
+    """Record Stripe webhook events; orders are updated in batches by the job worker."""
     try:
-        # In production, you should verify the webhook signature
-        # endpoint_secret = 'whsec_...'
-        # event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
-        
-        # For now, just parse the event
-        import json
-        event = json.loads(payload)
-        
-        if event['type'] == 'payment_intent.succeeded':
-            payment_intent = event['data']['object']
-            
-            # Find the corresponding order
-            order = Order.query.filter_by(
-                stripe_payment_intent_id=payment_intent['id']
-            ).first()
-            
-            if order:
-                order.mark_as_paid()
-                db.session.commit()
-                current_app.logger.info(f"Order {order.order_id} marked as paid via webhook")
-        
-        return jsonify({'status': 'success'})
-        
-    except Exception as e:
-        current_app.logger.error(f"Webhook error: {str(e)}")
-        return jsonify({'error': str(e)}), 400
\ No newline at end of file
+        outcome = ingest_event(request.get_data(as_text=True), request.headers.get('Stripe-Signature'))
+    except WebhookError as e:
+        current_app.logger.warning(f"Rejected webhook: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'status': 'success', 'result': outcome})
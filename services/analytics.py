@@ -0,0 +1,173 @@
+from datetime import datetime, time, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, or_
+
+from app import db
+from models.analytics import DailySales, DailyProductSales, RollupWatermark
+from models.order import Order, OrderItem
+from models.product import Product
+
+WATERMARK_NAME = 'sales'
+PERIODS = ('day', 'week', 'month')
+
+
+def _order_day():
+    return db.func.date(Order.created_at, type_=db.Date)
+
+
+def _in_days(days):
+    """Filter orders created on ``days`` with index-friendly half-open ranges.
+
+    Consecutive days are merged into a single range.
+    """
+    ranges = []
+    for day in sorted(days):
+        start = datetime.combine(day, time.min)
+        end = start + timedelta(days=1)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return or_(*(and_(Order.created_at >= start, Order.created_at < end) for start, end in ranges))
+
+
+def _dirty_days(watermark):
+    """Return the order days touched since ``watermark`` and the new watermark.
+
+    Rows updated up to ROLLUP_WATERMARK_OVERLAP seconds before the
+    watermark are looked at again: ``updated_at`` is set before commit, so
+    a transaction committing after the last refresh can carry an earlier
+    timestamp than rows that refresh already saw.
+    """
+    day = _order_day()
+    query = db.session.query(day, db.func.max(Order.updated_at))
+    if watermark is not None:
+        overlap = timedelta(seconds=current_app.config['ROLLUP_WATERMARK_OVERLAP'])
+        query = query.filter(Order.updated_at > watermark - overlap)
+    rows = query.group_by(day).all()
+
+    days = {row_day for row_day, last_update in rows if row_day is not None}
+    new_watermark = max((last_update for row_day, last_update in rows if last_update), default=None)
+    if watermark is not None and (new_watermark is None or new_watermark < watermark):
+        new_watermark = watermark
+    return days, new_watermark
+
+
+def _rebuild_days(days):
+    day = _order_day()
+    paid = Order.payment_status == 'paid'
+    in_days = _in_days(days)
+
+    DailySales.query.filter(DailySales.day.in_(days)).delete(synchronize_session=False)
+    DailyProductSales.query.filter(DailyProductSales.day.in_(days)).delete(synchronize_session=False)
+
+    totals = db.session.query(
+        day, db.func.count(Order.id), db.func.sum(Order.total_amount)
+    ).filter(paid, in_days).group_by(day).all()
+    items = dict(db.session.query(day, db.func.sum(OrderItem.quantity))
+                 .join(OrderItem, OrderItem.order_id == Order.id)
+                 .filter(paid, in_days).group_by(day).all())
+    for row_day, orders, revenue in totals:
+        db.session.add(DailySales(day=row_day, orders=orders,
+                                  items=items.get(row_day) or 0, revenue=revenue or 0))
+
+    products = db.session.query(
+        day, OrderItem.product_id, db.func.max(OrderItem.product_name), db.func.max(Product.category),
+        db.func.sum(OrderItem.quantity), db.func.sum(OrderItem.quantity * OrderItem.product_price)
+    ).join(Order, OrderItem.order_id == Order.id)\
+     .outerjoin(Product, OrderItem.product_id == Product.id)\
+     .filter(paid, in_days)\
+     .group_by(day, OrderItem.product_id).all()
+    for row_day, product_id, name, category, quantity, revenue in products:
+        db.session.add(DailyProductSales(day=row_day, product_id=product_id,
+                                         product_name=name, category=category or 'other',
+                                         quantity=quantity or 0, revenue=revenue or 0))
+
+
+def refresh_rollups(full=False, batch_days=31):
+    """Bring the daily rollups up to date with the orders table.
+
+    Only days with orders created or updated since the last refresh are
+    recomputed, so the cost follows recent activity rather than history.
+    Returns the number of days rebuilt.
+    """
+    state = db.session.get(RollupWatermark, WATERMARK_NAME)
+    watermark = state.watermark if state and not full else None
+
+    days, new_watermark = _dirty_days(watermark)
+    days = sorted(days)
+    for start in range(0, len(days), batch_days):
+        _rebuild_days(days[start:start + batch_days])
+
+    if new_watermark is not None:
+        if state is None:
+            db.session.add(RollupWatermark(name=WATERMARK_NAME, watermark=new_watermark))
+        else:
+            state.watermark = new_watermark
+    db.session.commit()
+    return len(days)
+
+
+def _period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def sales_report(period='day', days=90):
+    """Aggregate the rollups of the last ``days`` days into ``period`` buckets."""
+    since = datetime.utcnow().date() - timedelta(days=days)
+    buckets = {}
+    for row in DailySales.query.filter(DailySales.day >= since).order_by(DailySales.day):
+        bucket = buckets.setdefault(_period_start(row.day, period), {
+            'orders': 0, 'items': 0, 'revenue': 0, 'categories': {}
+        })
+        bucket['orders'] += row.orders
+        bucket['items'] += row.items
+        bucket['revenue'] += row.revenue
+
+    products = {}
+    categories = {}
+    for row in DailyProductSales.query.filter(DailyProductSales.day >= since):
+        product = products.setdefault(row.product_id, {
+            'name': row.product_name, 'category': row.category, 'quantity': 0, 'revenue': 0
+        })
+        product['quantity'] += row.quantity
+        product['revenue'] += row.revenue
+        categories[row.category] = categories.get(row.category, 0) + row.revenue
+
+        bucket = buckets.get(_period_start(row.day, period))
+        if bucket is not None:
+            bucket['categories'][row.category] = bucket['categories'].get(row.category, 0) + row.revenue
+
+    series = []
+    for start in sorted(buckets):
+        bucket = buckets[start]
+        bucket['start'] = start
+        bucket['average_order_value'] = bucket['revenue'] / bucket['orders'] if bucket['orders'] else 0
+        series.append(bucket)
+
+    return {
+        'series': series,
+        'max_revenue': max((bucket['revenue'] for bucket in series), default=0),
+        'orders': sum(bucket['orders'] for bucket in series),
+        'revenue': sum(bucket['revenue'] for bucket in series),
+        'products': sorted(products.values(), key=lambda p: p['revenue'], reverse=True),
+        'categories': sorted(categories.items(), key=lambda c: c[1], reverse=True)
+    }
+
+
+analytics_cli = AppGroup('analytics', help='Sales rollup commands.')
+
+
+@analytics_cli.command('refresh')
+@click.option('--full', is_flag=True, help='Rebuild every day instead of only changed ones.')
+def refresh_command(full):
+    """Refresh the daily sales rollups."""
+    days = refresh_rollups(full=full)
+    click.echo(f'Rebuilt rollups for {days} day(s).')
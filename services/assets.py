@@ -0,0 +1,217 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+
+import click
+from flask import abort, current_app, request, send_file, url_for
+from flask.cli import AppGroup
+
+HASH_LENGTH = 12
+ONE_YEAR = 365 * 24 * 3600
+
+# Precompressed variants, in order of preference when the client accepts both
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+COMPRESS_MIN_SIZE = 1024
+
+_FINGERPRINT_RE = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % HASH_LENGTH)
+
+
+def fingerprinted_name(filename, digest):
+    """``css/base.css`` -> ``css/base.<hash>.css``."""
+    stem, ext = os.path.splitext(filename)
+    return f'{stem}.{digest[:HASH_LENGTH]}{ext}'
+
+
+def _asset_files(static_folder, exclude):
+    for directory, dirnames, filenames in os.walk(static_folder):
+        relative_dir = os.path.relpath(directory, static_folder)
+        if relative_dir == '.':
+            dirnames[:] = [name for name in dirnames if name not in exclude and not name.startswith('.')]
+        else:
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        for name in filenames:
+            if name.startswith('.') or name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(directory, name)
+            yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_manifest(static_folder, exclude=()):
+    """Map every static file (outside ``exclude`` top-level dirs) to its fingerprinted name."""
+    return {filename: fingerprinted_name(filename, _file_digest(path))
+            for filename, path in sorted(_asset_files(static_folder, exclude))}
+
+
+def write_manifest(manifest, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _compressors():
+    compressors = {'gzip': lambda data: gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        compressors['br'] = lambda data: brotli.compress(data, quality=11)
+    return compressors
+
+
+def compress_assets(static_folder, manifest):
+    """Write .gz (and .br with the brotli package) next to compressible assets.
+
+    Variants are skipped when they would not be smaller; returns the number written.
+    """
+    compressors = _compressors()
+    written = 0
+    for filename in manifest:
+        mimetype = mimetypes.guess_type(filename)[0] or ''
+        if not mimetype.startswith(COMPRESSIBLE_TYPES):
+            continue
+        path = os.path.join(static_folder, filename)
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < COMPRESS_MIN_SIZE:
+            continue
+        for encoding, suffix in ENCODINGS:
+            if encoding not in compressors:
+                continue
+            compressed = compressors[encoding](data)
+            if len(compressed) >= len(data):
+                continue
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written += 1
+    return written
+
+
+def _manifest_is_current(manifest, path, static_folder):
+    built = os.stat(path).st_mtime
+    for filename in manifest:
+        try:
+            if os.stat(os.path.join(static_folder, filename)).st_mtime > built:
+                return False
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def _load_manifest(app):
+    path = app.config['ASSET_MANIFEST_FILE']
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+        if _manifest_is_current(manifest, path, app.static_folder):
+            return manifest
+        app.logger.warning(f"{path} is older than the static files; run `flask assets build`")
+    except FileNotFoundError:
+        pass
+    # Fingerprint what is on disk now
+    if not os.path.isdir(app.static_folder):
+        return {}
+    return build_manifest(app.static_folder, app.config['ASSET_EXCLUDE'])
+
+
+def asset_url(filename):
+    """URL of a static file; a content-hashed, long-cached one when fingerprinting is on."""
+    assets = current_app.extensions.get('assets')
+    fingerprinted = assets and assets['manifest'].get(filename)
+    if not fingerprinted:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=fingerprinted)
+
+
+def _preferred_variant(path):
+    """(path, encoding) of the best precompressed variant the client accepts.
+
+    Variants older than the file are ignored, so a stale one is never served.
+    """
+    mtime = os.stat(path).st_mtime
+    for encoding, suffix in ENCODINGS:
+        if not request.accept_encodings[encoding]:
+            continue
+        try:
+            if os.stat(path + suffix).st_mtime >= mtime:
+                return path + suffix, encoding
+        except FileNotFoundError:
+            continue
+    return path, None
+
+
+def asset_view(filename):
+    """Serve a fingerprinted asset with far-future immutable caching."""
+    assets = current_app.extensions['assets']
+    original = assets['reverse'].get(filename)
+    immutable = original is not None
+    if original is None:
+        # An old fingerprint (e.g. a page rendered before a deploy): serve
+        # the current file, but do not let it be cached under that URL
+        match = _FINGERPRINT_RE.match(filename)
+        if match is None:
+            abort(404)
+        original = match.group('stem') + match.group('ext')
+        if original not in assets['manifest']:
+            abort(404)
+
+    path = os.path.join(current_app.static_folder, *original.split('/'))
+    variant, encoding = _preferred_variant(path)
+    response = send_file(variant, mimetype=mimetypes.guess_type(original)[0], conditional=True,
+                         max_age=ONE_YEAR if immutable else None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    """Fingerprint static assets and expose ``asset_url`` to templates.
+
+    The manifest comes from ASSET_MANIFEST_FILE (written by `flask assets
+    build`) or is built from the static folder at startup. With
+    ASSET_FINGERPRINTING off (development), ``asset_url`` returns plain
+    static URLs so edits show up without a rebuild.
+    """
+    app.add_template_global(asset_url)
+    if not app.config.get('ASSET_FINGERPRINTING'):
+        return
+
+    manifest = _load_manifest(app)
+    app.extensions['assets'] = {
+        'manifest': manifest,
+        'reverse': {fingerprinted: filename for filename, fingerprinted in manifest.items()},
+    }
+    app.add_url_rule(f"{app.config['ASSET_URL_PREFIX'].rstrip('/')}/<path:filename>", 'asset', asset_view)
+
+
+assets_cli = AppGroup('assets', help='Static asset commands.')
+
+
+@assets_cli.command('build')
+@click.option('--compress/--no-compress', default=True, help='Write precompressed .gz/.br variants.')
+def build_command(compress):
+    """Write the asset manifest (and compressed variants) for the static folder."""
+    static_folder = current_app.static_folder
+    manifest = build_manifest(static_folder, current_app.config['ASSET_EXCLUDE'])
+    write_manifest(manifest, current_app.config['ASSET_MANIFEST_FILE'])
+    click.echo(f'Fingerprinted {len(manifest)} asset(s).')
+    if compress:
+        click.echo(f'Wrote {compress_assets(static_folder, manifest)} compressed variant(s).')
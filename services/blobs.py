@@ -0,0 +1,359 @@
+import hashlib
+import io
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, request, send_file
+from flask.cli import AppGroup
+from sqlalchemy import update
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import wrap_file
+
+from app import db
+from models.blob import Blob
+from services.counters import insert_for_dialect
+
+_KEY_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def blob_path(key):
+    """Relative location of a blob: two levels of fan-out by key prefix (ab/cd/abcd...)."""
+    if not _KEY_RE.match(key or ''):
+        raise ValueError(f'Invalid blob key: {key!r}')
+    return f'{key[:2]}/{key[2:4]}/{key}'
+
+
+class LocalBlobStore:
+    """Blobs as files under ``root``, fanned out so no directory grows too large."""
+
+    def __init__(self, root):
+        self.root = root
+        # Uploads are staged on the same filesystem so storing them is a rename
+        self.staging_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, *blob_path(key).split('/'))
+
+    def local_path(self, key):
+        return self._path(key)
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def put_file(self, key, path, content_type=None):
+        """Move the file at ``path`` into the store; returns False if the blob was already there."""
+        target = self._path(key)
+        if os.path.exists(target):
+            os.remove(path)
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f'{target}.{secrets.token_hex(4)}.part'
+        shutil.move(path, tmp_path)
+        os.replace(tmp_path, target)
+        return True
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+def _not_found(error):
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code in ('404', 'NoSuchKey', 'NotFound')
+
+
+class S3BlobStore:
+    """Blobs in an S3-compatible bucket.
+
+    ``client`` only needs boto3's ``put_object``/``head_object``/
+    ``get_object``/``delete_object``; MemoryS3Client stands in for it locally.
+    """
+
+    staging_dir = None
+
+    def __init__(self, client, bucket, prefix='blobs/'):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    @classmethod
+    def from_config(cls, config):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError('The boto3 package is required for the s3 blob store') from e
+        client = boto3.client('s3', endpoint_url=config.get('BLOB_S3_ENDPOINT_URL'))
+        return cls(client, config['BLOB_S3_BUCKET'], config.get('BLOB_S3_PREFIX') or '')
+
+    def _key(self, key):
+        return self.prefix + blob_path(key)
+
+    def local_path(self, key):
+        return None
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            if _not_found(e):
+                return False
+            raise
+        return True
+
+    def put_file(self, key, path, content_type=None):
+        if self.exists(key):
+            os.remove(path)
+            return False
+        with open(path, 'rb') as f:
+            self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=f,
+                                   ContentType=content_type or 'application/octet-stream')
+        os.remove(path)
+        return True
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+
+class MemoryS3Client:
+    """In-process stand-in for an S3 client, for tests and local development."""
+
+    class NoSuchKey(Exception):
+        def __init__(self, key):
+            super().__init__(key)
+            self.response = {'Error': {'Code': 'NoSuchKey', 'Key': key}}
+
+    def __init__(self):
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def _get(self, bucket, key):
+        with self._lock:
+            try:
+                return self.objects[bucket, key]
+            except KeyError:
+                raise self.NoSuchKey(key) from None
+
+    def put_object(self, Bucket, Key, Body, ContentType='application/octet-stream', **kwargs):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        with self._lock:
+            self.objects[Bucket, Key] = (data, ContentType)
+        return {'ETag': '"%s"' % hashlib.md5(data).hexdigest()}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        data, content_type = self._get(Bucket, Key)
+        return {'ContentLength': len(data), 'ContentType': content_type}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        data, content_type = self._get(Bucket, Key)
+        return {'Body': io.BytesIO(data), 'ContentLength': len(data), 'ContentType': content_type}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+
+def create_blob_store(config):
+    """Build the store configured by BLOB_STORE: ``local``, ``s3`` or ``memory``."""
+    backend = config.get('BLOB_STORE') or 'local'
+    if backend == 'local':
+        return LocalBlobStore(config['BLOB_STORE_DIR'])
+    if backend == 's3':
+        return S3BlobStore.from_config(config)
+    if backend == 'memory':
+        return S3BlobStore(MemoryS3Client(), 'memory')
+    raise ValueError(f'Unknown blob store: {backend}')
+
+
+def get_blob_store():
+    """Return the app's blob store, created on first use."""
+    store = current_app.extensions.get('blobs')
+    if store is None:
+        store = current_app.extensions['blobs'] = create_blob_store(current_app.config)
+    return store
+
+
+def send_blob(blob, download_name=None, as_attachment=True):
+    """Build the response serving a blob, with Range and conditional request support.
+
+    The key is the ETag, since a blob's content never changes. With
+    BLOB_DOWNLOAD_OFFLOAD set to ``x-accel-redirect`` (nginx) or
+    ``x-sendfile`` (Apache, lighttpd), only headers are returned and the web
+    server transfers the bytes, so the worker is free once the caller's
+    permission check has passed.
+    """
+    store = get_blob_store()
+    offload = current_app.config.get('BLOB_DOWNLOAD_OFFLOAD')
+    mimetype = blob.content_type or 'application/octet-stream'
+    path = store.local_path(blob.key)
+
+    if path and offload is None:
+        response = send_file(path, mimetype=mimetype, as_attachment=as_attachment,
+                             download_name=download_name, conditional=True,
+                             etag=blob.key, last_modified=blob.created_at)
+        response.accept_ranges = 'bytes'
+    elif not is_resource_modified(request.environ, etag=blob.key, last_modified=blob.created_at):
+        response = current_app.response_class(status=304)
+    elif offload == 'x-accel-redirect':
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = current_app.config['BLOB_ACCEL_PREFIX'] + blob_path(blob.key)
+    elif offload == 'x-sendfile' and path:
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Sendfile'] = path
+    else:
+        # Remote stores: stream the object, skipping to the requested range
+        response = current_app.response_class(wrap_file(request.environ, store.open(blob.key)),
+                                              mimetype=mimetype, direct_passthrough=True)
+        response.content_length = blob.size
+        response.set_etag(blob.key)
+        response.last_modified = blob.created_at
+        # make_conditional only advertises ranges on a 206; say so on full responses too
+        response.accept_ranges = 'bytes'
+        response.make_conditional(request, accept_ranges=True, complete_length=blob.size)
+
+    if response.status_code != 304 and 'Content-Disposition' not in response.headers:
+        response.headers.set('Content-Disposition', 'attachment' if as_attachment else 'inline',
+                             filename=download_name or blob.key)
+    response.set_etag(blob.key)
+    response.last_modified = blob.created_at
+    response.cache_control.no_cache = None
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config['BLOB_DOWNLOAD_MAX_AGE']
+    return response
+
+
+def register_blob(key, size, content_type=None):
+    """Record a stored blob, or mark an existing one as just used."""
+    now = datetime.utcnow()
+    statement = insert_for_dialect()(Blob).values(
+        key=key, size=size, content_type=content_type, refcount=0, created_at=now, last_used_at=now
+    ).on_conflict_do_update(
+        index_elements=[Blob.key],
+        set_={'last_used_at': now}
+    )
+    db.session.execute(statement)
+
+
+def store_file(key, path, size, content_type=None):
+    """Move a staged file into the blob store under ``key`` and record it.
+
+    Identical content is stored once: if the key exists the staged copy is
+    dropped. The row is written first so that it stays locked until the
+    caller commits: a purge either waits and then sees the blob as just used,
+    or finishes deleting the file before put_file() looks for it.
+    """
+    register_blob(key, size, content_type)
+    get_blob_store().put_file(key, path, content_type)
+    return key
+
+
+def store_bytes(data, content_type=None):
+    """Store ``data`` and return its key."""
+    key = hashlib.sha256(data).hexdigest()
+    fd, path = tempfile.mkstemp(dir=get_blob_store().staging_dir, suffix='.part')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return store_file(key, path, len(data), content_type)
+
+
+def add_references(key, count=1):
+    """Count ``count`` more references to a blob; returns False if it is unknown."""
+    result = db.session.execute(
+        update(Blob)
+        .where(Blob.key == key)
+        .values(refcount=Blob.refcount + count, last_used_at=datetime.utcnow())
+    )
+    return result.rowcount == 1
+
+
+def release_references(key, count=1):
+    """Drop ``count`` references; unreferenced blobs are deleted by purge_blobs()."""
+    db.session.execute(
+        update(Blob)
+        .where(Blob.key == key)
+        .values(refcount=Blob.refcount - count, last_used_at=datetime.utcnow())
+    )
+
+
+def purge_blobs(before):
+    """Delete blobs with no references that have not been used since ``before``."""
+    store = get_blob_store()
+    keys = [key for key, in db.session.query(Blob.key)
+            .filter(Blob.refcount <= 0, Blob.last_used_at < before)]
+    purged = 0
+    for key in keys:
+        blob = db.session.get(Blob, key)
+        # Re-check: the blob may have been referenced or re-uploaded meanwhile
+        deleted = Blob.query.filter(Blob.key == key, Blob.refcount <= 0, Blob.last_used_at < before)\
+                            .delete(synchronize_session=False)
+        if not deleted:
+            continue
+        if blob.thumbnail_key:
+            release_references(blob.thumbnail_key)
+        # Delete the file while the row is still locked; a concurrent
+        # store_file() waits for this commit and then stores it again
+        try:
+            store.delete(key)
+        except Exception:
+            db.session.rollback()
+            raise
+        db.session.commit()
+        purged += 1
+    return purged
+
+
+blobs_cli = AppGroup('blobs', help='Content-addressed file store commands.')
+
+
+@blobs_cli.command('purge')
+@click.option('--hours', default=None, type=int,
+              help='Hours an unreferenced blob is kept (default BLOB_ORPHAN_TTL).')
+def purge_command(hours):
+    """Delete stored files nothing refers to any more."""
+    hours = hours if hours is not None else current_app.config['BLOB_ORPHAN_TTL'] // 3600
+    count = purge_blobs(datetime.utcnow() - timedelta(hours=hours))
+    click.echo(f'Deleted {count} blob(s).')
+
+
+@blobs_cli.command('import-legacy')
+def import_legacy_command():
+    """Move customer images saved under static/ into the blob store."""
+    from models.order import OrderItem
+    from services.uploads import sniff_image_type
+
+    legacy = OrderItem.query.filter(OrderItem.customer_image.like('%/%')).all()
+    by_path = {}
+    for item in legacy:
+        by_path.setdefault(item.customer_image, []).append(item)
+
+    imported = 0
+    for path, items in by_path.items():
+        source = os.path.join(current_app.root_path, 'static', path)
+        if not os.path.exists(source):
+            click.echo(f'Missing {path}, skipped.')
+            continue
+        with open(source, 'rb') as f:
+            data = f.read()
+        key = store_bytes(data, sniff_image_type(data[:16]))
+        add_references(key, len(items))
+        for item in items:
+            item.customer_image = key
+        db.session.commit()
+        imported += 1
+    click.echo(f'Imported {imported} of {len(by_path)} file(s) referenced by {len(legacy)} order item(s).')
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Small thread-safe least-recently-used mapping."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MemoryBackend:
+    """Per-worker LRU backend. Timeouts are ignored; keys are versioned."""
+
+    def __init__(self, maxsize=256):
+        self._cache = LRUCache(maxsize)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, timeout=None):
+        self._cache.set(key, value)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+
+class FileSystemBackend:
+    """Backend storing one file per key, shared by every worker on a host.
+
+    ``set`` prunes the directory at most every ``prune_interval`` seconds:
+    expired entries (including those of superseded versioned keys) are
+    deleted, then the oldest ones beyond ``maxsize``.
+    """
+
+    def __init__(self, directory, maxsize=None, prune_interval=60):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.prune_interval = prune_interval
+        self._next_prune = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires = struct.unpack('>d', f.read(8))[0]
+                if expires and expires < time.time():
+                    return None
+                return f.read()
+        except (FileNotFoundError, struct.error):
+            return None
+
+    def set(self, key, value, timeout=None):
+        expires = time.time() + timeout if timeout else 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(struct.pack('>d', expires))
+            f.write(value)
+        os.replace(tmp_path, self._path(key))
+        if time.time() >= self._next_prune:
+            self._next_prune = time.time() + self.prune_interval
+            self.prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def prune(self):
+        """Delete expired entries and trim to ``maxsize``; returns the number removed."""
+        now = time.time()
+        stale = []
+        live = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.tmp') or not entry.is_file():
+                continue
+            try:
+                with open(entry.path, 'rb') as f:
+                    expires = struct.unpack('>d', f.read(8))[0]
+                written = entry.stat().st_mtime
+            except (OSError, struct.error):
+                continue
+            if expires and expires < now:
+                stale.append(entry.path)
+            else:
+                live.append((written, entry.path))
+
+        if self.maxsize and len(live) > self.maxsize:
+            live.sort()
+            stale += [path for written, path in live[:len(live) - self.maxsize]]
+
+        for path in stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return len(stale)
+
+
+class RedisBackend:
+    """Backend for any client exposing Redis' ``get``/``set``/``delete``."""
+
+    def __init__(self, client, prefix='ba:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('The redis package is required for the redis cache backend') from e
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, timeout=None):
+        self.client.set(self.prefix + key, value, ex=timeout or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def create_backend(config, name):
+    """Build the backend configured under ``<NAME>_BACKEND``.
+
+    ``memory`` (default), ``filesystem`` (``<NAME>_DIR``) or ``redis``
+    (``<NAME>_REDIS_URL``); ``<NAME>_SIZE`` caps the memory and filesystem
+    entry counts. Returns None when set to ``null``.
+    """
+    backend = config.get(f'{name}_BACKEND') or 'memory'
+    if backend == 'null':
+        return None
+    if backend == 'memory':
+        return MemoryBackend(config.get(f'{name}_SIZE') or 256)
+    if backend == 'filesystem':
+        return FileSystemBackend(config[f'{name}_DIR'], config.get(f'{name}_SIZE'))
+    if backend == 'redis':
+        return RedisBackend.from_url(config[f'{name}_REDIS_URL'])
+    raise ValueError(f'Unknown cache backend: {backend}')
@@ -0,0 +1,337 @@
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, session
+from flask.cli import AppGroup
+from flask_login import current_user
+from sqlalchemy import update
+
+from app import db
+from models.cart import Cart, CartItem
+from models.product import Product
+from services.catalog import catalog_version, get_catalog
+from services.counters import insert_for_dialect
+
+
+def _product_ids(cart):
+    """Return the integer product ids referenced by a cart."""
+    ids = []
+    for product_id in cart:
+        try:
+            ids.append(int(product_id))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def load_cart_products(cart):
+    """Load every product referenced by the cart with a single IN query."""
+    ids = _product_ids(cart)
+    if not ids:
+        return {}
+    products = Product.query.filter(Product.id.in_(ids)).all()
+    return {str(product.id): product for product in products}
+
+
+def resolve_cart(cart):
+    """Price a cart given as {product_id: quantity}.
+
+    Returns a dict with the priced line ``items`` (product, quantity,
+    unit_price, subtotal), the cart ``total`` and the ids of the
+    ``unavailable`` products that were left out.
+    """
+    products = load_cart_products(cart)
+    items = []
+    unavailable = []
+    total = 0
+
+    for product_id, quantity in cart.items():
+        product = products.get(str(product_id))
+        if not product or not product.is_available:
+            unavailable.append(product_id)
+            continue
+
+        subtotal = product.price * quantity
+        items.append({
+            'product': product,
+            'quantity': quantity,
+            'unit_price': product.price,
+            'subtotal': subtotal
+        })
+        total += subtotal
+
+    return {
+        'items': items,
+        'total': total,
+        'unavailable': unavailable
+    }
+
+
+class MemoryCartStore:
+    """Per-process carts for tests and single-process development."""
+
+    def __init__(self):
+        self._carts = {}
+        self._lock = threading.Lock()
+
+    def _cart(self, key):
+        cart = self._carts.setdefault(key, {'lines': {}, 'count': 0})
+        cart['updated_at'] = datetime.utcnow()
+        return cart
+
+    def lines(self, key):
+        cart = self._carts.get(key)
+        return dict(cart['lines']) if cart else {}
+
+    def count(self, key):
+        cart = self._carts.get(key)
+        return cart['count'] if cart else 0
+
+    def revision(self, key):
+        cart = self._carts.get(key)
+        return cart['updated_at'].isoformat() if cart else None
+
+    def add(self, key, product_id, quantity):
+        with self._lock:
+            cart = self._cart(key)
+            product_id = str(product_id)
+            cart['lines'][product_id] = cart['lines'].get(product_id, 0) + quantity
+            cart['count'] += quantity
+            return cart['count']
+
+    def set(self, key, product_id, quantity):
+        with self._lock:
+            cart = self._cart(key)
+            product_id = str(product_id)
+            cart['count'] -= cart['lines'].pop(product_id, 0)
+            if quantity > 0:
+                cart['lines'][product_id] = quantity
+                cart['count'] += quantity
+            return cart['count']
+
+    def remove(self, key, product_id):
+        return self.set(key, product_id, 0)
+
+    def clear(self, key):
+        with self._lock:
+            self._carts.pop(key, None)
+
+    def merge(self, source, target):
+        for product_id, quantity in self.lines(source).items():
+            self.add(target, product_id, quantity)
+        self.clear(source)
+
+    def purge(self, before):
+        with self._lock:
+            stale = [key for key, cart in self._carts.items() if cart['updated_at'] < before]
+            for key in stale:
+                del self._carts[key]
+        return len(stale)
+
+
+class DatabaseCartStore:
+    """Carts in the carts and cart_items tables, shared by every worker.
+
+    Each operation touches one line by primary key and commits in a single
+    transaction with the cart's item count.
+    """
+
+    def lines(self, key):
+        rows = db.session.query(CartItem.product_id, CartItem.quantity)\
+                         .filter(CartItem.cart_id == key).all()
+        return {str(product_id): quantity for product_id, quantity in rows}
+
+    def count(self, key):
+        return db.session.query(Cart.item_count).filter(Cart.id == key).scalar() or 0
+
+    def revision(self, key):
+        """Return when the cart last changed, as a string, or None if it has no row."""
+        updated_at = db.session.query(Cart.updated_at).filter(Cart.id == key).scalar()
+        return updated_at.isoformat() if updated_at else None
+
+    def _upsert_cart(self, key, delta):
+        now = datetime.utcnow()
+        statement = insert_for_dialect()(Cart).values(
+            id=key, item_count=delta, created_at=now, updated_at=now
+        ).on_conflict_do_update(
+            index_elements=[Cart.id],
+            set_={'item_count': Cart.item_count + delta, 'updated_at': now}
+        )
+        db.session.execute(statement)
+
+    def _add(self, key, product_id, quantity):
+        self._upsert_cart(key, quantity)
+        statement = insert_for_dialect()(CartItem).values(
+            cart_id=key, product_id=int(product_id), quantity=quantity
+        ).on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id],
+            set_={'quantity': CartItem.quantity + quantity}
+        )
+        db.session.execute(statement)
+
+    def add(self, key, product_id, quantity):
+        self._add(key, product_id, quantity)
+        db.session.commit()
+        return self.count(key)
+
+    def _recount(self, key):
+        total = db.session.query(db.func.coalesce(db.func.sum(CartItem.quantity), 0))\
+                          .filter(CartItem.cart_id == key).scalar_subquery()
+        db.session.execute(update(Cart).where(Cart.id == key).values(item_count=total))
+
+    def set(self, key, product_id, quantity):
+        # Upserting the cart first locks its row, so concurrent updates of
+        # one cart run one after the other; the line is then written with
+        # its absolute quantity and the count recomputed, never patched
+        # with a delta read earlier.
+        product_id = int(product_id)
+        self._upsert_cart(key, 0)
+        if quantity > 0:
+            statement = insert_for_dialect()(CartItem).values(
+                cart_id=key, product_id=product_id, quantity=quantity
+            ).on_conflict_do_update(
+                index_elements=[CartItem.cart_id, CartItem.product_id],
+                set_={'quantity': quantity}
+            )
+            db.session.execute(statement)
+        else:
+            CartItem.query.filter_by(cart_id=key, product_id=product_id)\
+                          .delete(synchronize_session=False)
+        self._recount(key)
+        db.session.commit()
+        return self.count(key)
+
+    def remove(self, key, product_id):
+        return self.set(key, product_id, 0)
+
+    def clear(self, key):
+        CartItem.query.filter_by(cart_id=key).delete(synchronize_session=False)
+        Cart.query.filter_by(id=key).delete(synchronize_session=False)
+        db.session.commit()
+
+    def merge(self, source, target):
+        for product_id, quantity in self.lines(source).items():
+            self._add(target, product_id, quantity)
+        self.clear(source)
+
+    def purge(self, before):
+        stale = db.session.query(Cart.id).filter(Cart.updated_at < before)
+        CartItem.query.filter(CartItem.cart_id.in_(stale.scalar_subquery()))\
+                      .delete(synchronize_session=False)
+        count = Cart.query.filter(Cart.updated_at < before).delete(synchronize_session=False)
+        db.session.commit()
+        return count
+
+
+CART_STORES = {
+    'database': DatabaseCartStore,
+    'memory': MemoryCartStore,
+}
+
+
+def get_cart_store():
+    """Return the app's cart store, chosen by the CART_STORE setting."""
+    store = current_app.extensions.get('cart_store')
+    if store is None:
+        store = current_app.extensions['cart_store'] = CART_STORES[current_app.config['CART_STORE']]()
+    return store
+
+
+def cart_key(create=False):
+    """Return the store key for the current visitor's cart.
+
+    Anonymous visitors get a random token in their session the first time
+    ``create`` is requested; until then they have no cart (None).
+    """
+    if current_user.is_authenticated:
+        key = f'user:{current_user.id}'
+    else:
+        token = session.get('cart_token')
+        if token is None:
+            if not create and 'cart' not in session:
+                return None
+            token = session['cart_token'] = secrets.token_urlsafe(16)
+        key = f'session:{token}'
+
+    # Carts from before the server-side store still live in the cookie
+    legacy = session.pop('cart', None)
+    if legacy:
+        store = get_cart_store()
+        for product_id, quantity in legacy.items():
+            store.add(key, product_id, quantity)
+    return key
+
+
+def current_cart():
+    """Return the current visitor's cart lines as {product_id: quantity}."""
+    key = cart_key()
+    return get_cart_store().lines(key) if key else {}
+
+
+def claim_anonymous_cart():
+    """Merge the visitor's anonymous cart into the logged-in user's cart."""
+    token = session.pop('cart_token', None)
+    if token and current_user.is_authenticated:
+        get_cart_store().merge(f'session:{token}', f'user:{current_user.id}')
+    refresh_cart_summary()
+
+
+def summarize_cart(lines):
+    """Count and price cart lines against the in-memory catalog snapshot."""
+    snapshot = get_catalog()
+    count = 0
+    subtotal = 0
+    for product_id, quantity in lines.items():
+        count += quantity
+        try:
+            product = snapshot.products_by_id.get(int(product_id))
+        except (TypeError, ValueError):
+            continue
+        if product and product.is_available:
+            subtotal += product.price * quantity
+    return {'count': count, 'subtotal': round(subtotal, 2), 'version': snapshot.version}
+
+
+def refresh_cart_summary(key=None):
+    """Recompute the session's cart summary after the cart changed."""
+    key = key or cart_key()
+    if key is None:
+        session.pop('cart_summary', None)
+        return {'count': 0, 'subtotal': 0}
+    store = get_cart_store()
+    summary = summarize_cart(store.lines(key))
+    summary.update(key=key, revision=store.revision(key))
+    session['cart_summary'] = summary
+    return summary
+
+
+def cart_summary():
+    """Return the visitor's cart item count and subtotal.
+
+    The summary lives in the session and is kept current by the cart
+    routes. It is re-priced when the catalog version moves on, and a
+    logged-in user's cart, which their other devices also change, is
+    checked against its revision with one primary key read. Anonymous
+    carts belong to this session alone, so reading them runs no queries.
+    """
+    summary = session.get('cart_summary')
+    if summary is not None and summary['version'] == catalog_version():
+        key = summary.get('key')
+        if key is None or not key.startswith('user:') \
+                or get_cart_store().revision(key) == summary.get('revision'):
+            return summary
+    return refresh_cart_summary()
+
+
+cart_cli = AppGroup('cart', help='Server-side cart commands.')
+
+
+@cart_cli.command('purge')
+@click.option('--days', default=None, type=int, help='Idle days before a cart expires (default CART_TTL_DAYS).')
+def purge_command(days):
+    """Delete carts that have not been touched for --days."""
+    days = days if days is not None else current_app.config['CART_TTL_DAYS']
+    count = get_cart_store().purge(datetime.utcnow() - timedelta(days=days))
+    click.echo(f'Deleted {count} cart(s).')
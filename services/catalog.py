@@ -0,0 +1,165 @@
+import os
+import tempfile
+import threading
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import db
+from services.metrics import record_cache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+_lock = threading.Lock()
+
+
+class CatalogSnapshot:
+    """Detached copy of the product and portfolio tables for one catalog version."""
+
+    def __init__(self, version, products, portfolio):
+        self.version = version
+        self.products = products
+        self.portfolio = portfolio
+        self.products_by_id = {product.id: product for product in products}
+
+
+def _generation_path(name='catalog'):
+    path = current_app.config.get(f'{name.upper()}_GENERATION_FILE')
+    if not path:
+        path = os.path.join(current_app.instance_path, f'{name}.generation')
+    return path
+
+
+def _read_generation(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _current_generation(name):
+    path = _generation_path(name)
+    state = current_app.extensions.setdefault('catalog', {})
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return 0
+
+    key = (stat.st_ino, stat.st_mtime_ns)
+    cached = state.get(f'generation:{name}')
+    if cached and cached[0] == key:
+        return cached[1]
+
+    version = _read_generation(path)
+    state[f'generation:{name}'] = (key, version)
+    return version
+
+
+def _bump_generation(name):
+    path = _generation_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path + '.lock', 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        version = _read_generation(path) + 1
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp_path, path)
+
+    return version
+
+
+def catalog_version():
+    """Return the current catalog generation shared by every worker.
+
+    The counter lives in a small file so that a bump in one gunicorn worker
+    is seen by the others without a database round trip. The parsed value
+    is memoised against the file's inode and mtime.
+    """
+    return _current_generation('catalog')
+
+
+def bump_catalog_version():
+    """Advance the catalog generation after a product or portfolio write."""
+    return _bump_generation('catalog')
+
+
+def stock_version():
+    """Return the stock generation, a file counter like catalog_version().
+
+    Stock moves with every checkout, so it is counted apart from the
+    catalog: reservations must not reload snapshots or drop cached pages.
+    """
+    return _current_generation('stock')
+
+
+def bump_stock_on_commit():
+    """Bump the stock generation once the current transaction commits.
+
+    Bumping before the commit could let another worker cache the old stock
+    under the new generation.
+    """
+    db.session.info['bump_stock'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    if session.info.pop('bump_stock', False):
+        _bump_generation('stock')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_bump(session):
+    session.info.pop('bump_stock', None)
+
+
+def _load_snapshot(version):
+    from models.product import Product
+    from models.portfolio import Portfolio
+
+    # Use a private session so the cached instances never share identity
+    # with objects the current request may be modifying.
+    with Session(db.engine, expire_on_commit=False) as session:
+        products = session.scalars(select(Product).order_by(Product.id)).all()
+        portfolio = session.scalars(select(Portfolio).order_by(Portfolio.id)).all()
+    return CatalogSnapshot(version, list(products), list(portfolio))
+
+
+def get_catalog():
+    """Return the catalog snapshot for the current generation.
+
+    Warm hits are served from process memory without touching the database.
+    """
+    version = catalog_version()
+    state = current_app.extensions.setdefault('catalog', {})
+    snapshot = state.get('snapshot')
+    if snapshot is not None and snapshot.version == version:
+        record_cache('catalog', True)
+        return snapshot
+
+    record_cache('catalog', False)
+    with _lock:
+        snapshot = state.get('snapshot')
+        if snapshot is None or snapshot.version != version:
+            snapshot = _load_snapshot(version)
+            state['snapshot'] = snapshot
+    return snapshot
+
+
+catalog_cli = AppGroup('catalog', help='Catalog cache commands.')
+
+
+@catalog_cli.command('bump')
+def bump_command():
+    """Invalidate every worker's catalog cache."""
+    version = bump_catalog_version()
+    click.echo(f'Catalog version is now {version}')
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import and_, or_
+
+from app import db
+from models.metrics import MetricCounter
+from services.jobs import job
+
+TOTAL_KEYS = ('users', 'orders', 'products', 'paid_orders')
+REVENUE_WINDOW_DAYS = 30
+
+
+def revenue_key(day):
+    return f'revenue:{day.isoformat()}'
+
+
+def insert_for_dialect():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f'Upserts are not supported on the {dialect} dialect')
+    return insert
+
+
+def _upsert(key, value, increment):
+    insert = insert_for_dialect()
+    now = datetime.utcnow()
+    new_value = MetricCounter.value + value if increment else value
+    statement = insert(MetricCounter).values(key=key, value=value, updated_at=now)
+    statement = statement.on_conflict_do_update(
+        index_elements=[MetricCounter.key],
+        set_={'value': new_value, 'updated_at': now}
+    )
+    db.session.execute(statement)
+
+
+def increment(key, amount=1):
+    """Atomically add ``amount`` to a counter in the current transaction."""
+    _upsert(key, amount, increment=True)
+
+
+def record_order_paid(order):
+    """Count a newly paid order and add it to its day's revenue bucket."""
+    increment('paid_orders')
+    increment(revenue_key(order.created_at.date()), order.total_amount)
+
+
+def record_order_refunded(order):
+    """Take a refunded order out of the paid count and its day's revenue bucket."""
+    increment('paid_orders', -1)
+    increment(revenue_key(order.created_at.date()), -order.total_amount)
+
+
+def paid_order_count():
+    """Return the number of paid orders with a single primary-key read."""
+    counter = db.session.get(MetricCounter, 'paid_orders')
+    if counter is None:
+        reconcile()
+        db.session.commit()
+        counter = db.session.get(MetricCounter, 'paid_orders')
+    return int(counter.value)
+
+
+def dashboard_counters():
+    """Return the dashboard totals and rolling revenue in one indexed read."""
+    today = datetime.utcnow().date()
+    start = today - timedelta(days=REVENUE_WINDOW_DAYS)
+    counters = MetricCounter.query.filter(or_(
+        MetricCounter.key.in_(TOTAL_KEYS),
+        and_(MetricCounter.key >= revenue_key(start), MetricCounter.key <= revenue_key(today))
+    )).all()
+
+    if not set(TOTAL_KEYS) <= {counter.key for counter in counters}:
+        # Fresh database or a total never written: build them from the raw tables
+        reconcile()
+        db.session.commit()
+        return dashboard_counters()
+
+    values = {key: 0 for key in TOTAL_KEYS}
+    values['recent_revenue'] = 0
+    for counter in counters:
+        if counter.key.startswith('revenue:'):
+            values['recent_revenue'] += counter.value
+        else:
+            values[counter.key] = int(counter.value)
+    return values
+
+
+def reconcile(days=REVENUE_WINDOW_DAYS):
+    """Recompute counters from the raw tables to correct any drift."""
+    from models.order import Order
+    from models.product import Product
+    from models.user import User
+
+    _upsert('users', User.query.count(), increment=False)
+    _upsert('orders', Order.query.count(), increment=False)
+    _upsert('products', Product.query.count(), increment=False)
+    _upsert('paid_orders', Order.query.filter_by(payment_status='paid').count(), increment=False)
+
+    today = datetime.utcnow().date()
+    start = today - timedelta(days=days)
+    revenue = {start + timedelta(days=offset): 0 for offset in range(days + 1)}
+    day = db.func.date(Order.created_at)
+    rows = db.session.query(day, db.func.sum(Order.total_amount)).filter(
+        Order.created_at >= datetime.combine(start, datetime.min.time()),
+        Order.payment_status == 'paid'
+    ).group_by(day).all()
+    for row_day, amount in rows:
+        revenue[datetime.strptime(str(row_day), '%Y-%m-%d').date()] = amount or 0
+
+    for row_day, amount in revenue.items():
+        _upsert(revenue_key(row_day), amount, increment=False)
+
+
+@job('metrics.reconcile', every='METRICS_RECONCILE_INTERVAL')
+def reconcile_job():
+    """Periodically correct counter drift (e.g. from writes made outside the app)."""
+    reconcile()
+
+
+metrics_cli = AppGroup('metrics', help='Dashboard counter commands.')
+
+
+@metrics_cli.command('reconcile')
+@click.option('--days', default=REVENUE_WINDOW_DAYS, show_default=True,
+              help='Number of past days of revenue to recompute.')
+def reconcile_command(days):
+    """Rebuild dashboard counters from orders, users and products."""
+    reconcile(days)
+    db.session.commit()
+    click.echo('Dashboard counters reconciled.')
@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from app import db
+from models.order import Order, OrderItem
+from models.portfolio import Portfolio
+from models.product import Product
+
+# Exportable resources: model and the column used for ?updated_since=.
+# Order items have no timestamp of their own and follow their order's.
+EXPORTS = {
+    'products': (Product, Product.updated_at),
+    'portfolio': (Portfolio, Portfolio.updated_at),
+    'orders': (Order, Order.updated_at),
+    'order_items': (OrderItem, Order.updated_at)
+}
+
+# Resources that contain customer data and require an admin.
+PRIVATE_EXPORTS = {'orders', 'order_items'}
+
+
+def iter_export(resource, updated_since=None, batch_size=1000):
+    """Yield ``to_dict()`` rows for ``resource`` in id order.
+
+    Rows are fetched ``batch_size`` at a time through a server-side cursor
+    where the driver supports one, so memory stays flat regardless of
+    table size.
+    """
+    model, updated_column = EXPORTS[resource]
+    statement = select(model).order_by(model.id)
+    if model is OrderItem:
+        statement = statement.join(Order, OrderItem.order_id == Order.id)
+    if updated_since is not None:
+        statement = statement.filter(updated_column >= updated_since)
+
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for item in result.scalars():
+        yield item.to_dict()
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, default=str) + '\n'
+
+
+def _csv_line(writer, buffer, values):
+    writer.writerow(values)
+    line = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return line
+
+
+def csv_lines(rows):
+    """Render rows as CSV, taking the header from the first row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    fields = None
+    for row in rows:
+        if fields is None:
+            fields = list(row)
+            yield _csv_line(writer, buffer, fields)
+        values = []
+        for field in fields:
+            value = row.get(field)
+            if isinstance(value, list):
+                value = ','.join(value)
+            values.append(value)
+        yield _csv_line(writer, buffer, values)
@@ -0,0 +1,30 @@
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+
+def conditional(version_func):
+    """Give a view a strong ETag derived from ``version_func()``.
+
+    The ETag combines the version with the request path and query string.
+    A matching ``If-None-Match`` is answered with 304 before the view runs,
+    so revalidations cost only the version lookup.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version = version_func()
+            etag = hashlib.sha1(f'{version}:{request.full_path}'.encode()).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,288 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from services.catalog import bump_catalog_version
+from services.jobs import enqueue, job
+
+DERIVATIVE_SUBDIR = 'derivatives'
+MANIFEST_NAME = 'manifest.json'
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+# Hosts that resize on the fly through a ``w`` query parameter
+RESIZING_HOSTS = ('images.unsplash.com',)
+
+
+def supported_formats(formats):
+    """The configured derivative formats this Pillow build can encode."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return []
+    Image.init()
+    return [fmt for fmt in formats if fmt.upper() in Image.SAVE]
+
+
+def local_image_path(image_url):
+    """Absolute path of an image stored under the static folder, or None for remote ones."""
+    if not image_url or '://' in image_url or image_url.startswith('//'):
+        return None
+    prefix = current_app.static_url_path.rstrip('/') + '/'
+    relative = image_url[len(prefix):] if image_url.startswith(prefix) else image_url.lstrip('/')
+    path = os.path.normpath(os.path.join(current_app.static_folder, relative))
+    if not path.startswith(os.path.normpath(current_app.static_folder) + os.sep):
+        return None
+    return path
+
+
+def derivative_key(path):
+    """Name of the derivative set of a source file; changes whenever the file does."""
+    stat = os.stat(path)
+    fingerprint = f'{os.path.relpath(path, current_app.static_folder)}:{stat.st_mtime_ns}:{stat.st_size}'
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:20]
+
+
+def _derivative_root():
+    return os.path.join(current_app.static_folder, DERIVATIVE_SUBDIR)
+
+
+@lru_cache(maxsize=1024)
+def _read_manifest(directory):
+    # Derivative sets are immutable once published, so a hit can be kept
+    # for the life of the process; misses raise and are not cached
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def derivative_manifest(path):
+    """The generated derivatives of a local image ({format: [width, ...]}), or None."""
+    try:
+        key = derivative_key(path)
+        return key, _read_manifest(os.path.join(_derivative_root(), key))
+    except (OSError, ValueError):
+        return None
+
+
+def _resized_url(image_url, width):
+    parts = urlsplit(image_url)
+    query = dict(parse_qsl(parts.query))
+    query.update({'w': str(width), 'auto': 'format'})
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def image_sources(image_url):
+    """srcset-ready renditions of a product or portfolio image.
+
+    Returns ``src`` (the original), ``srcset`` for the <img> itself and
+    ``sources``, a list of {type, srcset} for <picture> in preference order.
+    Remote images on resizing hosts get width variants; local images list
+    the WebP/AVIF derivatives generated by `flask images derive`.
+    """
+    widths = current_app.config['IMAGE_WIDTHS']
+    result = {'src': image_url, 'srcset': None, 'sources': []}
+    if not image_url:
+        return result
+
+    if urlsplit(image_url).hostname in RESIZING_HOSTS:
+        result['srcset'] = ', '.join(f'{_resized_url(image_url, width)} {width}w' for width in widths)
+        return result
+
+    path = local_image_path(image_url)
+    found = derivative_manifest(path) if path else None
+    if found is None:
+        return result
+
+    key, manifest = found
+    base = f'{current_app.static_url_path}/{DERIVATIVE_SUBDIR}/{key}'
+    for fmt in current_app.config['IMAGE_FORMATS']:
+        if manifest.get(fmt):
+            result['sources'].append({
+                'type': MIME_TYPES[fmt],
+                'srcset': ', '.join(f'{base}/{width}.{fmt} {width}w' for width in manifest[fmt]),
+            })
+    return result
+
+
+def image_srcset(image_url):
+    """Single srcset for an image: WebP derivatives when present, else the width variants."""
+    sources = image_sources(image_url)
+    for source in sources['sources']:
+        if source['type'] == 'image/webp':
+            return source['srcset']
+    return sources['srcset'] or (sources['sources'][0]['srcset'] if sources['sources'] else None)
+
+
+def render_derivatives(source, target, widths, formats, quality):
+    """Write resized copies of ``source`` into the directory ``target``.
+
+    Runs in worker processes, so it only takes plain arguments. Widths
+    larger than the original are skipped (the original width is used when
+    all are). The set is built in a temporary directory and renamed into
+    place, so a published manifest always describes complete files.
+    """
+    from PIL import Image, ImageOps
+
+    if os.path.exists(target):
+        return target, None
+    staging = tempfile.mkdtemp(dir=os.path.dirname(target), prefix='.tmp-')
+    try:
+        manifest = {}
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+            sizes = [width for width in widths if width < image.width] or [image.width]
+            for width in sizes:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+                for fmt in formats:
+                    resized.save(os.path.join(staging, f'{width}.{fmt}'), fmt.upper(), quality=quality)
+                    manifest.setdefault(fmt, []).append(width)
+        with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another worker published the same set first
+            shutil.rmtree(staging, ignore_errors=True)
+        return target, manifest
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _derivative_tasks(image_urls, force=False):
+    """(source, target) pairs for the local images in ``image_urls`` that need derivatives."""
+    root = _derivative_root()
+    tasks = {}
+    for image_url in image_urls:
+        path = local_image_path(image_url)
+        if not path or not os.path.isfile(path):
+            continue
+        target = os.path.join(root, derivative_key(path))
+        if force and os.path.isdir(target):
+            shutil.rmtree(target, ignore_errors=True)
+            _read_manifest.cache_clear()
+        if not os.path.exists(target):
+            tasks[target] = path
+    return [(source, target) for target, source in tasks.items()]
+
+
+def _render_options():
+    config = current_app.config
+    return config['IMAGE_WIDTHS'], supported_formats(config['IMAGE_FORMATS']), config['IMAGE_QUALITY']
+
+
+def generate_derivatives(image_urls, workers=None, force=False):
+    """Generate missing derivatives for ``image_urls`` in a process pool.
+
+    Returns (generated, failed) counts.
+    """
+    widths, formats, quality = _render_options()
+    if not formats:
+        current_app.logger.warning('Pillow is missing or cannot encode IMAGE_FORMATS; no derivatives generated')
+        return 0, 0
+    tasks = _derivative_tasks(image_urls, force)
+    if not tasks:
+        return 0, 0
+
+    os.makedirs(_derivative_root(), exist_ok=True)
+    generated = failed = 0
+    workers = workers or current_app.config['IMAGE_WORKERS'] or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        futures = {pool.submit(render_derivatives, source, target, widths, formats, quality): source
+                   for source, target in tasks}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                generated += 1
+            except Exception as e:
+                failed += 1
+                current_app.logger.error(f"Could not generate derivatives for {futures[future]}: {str(e)}")
+    if generated:
+        # Cached pages were rendered without the new srcsets
+        bump_catalog_version()
+    return generated, failed
+
+
+def queue_derivatives(image_url):
+    """Schedule derivatives for a local image (remote images are left alone).
+
+    The job is unique per version of the file, so replacing an image under the
+    same URL queues it again; hashing keeps the key within ``Job.unique_key``.
+    """
+    path = local_image_path(image_url)
+    if path and os.path.isfile(path):
+        version = hashlib.sha1(f'{image_url}:{derivative_key(path)}'.encode()).hexdigest()
+        enqueue('images.derive', unique_key=f'images.derive:{version}', image_url=image_url)
+
+
+@job('images.derive')
+def derive_image(image_url):
+    """Generate the derivatives of one image in the job worker."""
+    widths, formats, quality = _render_options()
+    if not formats:
+        current_app.logger.warning('Pillow is missing or cannot encode IMAGE_FORMATS; no derivatives generated')
+        return
+    tasks = _derivative_tasks([image_url])
+    if tasks:
+        os.makedirs(_derivative_root(), exist_ok=True)
+    for source, target in tasks:
+        render_derivatives(source, target, widths, formats, quality)
+    if tasks:
+        bump_catalog_version()
+
+
+def catalog_image_urls():
+    """Every product and portfolio image URL."""
+    from app import db
+    from models.portfolio import Portfolio
+    from models.product import Product
+
+    urls = [url for url, in db.session.query(Product.image_url).distinct()]
+    urls += [url for url, in db.session.query(Portfolio.image_url).distinct()]
+    return urls
+
+
+images_cli = AppGroup('images', help='Responsive image derivative commands.')
+
+
+@images_cli.command('derive')
+@click.option('--workers', default=None, type=int, help='Worker processes (default IMAGE_WORKERS or CPU count).')
+@click.option('--force', is_flag=True, help='Regenerate derivatives that already exist.')
+def derive_command(workers, force):
+    """Generate WebP/AVIF derivatives for local product and portfolio images."""
+    generated, failed = generate_derivatives(catalog_image_urls(), workers=workers, force=force)
+    click.echo(f'Generated derivatives for {generated} image(s), {failed} failed.')
+
+
+@images_cli.command('purge')
+def purge_command():
+    """Delete derivative sets whose source image changed or is no longer used."""
+    root = _derivative_root()
+    if not os.path.isdir(root):
+        click.echo('Deleted 0 derivative set(s).')
+        return
+    current = set()
+    for image_url in catalog_image_urls():
+        path = local_image_path(image_url)
+        if path and os.path.isfile(path):
+            current.add(derivative_key(path))
+    removed = 0
+    for name in os.listdir(root):
+        # Dot-prefixed directories are sets still being written
+        if name not in current and not name.startswith('.'):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            removed += 1
+    _read_manifest.cache_clear()
+    click.echo(f'Deleted {removed} derivative set(s).')
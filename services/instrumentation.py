@@ -0,0 +1,142 @@
+import heapq
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+from app import db
+
+SLOWEST_KEPT = 5
+
+
+class EndpointStats:
+    """Running query totals for one endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.request_time = 0.0
+        self.slowest = []  # min-heap of (duration, statement)
+
+    def add(self, request_stats, elapsed):
+        self.requests += 1
+        self.queries += request_stats.queries
+        self.max_queries = max(self.max_queries, request_stats.queries)
+        self.db_time += request_stats.db_time
+        self.request_time += elapsed
+        for entry in request_stats.slowest:
+            if len(self.slowest) < SLOWEST_KEPT:
+                heapq.heappush(self.slowest, entry)
+            elif entry > self.slowest[0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'queries': self.queries,
+            'avg_queries': self.queries / self.requests if self.requests else 0,
+            'max_queries': self.max_queries,
+            'db_time_ms': round(self.db_time * 1000, 2),
+            'avg_db_time_ms': round(self.db_time * 1000 / self.requests, 2) if self.requests else 0,
+            'avg_request_time_ms': round(self.request_time * 1000 / self.requests, 2) if self.requests else 0,
+            'slowest': [{'duration_ms': round(duration * 1000, 2), 'statement': statement}
+                        for duration, statement in sorted(self.slowest, reverse=True)]
+        }
+
+
+class RequestStats:
+    """Queries issued while handling the current request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = []
+
+    def record(self, statement, duration):
+        self.queries += 1
+        self.db_time += duration
+        entry = (duration, statement)
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_started'].pop()
+    if not has_app_context():
+        return
+
+    if has_request_context() and 'sql_stats' in g:
+        g.sql_stats.record(statement, duration)
+
+    threshold = current_app.config['SLOW_QUERY_THRESHOLD_MS']
+    if duration * 1000 >= threshold:
+        endpoint = request.endpoint if has_request_context() else None
+        current_app.logger.warning(f"Slow query ({duration * 1000:.1f}ms, {endpoint}): {statement}")
+
+
+def _start_request():
+    g.sql_stats = RequestStats()
+
+
+def _finish_request(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+
+    elapsed = time.perf_counter() - stats.started
+    response.headers.add('Server-Timing',
+                         f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"')
+    response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+
+    state = current_app.extensions['instrumentation']
+    endpoint = request.endpoint or 'unknown'
+    with state['lock']:
+        endpoint_stats = state['endpoints'].get(endpoint)
+        if endpoint_stats is None:
+            endpoint_stats = state['endpoints'][endpoint] = EndpointStats()
+        endpoint_stats.add(stats, elapsed)
+    return response
+
+
+def init_instrumentation(app):
+    """Hook query timing into the engine and request cycle when enabled."""
+    if not app.config.get('SQL_INSTRUMENTATION'):
+        return
+
+    app.extensions['instrumentation'] = {'lock': threading.Lock(), 'endpoints': {}}
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def query_stats():
+    """Return this worker's aggregated stats grouped by blueprint, or None."""
+    state = current_app.extensions.get('instrumentation')
+    if state is None:
+        return None
+
+    blueprints = {}
+    with state['lock']:
+        for endpoint, stats in sorted(state['endpoints'].items()):
+            blueprint = endpoint.rsplit('.', 1)[0] if '.' in endpoint else 'app'
+            entry = blueprints.setdefault(blueprint, {'requests': 0, 'queries': 0,
+                                                      'db_time_ms': 0, 'endpoints': {}})
+            endpoint_dict = stats.to_dict()
+            entry['requests'] += endpoint_dict['requests']
+            entry['queries'] += endpoint_dict['queries']
+            entry['db_time_ms'] = round(entry['db_time_ms'] + endpoint_dict['db_time_ms'], 2)
+            entry['endpoints'][endpoint] = endpoint_dict
+    return blueprints
@@ -0,0 +1,279 @@
+import json
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, update
+
+from app import db
+from models.job import Job
+from services.metrics import JOB_DURATION, JOB_QUEUE_DELAY
+
+CLAIM_BATCH = 10
+MAX_ERROR_LENGTH = 4000
+
+_handlers = {}
+_recurring = {}
+
+
+def job(name, max_attempts=None, every=None):
+    """Register a function as the handler for jobs called ``name``.
+
+    Handlers receive the enqueued keyword arguments and run inside an app
+    context. Their database writes are committed together with the job's
+    completion, so a handler that raises leaves nothing behind.
+
+    ``every`` names a config key holding an interval in seconds; workers
+    then enqueue the job once per interval (0 or None disables it).
+    """
+    def register(func):
+        _handlers[name] = (func, max_attempts)
+        if every:
+            _recurring[name] = every
+        return func
+    return register
+
+
+def enqueue(name, unique_key=None, delay=0, **kwargs):
+    """Add a job to the current transaction; workers see it once it commits.
+
+    ``unique_key`` makes enqueueing idempotent: the insert is skipped if a
+    job with that key already exists, even one added concurrently. Returns
+    whether a job was added.
+    """
+    if name not in _handlers:
+        raise LookupError(f'No job handler registered for {name!r}')
+
+    values = {
+        'name': name,
+        'payload': json.dumps(kwargs),
+        'status': 'queued',
+        'attempts': 0,
+        'max_attempts': _handlers[name][1] or current_app.config['JOB_MAX_ATTEMPTS'],
+        'run_at': datetime.utcnow() + timedelta(seconds=delay),
+        'created_at': datetime.utcnow()
+    }
+    if unique_key is None:
+        db.session.execute(insert(Job).values(**values))
+        return True
+
+    from services.counters import insert_for_dialect
+
+    statement = insert_for_dialect()(Job).values(unique_key=unique_key, **values)
+    statement = statement.on_conflict_do_nothing(index_elements=[Job.unique_key])
+    return db.session.execute(statement).rowcount == 1
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number ``attempts``: capped exponential with jitter."""
+    base = current_app.config['JOB_BACKOFF_BASE']
+    ceiling = min(base * 2 ** (attempts - 1), current_app.config['JOB_BACKOFF_MAX'])
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def claim(worker_id):
+    """Claim the next due job for ``worker_id``, or return None.
+
+    Each candidate is taken with a conditional UPDATE, so concurrent workers
+    on SQLite or PostgreSQL never run the same job twice.
+    """
+    now = datetime.utcnow()
+    candidates = db.session.query(Job.id).filter(
+        Job.status == 'queued', Job.run_at <= now
+    ).order_by(Job.run_at, Job.id).limit(CLAIM_BATCH).all()
+
+    for (job_id,) in candidates:
+        result = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == 'queued')
+            .values(status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+        )
+        if result.rowcount == 1:
+            db.session.commit()
+            return db.session.get(Job, job_id)
+    db.session.commit()
+    return None
+
+
+def run(claimed, worker_id):
+    """Run a claimed job and record its outcome; returns 'ok', 'retry' or 'dead'."""
+    job_id, name, attempts = claimed.id, claimed.name, claimed.attempts
+    JOB_QUEUE_DELAY.labels(name).observe(max((claimed.locked_at - claimed.run_at).total_seconds(), 0))
+    started = time.perf_counter()
+    try:
+        if name not in _handlers:
+            raise LookupError(f'No job handler registered for {name!r}')
+        _handlers[name][0](**claimed.arguments)
+        db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.locked_by == worker_id)
+            .values(status='done', finished_at=datetime.utcnow(), locked_by=None, last_error=None)
+        )
+        db.session.commit()
+        outcome = 'ok'
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc()[-MAX_ERROR_LENGTH:]
+        current_app.logger.error(f"Job {job_id} ({name}) failed on attempt {attempts}: {error}")
+        outcome = _retry_or_bury(job_id, worker_id, error)
+    JOB_DURATION.labels(name, outcome).observe(time.perf_counter() - started)
+    return outcome
+
+
+def _retry_or_bury(job_id, worker_id, error):
+    failed = db.session.get(Job, job_id)
+    if failed is None or failed.locked_by != worker_id:
+        # Reclaimed after a timeout; the newer run owns the job now
+        db.session.rollback()
+        return 'retry'
+    if failed.attempts >= failed.max_attempts:
+        failed.status = 'dead'
+        failed.finished_at = datetime.utcnow()
+        outcome = 'dead'
+    else:
+        failed.status = 'queued'
+        failed.run_at = datetime.utcnow() + timedelta(seconds=backoff(failed.attempts))
+        outcome = 'retry'
+    failed.locked_by = None
+    failed.last_error = error
+    db.session.commit()
+    return outcome
+
+
+def requeue_stale(timeout):
+    """Release jobs whose worker died mid-run; returns how many were touched."""
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout)
+    stale = (Job.status == 'running', Job.locked_at < cutoff)
+    dead = db.session.execute(
+        update(Job).where(*stale, Job.attempts >= Job.max_attempts)
+        .values(status='dead', locked_by=None, finished_at=datetime.utcnow(),
+                last_error='Worker timed out')
+    ).rowcount
+    requeued = db.session.execute(
+        update(Job).where(*stale).values(status='queued', locked_by=None, run_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return dead + requeued
+
+
+def schedule_recurring():
+    """Enqueue the next run of every recurring job; returns how many were added.
+
+    Runs are keyed by their interval slot, so any number of workers
+    scheduling at once add each run only once.
+    """
+    added = 0
+    now = time.time()
+    for name, config_key in _recurring.items():
+        interval = current_app.config.get(config_key)
+        if not interval:
+            continue
+        slot = int(now // interval) + 1
+        added += enqueue(name, unique_key=f'{name}:{slot}', delay=slot * interval - now)
+    db.session.commit()
+    return added
+
+
+def _work_loop(app, worker_id, stop, burst):
+    with app.app_context():
+        poll_interval = app.config['JOB_POLL_INTERVAL']
+        while not stop.is_set():
+            try:
+                claimed = claim(worker_id)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Worker {worker_id} could not claim a job: {str(e)}")
+                claimed = None
+            if claimed is not None:
+                run(claimed, worker_id)
+            elif burst:
+                return
+            else:
+                stop.wait(poll_interval)
+            db.session.remove()
+
+
+def work(concurrency=1, burst=False):
+    """Run ``concurrency`` worker threads until interrupted.
+
+    With ``burst`` the workers exit once no due jobs are left.
+    """
+    app = current_app._get_current_object()
+    prefix = f'{socket.gethostname()}:{os.getpid()}'
+    stop = threading.Event()
+
+    requeue_stale(app.config['JOB_TIMEOUT'])
+    schedule_recurring()
+    threads = [
+        threading.Thread(target=_work_loop, args=(app, f'{prefix}:{index}', stop, burst), daemon=True)
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    last_sweep = time.monotonic()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+            if time.monotonic() - last_sweep > app.config['JOB_TIMEOUT'] / 2:
+                requeue_stale(app.config['JOB_TIMEOUT'])
+                schedule_recurring()
+                last_sweep = time.monotonic()
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+jobs_cli = AppGroup('jobs', help='Background job queue commands.')
+
+
+@jobs_cli.command('work')
+@click.option('--concurrency', default=1, show_default=True, help='Number of worker threads.')
+@click.option('--burst', is_flag=True, help='Exit once the queue has no due jobs.')
+def work_command(concurrency, burst):
+    """Claim and run queued jobs."""
+    click.echo(f'Starting {concurrency} job worker(s).')
+    work(concurrency=concurrency, burst=burst)
+
+
+@jobs_cli.command('stats')
+def stats_command():
+    """Show job counts by status."""
+    rows = db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all()
+    for status, count in sorted(rows):
+        click.echo(f'{status}: {count}')
+
+
+@jobs_cli.command('retry')
+@click.argument('job_ids', nargs=-1, type=int)
+def retry_command(job_ids):
+    """Requeue dead jobs (all of them, or only the given ids)."""
+    query = update(Job).where(Job.status == 'dead')
+    if job_ids:
+        query = query.where(Job.id.in_(job_ids))
+    count = db.session.execute(
+        query.values(status='queued', attempts=0, run_at=datetime.utcnow(), finished_at=None)
+    ).rowcount
+    db.session.commit()
+    click.echo(f'Requeued {count} job(s).')
+
+
+@jobs_cli.command('purge')
+@click.option('--days', default=7, show_default=True, help='Delete finished jobs older than this.')
+def purge_command(days):
+    """Delete completed jobs older than --days."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    count = Job.query.filter(Job.status == 'done', Job.finished_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Deleted {count} job(s).')
@@ -0,0 +1,36 @@
+import smtplib
+from email.message import EmailMessage
+
+from flask import current_app
+
+from services.jobs import enqueue, job
+
+
+@job('mail.send')
+def send_mail(to, subject, body, reply_to=None):
+    """Deliver one plain-text email over SMTP using the MAIL_* settings."""
+    config = current_app.config
+    if not config.get('MAIL_SERVER'):
+        current_app.logger.info(f"MAIL_SERVER not configured; dropping mail to {to}: {subject}")
+        return
+
+    message = EmailMessage()
+    message['From'] = config['MAIL_DEFAULT_SENDER'] or config['MAIL_USERNAME']
+    message['To'] = to
+    message['Subject'] = subject
+    if reply_to:
+        message['Reply-To'] = reply_to
+    message.set_content(body)
+
+    with smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=config['MAIL_TIMEOUT']) as smtp:
+        if config['MAIL_USE_TLS']:
+            smtp.starttls()
+        if config['MAIL_USERNAME']:
+            smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        smtp.send_message(message)
+
+
+def queue_mail(to, subject, body, reply_to=None, unique_key=None):
+    """Enqueue an email; it is sent once the caller's transaction commits."""
+    return enqueue('mail.send', unique_key=unique_key, to=to, subject=subject, body=body,
+                   reply_to=reply_to)
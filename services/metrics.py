@@ -0,0 +1,141 @@
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Response, abort, current_app, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter,
+                               Gauge, Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+
+from app import db
+
+# Metrics are process-global. Under gunicorn, set PROMETHEUS_MULTIPROC_DIR
+# (see gunicorn.conf.py) so every worker writes to shared files and
+# /metrics aggregates them.
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency.', ['blueprint', 'endpoint'])
+REQUESTS = Counter(
+    'http_requests_total', 'Requests by status.', ['blueprint', 'endpoint', 'method', 'status'])
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests being handled.', ['blueprint'], multiprocess_mode='livesum')
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent acquiring a connection from the pool.',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30))
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_connections_checked_out', 'Connections currently checked out.', multiprocess_mode='livesum')
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups by result.', ['cache', 'result'])
+STRIPE_LATENCY = Histogram(
+    'stripe_request_duration_seconds', 'Stripe API call latency.', ['operation', 'outcome'])
+WEBHOOK_EVENTS = Counter(
+    'webhook_events_total', 'Received webhook events by type and ingest result.', ['type', 'outcome'])
+JOB_DURATION = Histogram(
+    'job_duration_seconds', 'Background job run time.', ['job', 'outcome'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300))
+JOB_QUEUE_DELAY = Histogram(
+    'job_queue_delay_seconds', 'Time between a job becoming due and a worker claiming it.', ['job'],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900))
+
+
+def record_cache(cache, hit):
+    """Count a lookup against ``cache``; hit ratios are derived in PromQL."""
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+@contextmanager
+def observe_stripe(operation):
+    """Time a Stripe API call, labelled by whether it raised."""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        STRIPE_LATENCY.labels(operation, outcome).observe(time.perf_counter() - started)
+
+
+def _labels():
+    blueprint = request.blueprint or 'app'
+    endpoint = request.endpoint or 'unmatched'
+    return blueprint, endpoint
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_blueprint = request.blueprint or 'app'
+    IN_FLIGHT.labels(g.metrics_blueprint).inc()
+
+
+def _finish_request(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        blueprint, endpoint = _labels()
+        REQUEST_LATENCY.labels(blueprint, endpoint).observe(time.perf_counter() - started)
+        REQUESTS.labels(blueprint, endpoint, request.method, response.status_code).inc()
+    return response
+
+
+def _teardown_request(exc):
+    blueprint = g.pop('metrics_blueprint', None)
+    if blueprint is not None:
+        IN_FLIGHT.labels(blueprint).dec()
+
+
+def _timed_connect(connect):
+    # Pool events fire only once a connection is handed out, so the wait
+    # for a free slot is measured around Pool.connect() itself.
+    @wraps(connect)
+    def wrapper():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+def _pool_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+def _scraper_allowed():
+    """Accept the METRICS_TOKEN bearer token or a client in METRICS_ALLOWED_IPS."""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.remote_addr in current_app.config.get('METRICS_ALLOWED_IPS', ())
+
+
+def metrics_view():
+    # Traffic, order and revenue counters are private to the operator
+    if not _scraper_allowed():
+        abort(403)
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    """Record request, pool and cache metrics and expose them at /metrics."""
+    if not app.config.get('METRICS_ENABLED'):
+        return
+
+    with app.app_context():
+        engine = db.engine
+    engine.pool.connect = _timed_connect(engine.pool.connect)
+    event.listen(engine.pool, 'checkout', _pool_checkout)
+    event.listen(engine.pool, 'checkin', _pool_checkin)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
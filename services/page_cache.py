@@ -0,0 +1,66 @@
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from services.cache import create_backend
+from services.catalog import catalog_version
+from services.metrics import record_cache
+
+
+def get_page_cache():
+    """Return the app's page cache backend, or None when disabled."""
+    state = current_app.extensions.setdefault('page_cache', {})
+    if 'backend' not in state:
+        state['backend'] = create_backend(current_app.config, 'PAGE_CACHE')
+    return state['backend']
+
+
+def _is_cacheable():
+    # Only anonymous GETs with nothing pending in the session render the
+    # same output for everyone.
+    return (request.method == 'GET'
+            and not current_user.is_authenticated
+            and '_flashes' not in session)
+
+
+def cached_page(**allowed):
+    """Cache a catalog page's rendered HTML for anonymous visitors.
+
+    The key combines the endpoint, the view arguments, the catalog version
+    and the query arguments named in ``allowed``. Each maps to a function
+    returning the values worth caching (besides 'all'); a request with any
+    other value is rendered uncached, so arbitrary query strings cannot
+    grow the cache. A catalog write bumps the version, so stale pages are
+    never served in any worker.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_page_cache()
+            if cache is None or not _is_cacheable():
+                return view(*args, **kwargs)
+
+            parts = [request.endpoint, str(catalog_version())]
+            parts += [f'{name}={value}' for name, value in sorted(kwargs.items())]
+            for name, values in sorted(allowed.items()):
+                value = request.args.get(name)
+                if value is not None and value != 'all' and value not in values():
+                    return view(*args, **kwargs)
+                parts.append(f'{name}={value or ""}')
+            key = 'page:' + '|'.join(parts)
+
+            body = cache.get(key)
+            record_cache('page', body is not None)
+            if body is not None:
+                response = current_app.response_class(body, mimetype='text/html')
+                response.headers['X-Page-Cache'] = 'hit'
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == 'text/html':
+                cache.set(key, response.get_data(), current_app.config['PAGE_CACHE_TIMEOUT'])
+                response.headers['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
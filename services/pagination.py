@@ -0,0 +1,45 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(item):
+    """Return an opaque cursor pointing just after ``item``."""
+    payload = json.dumps([item.created_at.isoformat(), item.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor into ``(created_at, id)``; raises ValueError if malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def keyset_page(query, model, cursor=None, limit=50):
+    """Return one page of ``query`` in stable ``(created_at, id)`` order.
+
+    Returns ``(items, next_cursor)``; ``next_cursor`` is None on the last
+    page. Each page is a single indexed range read, however deep the
+    client has walked. Rows without a ``created_at`` have no place in that
+    order and are left out; migration f2c7a4e9b1d3 backfills old ones.
+    """
+    query = query.filter(model.created_at.isnot(None))
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            model.created_at > created_at,
+            and_(model.created_at == created_at, model.id > item_id)
+        ))
+
+    items = query.order_by(model.created_at, model.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1])
+    return items, next_cursor
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+
+import requests
+import stripe
+from flask import current_app
+
+from services.metrics import observe_stripe
+
+
+class PaymentError(Exception):
+    """Raised when the payment provider rejects or fails a request."""
+
+
+class PaymentIntent:
+    """Provider-neutral view of a created payment intent."""
+
+    def __init__(self, id, client_secret, amount, status=None):
+        self.id = id
+        self.client_secret = client_secret
+        self.amount = amount
+        self.status = status
+
+
+def cart_fingerprint(order_items, *fields):
+    """Hash the priced cart lines plus any customer fields that shape the intent."""
+    lines = sorted((item['product'].id, item['quantity'], item['unit_price'])
+                   for item in order_items)
+    payload = json.dumps([lines, list(fields)], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def idempotency_key(order_number, fingerprint):
+    """Key a payment intent on the order and the cart it was priced from.
+
+    Retrying the same checkout yields the same key, so the provider returns
+    the intent it already created instead of a duplicate.
+    """
+    return hashlib.sha256(f'{order_number}:{fingerprint}'.encode()).hexdigest()
+
+
+class StripeGateway:
+    """Stripe client with a pooled keep-alive session, timeouts and retries.
+
+    ``max_retries`` network retries use Stripe's exponential backoff and are
+    only attempted for errors Stripe marks as safe to retry. With
+    ``timeout`` this bounds a call to roughly ``timeout * (max_retries + 1)``.
+    """
+
+    def __init__(self, api_key, timeout=10, max_retries=2):
+        self.client = stripe.StripeClient(
+            api_key,
+            http_client=stripe.RequestsClient(timeout=timeout, session=requests.Session()),
+            max_network_retries=max_retries
+        )
+
+    def create_payment_intent(self, amount, currency, idempotency_key, shipping=None, metadata=None):
+        params = {
+            'amount': amount,
+            'currency': currency,
+            'automatic_payment_methods': {'enabled': True},
+            'metadata': metadata or {}
+        }
+        if shipping:
+            params['shipping'] = shipping
+
+        try:
+            with observe_stripe('payment_intent.create'):
+                intent = self.client.payment_intents.create(
+                    params=params, options={'idempotency_key': idempotency_key})
+        except stripe.StripeError as e:
+            raise PaymentError(str(e)) from e
+        return PaymentIntent(intent.id, intent.client_secret, intent.amount, intent.status)
+
+    def retrieve_payment_intent(self, intent_id):
+        try:
+            with observe_stripe('payment_intent.retrieve'):
+                intent = self.client.payment_intents.retrieve(intent_id)
+        except stripe.StripeError as e:
+            raise PaymentError(str(e)) from e
+        return PaymentIntent(intent.id, intent.client_secret, intent.amount, intent.status)
+
+
+class FakeGateway:
+    """In-memory gateway for tests and local development.
+
+    Honours idempotency keys like Stripe does and can be told to fail.
+    Intents stay unpaid until ``succeed()`` is called.
+    """
+
+    def __init__(self):
+        self.intents = {}
+        self.calls = []
+        self.fail_with = None
+
+    def create_payment_intent(self, amount, currency, idempotency_key, shipping=None, metadata=None):
+        self.calls.append({'amount': amount, 'currency': currency,
+                           'idempotency_key': idempotency_key, 'metadata': metadata})
+        if self.fail_with:
+            raise PaymentError(self.fail_with)
+        if idempotency_key not in self.intents:
+            intent_id = f'pi_fake_{idempotency_key[:24]}'
+            self.intents[idempotency_key] = PaymentIntent(intent_id, f'{intent_id}_secret', amount,
+                                                          'requires_payment_method')
+        return self.intents[idempotency_key]
+
+    def retrieve_payment_intent(self, intent_id):
+        for intent in self.intents.values():
+            if intent.id == intent_id:
+                return intent
+        raise PaymentError(f'No such payment_intent: {intent_id}')
+
+    def succeed(self, intent_id):
+        """Mark an intent as paid, as the customer confirming it with Stripe.js would."""
+        self.retrieve_payment_intent(intent_id).status = 'succeeded'
+
+
+def get_payment_gateway():
+    """Return this worker's gateway, or None if payments aren't configured."""
+    state = current_app.extensions.setdefault('payments', {})
+    if 'gateway' not in state:
+        if current_app.config['PAYMENT_GATEWAY'] == 'fake':
+            state['gateway'] = FakeGateway()
+        else:
+            api_key = current_app.config.get('STRIPE_SECRET_KEY') or os.environ.get('STRIPE_SECRET_KEY')
+            if not api_key:
+                return None
+            state['gateway'] = StripeGateway(api_key,
+                                             timeout=current_app.config['STRIPE_TIMEOUT'],
+                                             max_retries=current_app.config['STRIPE_MAX_RETRIES'])
+    return state['gateway']
+
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from flask import current_app, request
+from sqlalchemy import case, select
+
+from app import db
+from models.rate_limit import RateLimit
+from services.counters import insert_for_dialect
+from services.jobs import job
+
+
+def hit(action, identity, limit, window):
+    """Count a hit against ``action`` for ``identity``; return whether it is allowed.
+
+    Fixed window of ``window`` seconds shared by every worker. The counter
+    is a single upsert in the caller's transaction, so concurrent hits are
+    all counted.
+    """
+    key = f'{action}:{identity}'[:128]
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=window)
+    expired = RateLimit.expires_at <= now
+
+    insert = insert_for_dialect()
+    statement = insert(RateLimit).values(key=key, count=1, expires_at=expires_at)
+    statement = statement.on_conflict_do_update(
+        index_elements=[RateLimit.key],
+        set_={
+            'count': case((expired, 1), else_=RateLimit.count + 1),
+            'expires_at': case((expired, expires_at), else_=RateLimit.expires_at)
+        }
+    )
+    db.session.execute(statement)
+    count = db.session.execute(select(RateLimit.count).where(RateLimit.key == key)).scalar_one()
+    return count <= limit
+
+
+def hit_from_client(action):
+    """Count a hit by the requesting IP against the ``<ACTION>_RATE_LIMIT`` setting.
+
+    The setting is ``(limit, window_seconds)``; None disables the limit.
+    """
+    setting = current_app.config.get(f'{action.upper()}_RATE_LIMIT')
+    if not setting:
+        return True
+    limit, window = setting
+    return hit(action, request.remote_addr or 'unknown', limit, window)
+
+
+@job('rate_limit.purge', every='RATE_LIMIT_PURGE_INTERVAL')
+def purge_expired():
+    """Delete counters whose window has ended."""
+    RateLimit.query.filter(RateLimit.expires_at < datetime.utcnow()).delete(synchronize_session=False)
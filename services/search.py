@@ -0,0 +1,240 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+
+from flask import current_app, url_for
+
+from services.cache import LRUCache
+from services.catalog import get_catalog
+from services.metrics import record_cache
+
+_lock = threading.Lock()
+_TOKEN_RE = re.compile(r'\w+')
+
+# Relative weight of a term hit in each indexed field.
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'category': 2.0,
+    'description': 1.0
+}
+
+# Tokens shorter than this only match whole terms, to keep prefix
+# expansion from fanning out over most of the vocabulary.
+MIN_PREFIX_LENGTH = 2
+
+
+def normalize(text):
+    """Lowercase text and strip accents so 'Diseño' matches 'diseno'."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize(text))
+
+
+class SearchIndex:
+    """In-memory inverted index with prefix expansion and weighted ranking.
+
+    ``documents`` is an iterable of ``(kind, item, fields)`` tuples where
+    ``fields`` maps a key of ``FIELD_WEIGHTS`` to the text to index.
+    """
+
+    def __init__(self, documents):
+        self.documents = []
+        self.postings = {}
+
+        for doc_id, (kind, item, fields) in enumerate(documents):
+            self.documents.append((kind, item))
+            for field, text in fields.items():
+                weight = FIELD_WEIGHTS[field]
+                for term in tokenize(text):
+                    postings = self.postings.setdefault(term, {})
+                    postings[doc_id] = postings.get(doc_id, 0) + weight
+
+        count = len(self.documents)
+        self.terms = sorted(self.postings)
+        self.idf = {
+            term: math.log(1 + count / len(postings))
+            for term, postings in self.postings.items()
+        }
+
+    def expand(self, token):
+        """Return the indexed terms that start with ``token``."""
+        if len(token) < MIN_PREFIX_LENGTH:
+            return [token] if token in self.postings else []
+        start = bisect.bisect_left(self.terms, token)
+        end = bisect.bisect_left(self.terms, token + '\uffff')
+        return self.terms[start:end]
+
+    def match(self, query):
+        """Return ``{doc_id: score}`` for documents matching every query token."""
+        scores = None
+        for token in tokenize(query):
+            token_scores = {}
+            for term in self.expand(token):
+                # Whole-word hits rank above prefix hits
+                boost = self.idf[term] * (1.0 if term == token else 0.5)
+                for doc_id, weight in self.postings[term].items():
+                    token_scores[doc_id] = token_scores.get(doc_id, 0) + weight * boost
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc_id: score + token_scores[doc_id]
+                          for doc_id, score in scores.items() if doc_id in token_scores}
+            if not scores:
+                break
+
+        return scores or {}
+
+    def rank(self, scores, limit=None):
+        """Return ``(kind, item, score)`` tuples, best first.
+
+        With a ``limit`` only the top hits are selected, which avoids
+        sorting every match when a single page is needed.
+        """
+        key = lambda hit: (-hit[1], hit[0])
+        if limit is None:
+            ranked = sorted(scores.items(), key=key)
+        else:
+            ranked = heapq.nsmallest(limit, scores.items(), key=key)
+        return [self.documents[doc_id] + (score,) for doc_id, score in ranked]
+
+    def search(self, query, limit=None):
+        return self.rank(self.match(query), limit=limit)
+
+
+class SuggestIndex:
+    """Sorted-array prefix index over titles for search-as-you-type.
+
+    Every word position of a title is indexed as a key running to the end
+    of the title, so 'acua' matches 'Retrato acuarela'. Lookups are two
+    bisections plus a scan of at most the matching range.
+    """
+
+    def __init__(self, titles):
+        entries = []
+        self.items = []
+        for item_id, (kind, item, title) in enumerate(titles):
+            self.items.append((kind, item, title))
+            tokens = tokenize(title)
+            for position in range(len(tokens)):
+                entries.append((' '.join(tokens[position:]), position, item_id))
+        entries.sort()
+        self.keys = [key for key, position, item_id in entries]
+        self.refs = [item_id for key, position, item_id in entries]
+
+    def suggest(self, prefix, limit=8):
+        """Return up to ``limit`` ``(kind, item, title)`` tuples matching ``prefix``."""
+        prefix = ' '.join(tokenize(prefix))
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\uffff', lo=start)
+
+        seen = set()
+        results = []
+        for position in range(start, end):
+            item_id = self.refs[position]
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+            results.append(self.items[item_id])
+            if len(results) >= limit:
+                break
+        return results
+
+
+class CatalogIndexes:
+    """Search structures derived from one catalog version."""
+
+    def __init__(self, catalog, cache_size=256):
+        self.version = catalog.version
+        self.search = SearchIndex(_catalog_documents(catalog))
+        self.suggest = SuggestIndex(
+            (kind, item, fields['title']) for kind, item, fields in _catalog_documents(catalog)
+        )
+        # Recent suggestion payloads; dropped together with the indexes
+        self.suggestions = LRUCache(cache_size)
+
+
+def _catalog_documents(catalog):
+    for work in catalog.portfolio:
+        yield 'portfolio', work, {
+            'title': work.title,
+            'description': work.description,
+            'category': work.category
+        }
+    for product in catalog.products:
+        if not product.is_available:
+            continue
+        yield 'product', product, {
+            'title': product.name,
+            'description': product.description,
+            'category': product.category
+        }
+
+
+def get_catalog_indexes():
+    """Return the search indexes for the current catalog version.
+
+    They are rebuilt from the catalog snapshot whenever the catalog
+    version changes, so admin writes are picked up on the next search.
+    """
+    catalog = get_catalog()
+    state = current_app.extensions.setdefault('search', {})
+    indexes = state.get('indexes')
+    if indexes and indexes.version == catalog.version:
+        return indexes
+
+    with _lock:
+        indexes = state.get('indexes')
+        if not indexes or indexes.version != catalog.version:
+            indexes = CatalogIndexes(catalog, current_app.config['SEARCH_SUGGEST_CACHE_SIZE'])
+            state['indexes'] = indexes
+    return indexes
+
+
+def get_search_index():
+    return get_catalog_indexes().search
+
+
+def suggest_catalog(query, limit=8):
+    """Return JSON-ready title suggestions for ``query``, cached per version."""
+    indexes = get_catalog_indexes()
+    key = (normalize(query).strip(), limit)
+    suggestions = indexes.suggestions.get(key)
+    record_cache('search_suggest', suggestions is not None)
+    if suggestions is None:
+        suggestions = []
+        for kind, item, title in indexes.suggest.suggest(query, limit):
+            if kind == 'product':
+                url = url_for('shop.product_detail', product_id=item.id)
+            else:
+                url = url_for('portfolio.work_detail', work_id=item.id)
+            suggestions.append({'type': kind, 'id': item.id, 'title': title, 'url': url})
+        indexes.suggestions.set(key, suggestions)
+    return suggestions
+
+
+def search_catalog(query, page=1, per_page=12):
+    """Run a ranked catalog search and return one page of results."""
+    index = get_search_index()
+    scores = index.match(query)
+    total = len(scores)
+    pages = max(1, math.ceil(total / per_page))
+    page = min(max(page, 1), pages)
+    page_hits = index.rank(scores, limit=page * per_page)[(page - 1) * per_page:]
+
+    return {
+        'hits': page_hits,
+        'portfolio': [item for kind, item, score in page_hits if kind == 'portfolio'],
+        'products': [item for kind, item, score in page_hits if kind == 'product'],
+        'total': total,
+        'page': page,
+        'pages': pages
+    }
@@ -0,0 +1,184 @@
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, select, update
+
+from app import db
+from models.order import Order
+from models.product import Product
+from models.stock import StockReservation
+from services.catalog import bump_stock_on_commit
+from services.jobs import enqueue, job
+
+
+class OutOfStock(Exception):
+    """Raised when a reservation cannot be satisfied from the remaining stock."""
+
+    def __init__(self, product):
+        super().__init__(f'Insufficient stock for {product.name}')
+        self.product = product
+
+
+def _take(product_id, quantity):
+    # The WHERE clause makes the check and the decrement one atomic step,
+    # so concurrent checkouts can never drive stock below zero
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.stock_quantity >= quantity)
+        .values(stock_quantity=Product.stock_quantity - quantity)
+    )
+    if result.rowcount != 1:
+        return False
+    bump_stock_on_commit()
+    return True
+
+
+def reserve_stock(order, order_items):
+    """Hold stock for the physical lines of a pending order.
+
+    Runs in the caller's transaction; raises OutOfStock if any line can't
+    be satisfied, in which case the caller must roll back. Products are
+    locked in id order so concurrent checkouts never deadlock. Returns the
+    number of reservations made.
+    """
+    ttl = current_app.config['STOCK_RESERVATION_TTL']
+    expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+    tracked = sorted((item for item in order_items if not item['product'].digital_product),
+                     key=lambda item: item['product'].id)
+
+    for item in tracked:
+        if not _take(item['product'].id, item['quantity']):
+            raise OutOfStock(item['product'])
+        db.session.add(StockReservation(
+            order_id=order.id,
+            product_id=item['product'].id,
+            quantity=item['quantity'],
+            expires_at=expires_at
+        ))
+
+    if tracked:
+        enqueue('stock.release', unique_key=f'stock.release:{order.id}', delay=ttl, order_id=order.id)
+    return len(tracked)
+
+
+def release_stock(order_id):
+    """Return an order's held units to stock; returns how many holds were released."""
+    held = db.session.query(StockReservation.id, StockReservation.product_id, StockReservation.quantity)\
+                     .filter_by(order_id=order_id, status='held').all()
+    released = 0
+    for reservation_id, product_id, quantity in held:
+        claimed = db.session.execute(
+            update(StockReservation)
+            .where(StockReservation.id == reservation_id, StockReservation.status == 'held')
+            .values(status='released')
+        ).rowcount
+        if claimed:
+            db.session.execute(
+                update(Product).where(Product.id == product_id)
+                .values(stock_quantity=Product.stock_quantity + quantity)
+            )
+            released += 1
+    if released:
+        bump_stock_on_commit()
+    return released
+
+
+def available_stock(product_id):
+    """Return a product's live stock.
+
+    Catalog snapshots are not reloaded for stock changes, so their
+    ``stock_quantity`` may predate recent checkouts.
+    """
+    return db.session.query(Product.stock_quantity).filter_by(id=product_id).scalar() or 0
+
+
+def held_quantity(product_id, order_id=None):
+    """Return the units of a product held by unpaid orders, or by one order."""
+    query = db.session.query(func.coalesce(func.sum(StockReservation.quantity), 0))\
+                      .filter_by(product_id=product_id, status='held')
+    if order_id is not None:
+        query = query.filter_by(order_id=order_id)
+    return query.scalar()
+
+
+def set_stock_on_hand(product_id, on_hand):
+    """Set a product's stock from a count of units on hand.
+
+    Units held by unpaid orders are part of that count but not for sale,
+    so they are subtracted; when a hold is released its units come back
+    and stock returns to ``on_hand`` instead of overshooting it.
+    """
+    held = select(func.coalesce(func.sum(StockReservation.quantity), 0))\
+        .where(StockReservation.product_id == product_id, StockReservation.status == 'held')\
+        .scalar_subquery()
+    db.session.execute(
+        update(Product).where(Product.id == product_id).values(stock_quantity=on_hand - held)
+    )
+    bump_stock_on_commit()
+
+
+def commit_stock(order):
+    """Make a paid order's reservations permanent.
+
+    Holds that already expired are taken again if the stock is still
+    there; otherwise the shortfall is logged for manual follow-up.
+    """
+    db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.order_id == order.id, StockReservation.status == 'held')
+        .values(status='committed')
+    )
+    expired = StockReservation.query.filter_by(order_id=order.id, status='released').all()
+    if expired and order.status == 'cancelled':
+        order.status = 'pending'
+    for reservation in expired:
+        if _take(reservation.product_id, reservation.quantity):
+            reservation.status = 'committed'
+        else:
+            current_app.logger.warning(
+                f"Order {order.order_number} was paid after its reservation expired; "
+                f"product {reservation.product_id} is short by {reservation.quantity}")
+
+
+def cancel_unpaid_order(order_id):
+    """Cancel an unpaid order that holds stock and release its holds.
+
+    Returns whether the order was cancelled; paid orders and orders
+    holding nothing are left alone.
+    """
+    order = db.session.get(Order, order_id)
+    if order is None or order.payment_status != 'pending':
+        return False
+    if release_stock(order_id):
+        order.status = 'cancelled'
+        order.payment_status = 'failed'
+        return True
+    return False
+
+
+@job('stock.release')
+def release_expired_order(order_id):
+    """Release an unpaid order's stock once its reservation TTL has passed."""
+    if cancel_unpaid_order(order_id):
+        current_app.logger.info(f"Released stock held by unpaid order {order_id}")
+
+
+def release_expired():
+    """Release every expired hold; returns the number of orders cancelled."""
+    order_ids = [order_id for (order_id,) in db.session.query(StockReservation.order_id).filter(
+        StockReservation.status == 'held', StockReservation.expires_at < datetime.utcnow()
+    ).distinct()]
+    return sum(1 for order_id in order_ids if cancel_unpaid_order(order_id))
+
+
+stock_cli = AppGroup('stock', help='Stock reservation commands.')
+
+
+@stock_cli.command('release-expired')
+def release_expired_command():
+    """Release stock held by orders whose reservation has expired."""
+    count = release_expired()
+    db.session.commit()
+    click.echo(f'Released stock for {count} order(s).')
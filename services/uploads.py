@@ -0,0 +1,174 @@
+import hashlib
+import io
+import os
+import tempfile
+from contextlib import closing
+
+from flask import current_app, session
+from sqlalchemy import update
+
+from app import db
+from models.blob import Blob
+from services.blobs import add_references, get_blob_store, store_bytes, store_file
+from services.jobs import enqueue, job
+
+CHUNK_SIZE = 64 * 1024
+SNIFF_SIZE = 16
+MAX_SESSION_UPLOADS = 5
+
+
+class UploadError(Exception):
+    """Raised when an upload is rejected; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_image_type(head):
+    """Return the MIME type for an image's leading bytes, or None."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def _read_head(stream):
+    head = b''
+    while len(head) < SNIFF_SIZE:
+        chunk = stream.read(SNIFF_SIZE - len(head))
+        if not chunk:
+            break
+        head += chunk
+    return head
+
+
+def receive_image(stream, content_length=None):
+    """Stream an image body into the blob store in fixed-size chunks.
+
+    The type is checked from the first bytes and the size against
+    CUSTOMER_IMAGE_MAX_SIZE (up front from Content-Length, and again while
+    reading), so bad uploads are refused before much is read. The blob key
+    is the SHA-256 of the content, so identical uploads are stored once.
+    Returns (key, size). The caller commits.
+    """
+    max_size = current_app.config['CUSTOMER_IMAGE_MAX_SIZE']
+    if content_length is not None and content_length > max_size:
+        raise UploadError('La imagen es demasiado grande.', 413)
+
+    head = _read_head(stream)
+    content_type = sniff_image_type(head)
+    if content_type is None:
+        raise UploadError('Formato de imagen no soportado. Usa JPG, PNG, GIF o WebP.', 415)
+
+    digest = hashlib.sha256(head)
+    size = len(head)
+    fd, tmp_path = tempfile.mkstemp(dir=get_blob_store().staging_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(head)
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadError('La imagen es demasiado grande.', 413)
+                digest.update(chunk)
+                f.write(chunk)
+
+        key = store_file(digest.hexdigest(), tmp_path, size, content_type)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return key, size
+
+
+def check_upload_quota():
+    """Refuse another upload while the session has MAX_SESSION_UPLOADS unused ones.
+
+    Each upload is kept as an orphan blob until BLOB_ORPHAN_TTL, so a
+    session may only stage a few before attaching one to an order.
+    """
+    if len(session.get('customer_uploads', [])) >= MAX_SESSION_UPLOADS:
+        raise UploadError('Has subido demasiadas imágenes; usa una de ellas en tu pedido.', 429)
+
+
+def remember_upload(key):
+    """Allow the current session to attach an uploaded image to its order."""
+    uploads = [entry for entry in session.get('customer_uploads', []) if entry != key]
+    uploads.append(key)
+    session['customer_uploads'] = uploads[-MAX_SESSION_UPLOADS:]
+
+
+def consume_upload(key):
+    """Stop counting an upload against the session once an order uses it."""
+    uploads = session.get('customer_uploads', [])
+    if key in uploads:
+        session['customer_uploads'] = [entry for entry in uploads if entry != key]
+
+
+def uploaded_image_key(token):
+    """Return the blob key for an upload token owned by this session, or None.
+
+    The image of the session's pending order stays valid, so a resubmitted
+    checkout can send the same token again.
+    """
+    if not token:
+        return None
+    if token in session.get('customer_uploads', []):
+        return token
+    if token == (session.get('pending_order') or {}).get('image'):
+        return token
+    return None
+
+
+def attach_image(key, count):
+    """Count ``count`` order items as references to an uploaded image.
+
+    Raises UploadError if the blob has been purged since it was uploaded.
+    """
+    if not add_references(key, count):
+        raise UploadError('La imagen ya no está disponible, vuelve a subirla.', 400)
+
+
+def queue_processing(key):
+    """Schedule thumbnail generation for an uploaded image (once per content)."""
+    enqueue('uploads.process', unique_key=f'uploads.process:{key}', key=key)
+
+
+@job('uploads.process')
+def process_image(key):
+    """Store a normalized JPEG thumbnail of an uploaded image.
+
+    Needs Pillow; without it the original is kept as the only rendition.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        current_app.logger.warning('Pillow is not installed; skipping customer image thumbnails')
+        return
+
+    size = current_app.config['CUSTOMER_IMAGE_THUMBNAIL_SIZE']
+    with closing(get_blob_store().open(key)) as source, Image.open(source) as image:
+        # Apply the camera orientation, drop metadata and flatten to RGB
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image.thumbnail((size, size))
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=85, optimize=True)
+
+    thumbnail_key = store_bytes(output.getvalue(), 'image/jpeg')
+    linked = db.session.execute(
+        update(Blob)
+        .where(Blob.key == key, Blob.thumbnail_key.is_(None))
+        .values(thumbnail_key=thumbnail_key)
+    ).rowcount
+    if linked:
+        add_references(thumbnail_key)
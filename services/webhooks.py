@@ -0,0 +1,251 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+import click
+import stripe
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models.order import Order
+from models.webhook import WebhookEvent
+from services.jobs import backoff, enqueue, job
+from services.metrics import WEBHOOK_EVENTS
+from services.stock import release_stock
+
+
+class WebhookError(Exception):
+    """Raised for webhook payloads that fail verification or parsing."""
+
+
+def _succeeded(order, obj):
+    if order.mark_as_paid():
+        current_app.logger.info(f"Order {order.order_number} marked as paid via webhook")
+
+
+def _failed(order, obj):
+    if order.payment_status == 'pending':
+        order.payment_status = 'failed'
+
+
+def _canceled(order, obj):
+    if order.payment_status == 'pending':
+        order.payment_status = 'failed'
+        order.status = 'cancelled'
+        release_stock(order.id)
+
+
+def _refunded(order, obj):
+    # charge.refunded also fires for partial refunds; only a charge Stripe
+    # reports as fully refunded takes the order (and its revenue) back
+    if not obj.get('refunded'):
+        current_app.logger.warning(
+            f"Order {order.order_number} partially refunded via webhook: "
+            f"{obj.get('amount_refunded', 0)} of {obj.get('amount')} (minor units); status unchanged")
+        return
+    if order.mark_as_refunded():
+        current_app.logger.info(f"Order {order.order_number} refunded via webhook")
+
+
+# Order transitions by event type, called with the order and the event's data
+# object; other event types are acknowledged and dropped
+TRANSITIONS = {
+    'payment_intent.succeeded': _succeeded,
+    'payment_intent.payment_failed': _failed,
+    'payment_intent.canceled': _canceled,
+    'charge.refunded': _refunded,
+}
+
+
+def _unsigned_events_allowed():
+    # Only tests and the fake gateway may skip verification; anything else
+    # without a secret would let anyone mark orders as paid
+    return current_app.testing or current_app.config['PAYMENT_GATEWAY'] == 'fake'
+
+
+def parse_event(payload, sig_header):
+    """Verify the Stripe signature and decode the event.
+
+    Fails closed: without STRIPE_WEBHOOK_SECRET every event is rejected,
+    except under TESTING or the fake payment gateway.
+    """
+    secret = current_app.config['STRIPE_WEBHOOK_SECRET']
+    if not secret:
+        if not _unsigned_events_allowed():
+            raise WebhookError('Webhook signing secret is not configured')
+    else:
+        try:
+            stripe.WebhookSignature.verify_header(
+                payload, sig_header or '', secret, current_app.config['STRIPE_WEBHOOK_TOLERANCE'])
+        except stripe.SignatureVerificationError as e:
+            raise WebhookError(str(e)) from e
+
+    try:
+        event = json.loads(payload)
+    except ValueError as e:
+        raise WebhookError('Invalid JSON payload') from e
+    if not isinstance(event, dict) or not event.get('id') or not event.get('type'):
+        raise WebhookError('Malformed event')
+    return event
+
+
+def _object_id(event):
+    obj = (event.get('data') or {}).get('object') or {}
+    if event['type'].startswith('charge.'):
+        return obj.get('payment_intent')
+    return obj.get('id')
+
+
+def _schedule_apply():
+    # One apply job per window, due once the window has closed, so a burst
+    # of events is applied in a few batches instead of one job per event.
+    # Returns the window so callers can skip re-enqueueing it.
+    window = current_app.config['WEBHOOK_BATCH_WINDOW']
+    now = time.time()
+    bucket = int(now // window)
+    if current_app.extensions.get('webhooks_scheduled') != bucket:
+        enqueue('webhooks.apply', unique_key=f'webhooks.apply:{bucket}',
+                delay=(bucket + 2) * window - now)
+    return bucket
+
+
+def ingest_event(payload, sig_header):
+    """Durably record a webhook event and schedule it for application.
+
+    Returns 'stored', 'duplicate' (redelivered event id) or 'ignored'
+    (event type we don't act on). Commits before returning, so the caller
+    can acknowledge Stripe immediately.
+    """
+    event = parse_event(payload, sig_header)
+    if event['type'] not in TRANSITIONS:
+        WEBHOOK_EVENTS.labels('other', 'ignored').inc()
+        return 'ignored'
+
+    try:
+        # The primary key is the dedup check; a redelivery fails the insert
+        db.session.execute(insert(WebhookEvent).values(
+            id=event['id'],
+            type=event['type'],
+            object_id=_object_id(event),
+            payload=payload,
+            received_at=datetime.utcnow()
+        ))
+    except IntegrityError:
+        db.session.rollback()
+        WEBHOOK_EVENTS.labels(event['type'], 'duplicate').inc()
+        return 'duplicate'
+
+    bucket = _schedule_apply()
+    db.session.commit()
+    current_app.extensions['webhooks_scheduled'] = bucket
+    WEBHOOK_EVENTS.labels(event['type'], 'stored').inc()
+    return 'stored'
+
+
+def _defer(event, now):
+    """Put an event whose order was not found back in the queue, or dead-letter it.
+
+    The order may simply not be committed yet (Stripe can be faster than
+    the checkout request), so the event is retried with backoff; after
+    WEBHOOK_MAX_ATTEMPTS it keeps ``processed_at`` and ``last_error`` set
+    until `flask webhooks retry` requeues it.
+    """
+    attempts = event.attempts + 1
+    error = f'No order for {event.object_id}'
+    if attempts >= current_app.config['WEBHOOK_MAX_ATTEMPTS']:
+        current_app.logger.error(f"Webhook {event.id}: {error} after {attempts} attempts, dead-lettered")
+        values = {'attempts': attempts, 'last_error': error}
+        WEBHOOK_EVENTS.labels(event.type, 'dead').inc()
+    else:
+        delay = backoff(attempts)
+        current_app.logger.warning(f"Webhook {event.id}: {error}, retrying in {delay:.0f}s")
+        values = {'attempts': attempts, 'last_error': error, 'processed_at': None,
+                  'retry_at': now + timedelta(seconds=delay)}
+        enqueue('webhooks.apply', unique_key=f'webhooks.retry:{event.id}:{attempts}', delay=delay)
+    db.session.execute(update(WebhookEvent).where(WebhookEvent.id == event.id).values(**values))
+
+
+def _apply_batch(events, now):
+    intent_ids = {event.object_id for event in events if event.object_id}
+    orders = {}
+    if intent_ids:
+        orders = {order.stripe_payment_intent_id: order for order in
+                  Order.query.filter(Order.stripe_payment_intent_id.in_(intent_ids))}
+
+    applied = 0
+    for event in sorted(events, key=lambda event: event.received_at):
+        order = orders.get(event.object_id)
+        if order is None:
+            _defer(event, now)
+            continue
+        obj = (json.loads(event.payload).get('data') or {}).get('object') or {}
+        TRANSITIONS[event.type](order, obj)
+        applied += 1
+    return applied
+
+
+@job('webhooks.apply')
+def apply_pending_events(batch_size=None):
+    """Apply unprocessed events to their orders, one batch per transaction.
+
+    Each batch is claimed by stamping ``processed_at`` with a conditional
+    UPDATE, so concurrent workers never apply the same event twice, and
+    its orders are loaded with a single IN query. Events whose order is
+    not found are deferred (see _defer). Returns the number of events
+    applied.
+    """
+    batch_size = batch_size or current_app.config['WEBHOOK_BATCH_SIZE']
+    applied = 0
+    while True:
+        now = datetime.utcnow()
+        due = db.session.query(WebhookEvent.id).filter(
+            WebhookEvent.processed_at.is_(None),
+            db.or_(WebhookEvent.retry_at.is_(None), WebhookEvent.retry_at <= now)
+        )
+        ids = [event_id for (event_id,) in due.order_by(WebhookEvent.received_at).limit(batch_size)]
+        if not ids:
+            return applied
+
+        claimed = db.session.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.id.in_(ids), WebhookEvent.processed_at.is_(None))
+            .values(processed_at=now, last_error=None)
+            .returning(WebhookEvent.id, WebhookEvent.type, WebhookEvent.object_id,
+                       WebhookEvent.payload, WebhookEvent.received_at, WebhookEvent.attempts)
+        ).all()
+        applied += _apply_batch(claimed, now)
+        db.session.commit()
+
+
+webhooks_cli = AppGroup('webhooks', help='Payment webhook commands.')
+
+
+@webhooks_cli.command('apply')
+def apply_command():
+    """Apply all pending webhook events now."""
+    click.echo(f'Applied {apply_pending_events()} event(s).')
+
+
+@webhooks_cli.command('retry')
+def retry_command():
+    """Requeue dead-lettered events (e.g. after fixing the missing orders)."""
+    count = WebhookEvent.query.filter(
+        WebhookEvent.processed_at.isnot(None), WebhookEvent.last_error.isnot(None)
+    ).update({'processed_at': None, 'retry_at': None, 'attempts': 0}, synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Requeued {count} event(s); run `flask webhooks apply` or the job worker.')
+
+
+@webhooks_cli.command('purge')
+@click.option('--days', default=30, show_default=True,
+              help='Delete processed events older than this (keep longer than Stripe retries).')
+def purge_command(days):
+    """Delete old processed webhook events (dead-lettered ones are kept)."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    count = WebhookEvent.query.filter(WebhookEvent.processed_at < cutoff,
+                                      WebhookEvent.last_error.is_(None)).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Deleted {count} event(s).')
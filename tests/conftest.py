@@ -0,0 +1,106 @@
+import pytest
+from flask import g
+from sqlalchemy import event
+
+from app import create_app, db
+from config import TestingConfig
+
+
+@pytest.fixture
+def app(tmp_path):
+    class Config(TestingConfig):
+        CATALOG_GENERATION_FILE = str(tmp_path / 'catalog.generation')
+        STOCK_GENERATION_FILE = str(tmp_path / 'stock.generation')
+        BLOB_STORE_DIR = str(tmp_path / 'blobs')
+
+    app = create_app(Config)
+
+    @app.teardown_request
+    def forget_login(exc):
+        # Requests reuse the test's app context, so drop Flask-Login's cached user
+        g.pop('_login_user', None)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def catalog(app):
+    """A small catalog: 20 products and 20 portfolio works."""
+    from models.portfolio import Portfolio
+    from models.product import Product
+
+    products = [
+        Product(name=f'Retrato {i}' if i % 2 else f'Logo {i}',
+                description='Retrato en acuarela' if i % 2 else 'Diseño de logotipo',
+                price=10 + i, image_url='https://images.unsplash.com/photo-1?w=400',
+                category='retratos' if i % 2 else 'logos', is_featured=i < 3)
+        for i in range(20)
+    ]
+    works = [
+        Portfolio(title=f'Obra {i}', description='Identidad de marca', image_url='/static/x.jpg',
+                  category='branding', featured=i < 4)
+        for i in range(20)
+    ]
+    db.session.add_all(products + works)
+    db.session.commit()
+    return products, works
+
+
+class QueryCounter:
+    """Records the SQL statements the app's engine executes while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_queries(app):
+    """``with count_queries() as queries: ...`` then ``queries.count``."""
+    return lambda: QueryCounter(db.engine)
+
+
+@pytest.fixture
+def users(app):
+    """An admin and a customer, both with password ``pw``."""
+    from models.user import User
+
+    admin = User(username='admin', email='admin@example.com', first_name='Ada', last_name='Admin', role='admin')
+    customer = User(username='cliente', email='cliente@example.com', first_name='Carla', last_name='Cliente')
+    for user in (admin, customer):
+        user.set_password('pw')
+    db.session.add_all([admin, customer])
+    db.session.commit()
+    return admin, customer
+
+
+@pytest.fixture
+def login(client):
+    def login(username):
+        response = client.post('/auth/login', data={'username': username, 'password': 'pw'})
+        assert response.status_code == 302
+    return login
@@ -0,0 +1,108 @@
+"""Incremental daily sales rollups."""
+from datetime import date, datetime, timedelta
+
+from app import db
+from models.analytics import DailyProductSales, DailySales, RollupWatermark
+from models.order import Order, OrderItem
+from services.analytics import refresh_rollups, sales_report
+
+
+def paid_order(product, created_at, quantity=1, status='paid'):
+    order = Order(customer_name='Carla', customer_email='c@example.com',
+                  total_amount=product.price * quantity, payment_status=status,
+                  created_at=created_at)
+    order.items.append(OrderItem(product_id=product.id, product_name=product.name,
+                                 product_price=product.price, quantity=quantity))
+    db.session.add(order)
+    db.session.commit()
+    return order
+
+
+def test_refresh_rolls_up_paid_orders_per_day(app, catalog):
+    products, _ = catalog
+    paid_order(products[0], datetime(2026, 3, 1, 9), quantity=2)
+    paid_order(products[1], datetime(2026, 3, 1, 23, 59))
+    paid_order(products[1], datetime(2026, 3, 2, 0, 0))
+    paid_order(products[2], datetime(2026, 3, 2, 12), status='pending')
+
+    assert refresh_rollups() == 2
+
+    rows = {row.day: row for row in DailySales.query.all()}
+    assert rows[date(2026, 3, 1)].orders == 2
+    assert rows[date(2026, 3, 1)].items == 3
+    assert rows[date(2026, 3, 1)].revenue == products[0].price * 2 + products[1].price
+    assert rows[date(2026, 3, 2)].orders == 1
+    product_rows = DailyProductSales.query.filter_by(day=date(2026, 3, 1)).all()
+    assert {row.product_id: row.quantity for row in product_rows} == {products[0].id: 2, products[1].id: 1}
+
+
+def test_refresh_only_rebuilds_changed_days(app, catalog):
+    products, _ = catalog
+    for day in (1, 5):
+        order = paid_order(products[0], datetime(2026, 3, day, 9))
+        order.updated_at = datetime(2026, 3, day, 9)
+    db.session.commit()
+    refresh_rollups()
+    watermark = db.session.get(RollupWatermark, 'sales').watermark
+    assert watermark == datetime(2026, 3, 5, 9)
+
+    order = paid_order(products[0], datetime(2026, 3, 5, 10))
+    order.updated_at = watermark + timedelta(hours=1)
+    db.session.commit()
+
+    assert refresh_rollups() == 1
+    assert db.session.get(DailySales, date(2026, 3, 5)).orders == 2
+
+
+def test_rows_committed_late_within_the_overlap_are_picked_up(app, catalog):
+    products, _ = catalog
+    paid_order(products[0], datetime(2026, 3, 1, 9))
+    refresh_rollups()
+    watermark = db.session.get(RollupWatermark, 'sales').watermark
+
+    # Stamped before the watermark, but committed after the refresh
+    late = paid_order(products[1], datetime(2026, 3, 3, 9))
+    late.updated_at = watermark - timedelta(seconds=30)
+    db.session.commit()
+
+    refresh_rollups()
+    assert db.session.get(DailySales, date(2026, 3, 3)).orders == 1
+    assert db.session.get(RollupWatermark, 'sales').watermark == watermark
+
+
+def test_refresh_filters_days_by_created_at_range(app, catalog, count_queries):
+    products, _ = catalog
+    paid_order(products[0], datetime(2026, 3, 1, 9))
+
+    with count_queries() as queries:
+        refresh_rollups(full=True)
+
+    reads = [sql for sql in queries.statements if sql.startswith('SELECT') and 'order_items' in sql]
+    assert reads
+    assert all('orders.created_at >=' in sql and 'orders.created_at <' in sql for sql in reads)
+    assert not any('date(orders.created_at) IN' in sql for sql in queries.statements)
+
+
+def test_sales_report_buckets_by_week(app, catalog):
+    products, _ = catalog
+    today = datetime.utcnow().replace(hour=12)
+    paid_order(products[0], today)
+    paid_order(products[0], today - timedelta(days=1))
+    refresh_rollups()
+
+    report = sales_report('week', days=30)
+
+    assert report['orders'] == 2
+    assert report['revenue'] == products[0].price * 2
+    assert report['products'][0]['quantity'] == 2
+
+
+def test_analytics_page_renders(client, catalog, users, login):
+    products, _ = catalog
+    paid_order(products[0], datetime.utcnow())
+    login('admin')
+
+    response = client.get('/admin/analytics?period=month')
+
+    assert response.status_code == 200
+    assert products[0].name in response.get_data(as_text=True)
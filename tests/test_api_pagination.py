@@ -0,0 +1,72 @@
+"""Keyset pagination of /api/portfolio and /api/products."""
+from datetime import datetime
+
+import pytest
+
+from app import db
+from models.product import Product
+
+
+def walk(client, url):
+    """Follow next_cursor to the end and return every page."""
+    pages = []
+    cursor = None
+    while True:
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        pages.append(response.get_json())
+        cursor = pages[-1]['next_cursor']
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize('url, key', [
+    ('/api/products?limit=6', 'products'),
+    ('/api/portfolio?limit=6', 'works'),
+])
+def test_cursor_walk_returns_every_row_once(client, catalog, url, key):
+    pages = walk(client, url)
+
+    ids = [row['id'] for page in pages for row in page[key]]
+    assert len(ids) == len(set(ids)) == 20
+    assert [page['count'] for page in pages] == [6, 6, 6, 2]
+    assert all('total' not in page for page in pages)
+
+
+def test_ties_on_created_at_are_broken_by_id(client, catalog):
+    products, _ = catalog
+    same_time = datetime(2026, 1, 1)
+    for product in products:
+        product.created_at = same_time
+    db.session.commit()
+
+    pages = walk(client, '/api/products?limit=7')
+
+    ids = [row['id'] for page in pages for row in page['products']]
+    assert ids == sorted(p.id for p in products)
+
+
+def test_rows_without_created_at_do_not_break_the_page(client, catalog):
+    products, _ = catalog
+    db.session.query(Product).filter(Product.id == products[-1].id).update({'created_at': None})
+    db.session.commit()
+
+    pages = walk(client, '/api/products?limit=5')
+
+    ids = [row['id'] for page in pages for row in page['products']]
+    assert len(ids) == 19
+    assert products[-1].id not in ids
+
+
+def test_limit_is_clamped(app, client, catalog):
+    app.config['API_MAX_PAGE_SIZE'] = 4
+
+    assert client.get('/api/products?limit=50').get_json()['count'] == 4
+    assert client.get('/api/products?limit=0').get_json()['count'] == 1
+
+
+def test_malformed_cursor_is_rejected(client, catalog):
+    response = client.get('/api/products?cursor=not-a-cursor')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
@@ -0,0 +1,107 @@
+"""Static assets are served under content-hashed URLs and cached for a year."""
+import gzip
+import os
+
+import pytest
+
+from services.assets import (ONE_YEAR, _load_manifest, asset_url, build_manifest, compress_assets,
+                            write_manifest)
+
+CSS = b'body { color: teal; }\n' * 200
+
+
+@pytest.fixture
+def static(app, tmp_path):
+    """A throwaway static folder with one stylesheet, fingerprinted and precompressed."""
+    folder = tmp_path / 'static'
+    (folder / 'css').mkdir(parents=True)
+    (folder / 'css' / 'site.css').write_bytes(CSS)
+    (folder / 'uploads').mkdir()
+    (folder / 'uploads' / 'photo.css').write_bytes(CSS)
+    manifest = build_manifest(str(folder), app.config['ASSET_EXCLUDE'])
+    compress_assets(str(folder), manifest)
+    app.static_folder = str(folder)
+    app.extensions['assets'] = {
+        'manifest': manifest,
+        'reverse': {fingerprinted: filename for filename, fingerprinted in manifest.items()},
+    }
+    return folder
+
+
+def test_manifest_fingerprints_content_and_skips_excluded_dirs(static):
+    manifest = build_manifest(str(static), ('uploads',))
+
+    assert list(manifest) == ['css/site.css']
+    assert manifest['css/site.css'].startswith('css/site.') and manifest['css/site.css'].endswith('.css')
+
+    (static / 'css' / 'site.css').write_bytes(CSS + b'a { }\n')
+    assert build_manifest(str(static), ('uploads',)) != manifest
+
+
+def test_asset_url_points_at_the_fingerprint(app, static):
+    with app.test_request_context():
+        url = asset_url('css/site.css')
+        assert url == '/assets/' + app.extensions['assets']['manifest']['css/site.css']
+        assert asset_url('css/missing.css') == '/static/css/missing.css'
+
+
+def test_fingerprinted_asset_is_immutable(app, client, static):
+    with app.test_request_context():
+        url = asset_url('css/site.css')
+
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.data == CSS
+    assert response.cache_control.max_age == ONE_YEAR
+    assert response.cache_control.immutable
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_precompressed_variant_is_served_when_accepted(app, client, static):
+    with app.test_request_context():
+        url = asset_url('css/site.css')
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == CSS
+
+
+def test_stale_variant_is_not_served(app, client, static):
+    path = static / 'css' / 'site.css'
+    os.utime(path, (os.stat(path).st_atime, os.stat(str(path) + '.gz').st_mtime + 10))
+    with app.test_request_context():
+        url = asset_url('css/site.css')
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == CSS
+
+
+def test_old_fingerprint_serves_current_file_uncached(client, static):
+    response = client.get('/assets/css/site.0123456789ab.css')
+
+    assert response.status_code == 200
+    assert response.data == CSS
+    assert not response.cache_control.immutable
+    assert response.cache_control.max_age != ONE_YEAR
+
+
+@pytest.mark.parametrize('path', ['/assets/css/site.css', '/assets/css/other.0123456789ab.css'])
+def test_unknown_assets_are_not_found(client, static, path):
+    assert client.get(path).status_code == 404
+
+
+def test_built_manifest_is_used_until_static_files_change(app, tmp_path, static):
+    manifest_file = tmp_path / 'assets.json'
+    write_manifest({'css/site.css': 'css/site.0000000built0.css'}, str(manifest_file))
+    built = os.stat(static / 'css' / 'site.css').st_mtime + 10
+    os.utime(manifest_file, (built, built))
+    app.config['ASSET_MANIFEST_FILE'] = str(manifest_file)
+
+    assert _load_manifest(app) == {'css/site.css': 'css/site.0000000built0.css'}
+
+    os.utime(static / 'css' / 'site.css', (built + 10, built + 10))
+    assert _load_manifest(app)['css/site.css'] != 'css/site.0000000built0.css'
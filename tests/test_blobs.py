@@ -0,0 +1,125 @@
+"""Blobs are stored once per content and purged when nothing refers to them."""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from models.blob import Blob
+from services.blobs import (LocalBlobStore, add_references, blob_path, get_blob_store,
+                            purge_blobs, store_bytes)
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+def upload(client, data=PNG):
+    return client.post('/shop/upload-customer-image', data=data,
+                       content_type='application/octet-stream').get_json()['token']
+
+
+def test_identical_uploads_are_stored_once(app, client):
+    first = upload(client)
+    second = upload(app.test_client())
+
+    assert first == second
+    assert Blob.query.count() == 1
+    assert len(get_blob_store().client.objects) == 1
+
+
+def test_local_store_fans_out_and_skips_duplicates(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    key = 'ab' * 32
+    for _ in range(2):
+        staged = tmp_path / 'tmp' / 'upload.part'
+        staged.write_bytes(PNG)
+        stored = store.put_file(key, str(staged))
+
+    assert stored is False
+    assert not staged.exists()
+    assert store.local_path(key) == os.path.join(str(tmp_path), 'ab', 'ab', key)
+    with store.open(key) as f:
+        assert f.read() == PNG
+
+
+@pytest.mark.parametrize('key', ['../../etc/passwd', 'AB' * 32, 'ab' * 31, None])
+def test_blob_path_rejects_invalid_keys(key):
+    with pytest.raises(ValueError):
+        blob_path(key)
+
+
+def test_checkout_references_the_image_once_per_item(client, catalog):
+    products, _ = catalog
+    portraits = products[1:4]
+    for product in portraits:
+        product.requires_image = True
+        client.post('/shop/add_to_cart', json={'product_id': product.id, 'quantity': 1})
+    client.post('/shop/add_to_cart', json={'product_id': products[0].id, 'quantity': 1})
+    db.session.commit()
+    token = upload(client)
+
+    response = client.post('/shop/create-payment-intent', json={
+        'name': 'Carla Cliente', 'email': 'carla@example.com', 'customer_image_token': token
+    })
+
+    assert response.status_code == 200
+    assert db.session.get(Blob, token).refcount == len(portraits)
+
+
+def test_purge_deletes_only_old_unreferenced_blobs(app):
+    store = get_blob_store()
+    old = store_bytes(PNG + b'old', 'image/png')
+    referenced = store_bytes(PNG + b'referenced', 'image/png')
+    recent = store_bytes(PNG + b'recent', 'image/png')
+    add_references(referenced)
+    db.session.commit()
+    Blob.query.filter(Blob.key.in_([old, referenced])).update(
+        {'last_used_at': datetime.utcnow() - timedelta(days=2)}, synchronize_session=False)
+    db.session.commit()
+
+    assert purge_blobs(datetime.utcnow() - timedelta(days=1)) == 1
+
+    assert db.session.get(Blob, old) is None
+    assert not store.exists(old)
+    assert store.exists(referenced) and store.exists(recent)
+
+
+def test_purging_an_image_releases_its_thumbnail(app):
+    original = store_bytes(PNG + b'original', 'image/png')
+    thumbnail = store_bytes(PNG + b'thumbnail', 'image/jpeg')
+    add_references(thumbnail)
+    db.session.get(Blob, original).thumbnail_key = thumbnail
+    db.session.commit()
+
+    purge_blobs(datetime.utcnow() + timedelta(seconds=1))
+
+    assert db.session.get(Blob, original) is None
+    assert db.session.get(Blob, thumbnail).refcount == 0
+
+
+def test_purge_keeps_the_row_if_the_file_cannot_be_deleted(app, monkeypatch):
+    store = get_blob_store()
+    key = store_bytes(PNG, 'image/png')
+    db.session.commit()
+
+    def fail(key):
+        raise OSError('bucket unavailable')
+
+    monkeypatch.setattr(store, 'delete', fail)
+    with pytest.raises(OSError):
+        purge_blobs(datetime.utcnow() + timedelta(seconds=1))
+
+    assert db.session.get(Blob, key) is not None
+    assert store.exists(key)
+
+
+def test_upload_after_a_purge_stores_the_file_again(app):
+    store = get_blob_store()
+    key = store_bytes(PNG, 'image/png')
+    db.session.commit()
+    purge_blobs(datetime.utcnow() + timedelta(seconds=1))
+
+    assert store_bytes(PNG, 'image/png') == key
+    db.session.commit()
+
+    assert db.session.get(Blob, key) is not None
+    assert store.exists(key)
@@ -0,0 +1,180 @@
+"""Cart pages: products are resolved in one query however many lines the cart has."""
+import pytest
+
+from services.cart import resolve_cart
+
+
+def fill_cart(client, products):
+    for product in products:
+        response = client.post('/shop/add_to_cart', json={'product_id': product.id, 'quantity': 1})
+        assert response.status_code == 200
+
+
+def queries_for(client, count_queries, url):
+    with count_queries() as queries:
+        response = client.get(url)
+    assert response.status_code == 200, url
+    return queries.count
+
+
+@pytest.mark.parametrize('url', ['/shop/cart', '/shop/checkout', '/shop/cart_total'])
+def test_cart_pages_do_not_scale_with_cart_size(client, catalog, users, login, count_queries, url):
+    products, _ = catalog
+    login('cliente')
+
+    fill_cart(client, products[:1])
+    small = queries_for(client, count_queries, url)
+    fill_cart(client, products[1:15])
+    large = queries_for(client, count_queries, url)
+
+    assert large == small
+
+
+def test_cart_products_load_in_one_query(client, catalog, count_queries):
+    products, _ = catalog
+    fill_cart(client, products[:15])
+
+    with count_queries() as queries:
+        client.get('/shop/cart')
+
+    product_selects = [sql for sql in queries.statements if 'FROM product' in sql]
+    assert len(product_selects) == 1
+    assert ' IN (' in product_selects[0]
+
+
+def test_resolve_cart_prices_lines_and_skips_unavailable(app, catalog):
+    from app import db
+
+    products, _ = catalog
+    products[1].is_available = False
+    db.session.commit()
+
+    cart = {str(products[0].id): 2, str(products[1].id): 1, '999999': 1}
+    resolved = resolve_cart(cart)
+
+    assert [item['product'].id for item in resolved['items']] == [products[0].id]
+    assert resolved['total'] == products[0].price * 2
+    assert set(resolved['unavailable']) == {str(products[1].id), '999999'}
+
+
+@pytest.fixture(params=['database', 'memory'])
+def store(request, app):
+    from services.cart import CART_STORES
+
+    return CART_STORES[request.param]()
+
+
+def test_store_adds_sets_and_removes_lines(store):
+    assert store.add('user:1', 5, 2) == 2
+    assert store.add('user:1', 5, 1) == 3
+    assert store.add('user:1', '7', 4) == 7
+
+    assert store.set('user:1', 5, 1) == 5
+    assert store.lines('user:1') == {'5': 1, '7': 4}
+
+    assert store.remove('user:1', 7) == 1
+    assert store.lines('user:1') == {'5': 1}
+    assert store.count('user:2') == 0
+
+
+def test_store_merges_anonymous_carts(store):
+    store.add('session:abc', 5, 2)
+    store.add('user:1', 5, 1)
+
+    store.merge('session:abc', 'user:1')
+
+    assert store.lines('user:1') == {'5': 3}
+    assert store.count('user:1') == 3
+    assert store.lines('session:abc') == {}
+
+
+def test_set_recounts_the_cart_from_its_lines(app):
+    from app import db
+    from models.cart import Cart
+    from services.cart import DatabaseCartStore
+
+    store = DatabaseCartStore()
+    store.add('user:1', 5, 2)
+    store.add('user:1', 6, 1)
+    db.session.get(Cart, 'user:1').item_count = 99  # drifted
+    db.session.commit()
+
+    assert store.set('user:1', 5, 4) == 5
+    assert store.set('user:1', 5, 4) == 5
+    assert store.set('user:1', 6, 0) == 4
+
+
+def test_database_store_purges_idle_carts(app):
+    from datetime import datetime, timedelta
+
+    from services.cart import DatabaseCartStore
+
+    store = DatabaseCartStore()
+    store.add('session:old', 5, 1)
+
+    assert store.purge(datetime.utcnow() - timedelta(days=1)) == 0
+    assert store.purge(datetime.utcnow() + timedelta(seconds=1)) == 1
+    assert store.lines('session:old') == {}
+
+
+def test_anonymous_cart_follows_the_customer_on_login(client, catalog, users):
+    products, _ = catalog
+    fill_cart(client, products[:2])
+
+    client.post('/auth/login', data={'username': 'cliente', 'password': 'pw'})
+
+    assert client.get('/shop/cart_count').get_json()['count'] == 2
+
+
+def test_anonymous_cart_count_and_total_run_no_queries(client, catalog, count_queries):
+    products, _ = catalog
+    fill_cart(client, products[:3])
+
+    with count_queries() as queries:
+        count = client.get('/shop/cart_count').get_json()
+        total = client.get('/shop/cart_total').get_json()
+
+    assert queries.count == 0
+    assert count['count'] == 3
+    assert total['total'] == pytest.approx(sum(p.price for p in products[:3]))
+
+
+def test_user_cart_summary_costs_one_revision_read(client, catalog, users, login, count_queries):
+    products, _ = catalog
+    login('cliente')
+    fill_cart(client, products[:3])
+
+    with count_queries() as queries:
+        count = client.get('/shop/cart_count').get_json()
+
+    assert queries.count == 1
+    assert 'FROM carts' in queries.statements[0]
+    assert count['count'] == 3
+
+
+def test_user_cart_summary_follows_changes_from_other_devices(app, client, catalog, users, login):
+    products, _ = catalog
+    login('cliente')
+    fill_cart(client, products[:1])
+    assert client.get('/shop/cart_count').get_json()['count'] == 1
+
+    phone = app.test_client()
+    phone.post('/auth/login', data={'username': 'cliente', 'password': 'pw'})
+    fill_cart(phone, products[1:3])
+
+    assert client.get('/shop/cart_count').get_json()['count'] == 3
+    assert client.get('/shop/cart_total').get_json()['total'] == pytest.approx(
+        sum(p.price for p in products[:3]))
+
+
+def test_cart_summary_is_repriced_after_a_catalog_change(client, catalog):
+    from app import db
+    from services.catalog import bump_catalog_version
+
+    products, _ = catalog
+    fill_cart(client, products[:1])
+    products[0].price = 99
+    db.session.commit()
+    bump_catalog_version()
+
+    assert client.get('/shop/cart_total').get_json()['total'] == 99
@@ -0,0 +1,51 @@
+"""Catalog snapshot: warm lookups run no SQL and admin writes invalidate them."""
+from app import db
+from models.portfolio import Portfolio
+from models.product import Product
+from services.catalog import bump_catalog_version, catalog_version, get_catalog
+
+
+def test_warm_lookups_run_no_queries(app, catalog, count_queries):
+    Product.get_featured()
+
+    with count_queries() as queries:
+        Product.get_featured()
+        Product.get_by_category('retratos')
+        Product.get_categories()
+        Product.get_available()
+        Portfolio.get_featured()
+        Portfolio.get_by_category('branding')
+        Portfolio.get_categories()
+
+    assert queries.count == 0
+
+
+def test_bump_reloads_the_snapshot(app, catalog):
+    products, _ = catalog
+    before = catalog_version()
+    snapshot = get_catalog()
+
+    products[0].name = 'Renombrado'
+    db.session.commit()
+    assert get_catalog() is snapshot
+
+    assert bump_catalog_version() == before + 1
+    assert get_catalog() is not snapshot
+    assert get_catalog().products_by_id[products[0].id].name == 'Renombrado'
+
+
+def test_admin_edit_bumps_the_catalog(client, catalog, users, login):
+    products, _ = catalog
+    product = products[0]
+    login('admin')
+    before = catalog_version()
+
+    response = client.post(f'/admin/products/{product.id}/edit', data={
+        'name': 'Logo nuevo', 'price': '12', 'image_url': product.image_url,
+        'category': product.category, 'is_available': 'on', 'digital_product': 'on',
+    })
+
+    assert response.status_code == 302
+    assert catalog_version() == before + 1
+    assert 'Logo nuevo' in [p.name for p in Product.get_available()]
+
@@ -0,0 +1,71 @@
+"""Contact and newsletter forms: mail is queued, echoes nothing and is limited."""
+from models.job import Job
+from models.newsletter import NewsletterSubscriber
+
+FORM = {
+    'name': 'Mallory',
+    'email': 'victim@example.com',
+    'subject': 'Buy now',
+    'message': 'Visit http://spam.example and enter your password',
+}
+
+
+def queued_mail():
+    return [job.arguments for job in Job.query.filter_by(name='mail.send').order_by(Job.id)]
+
+
+def test_inquiry_goes_to_the_studio_and_a_fixed_acknowledgement_to_the_sender(app, client):
+    app.config['CONTACT_EMAIL'] = 'studio@example.com'
+
+    response = client.post('/contact', data=FORM)
+
+    assert response.status_code == 302
+    inquiry, acknowledgement = queued_mail()
+    assert inquiry['to'] == 'studio@example.com'
+    assert inquiry['reply_to'] == FORM['email']
+    assert FORM['message'] in inquiry['body']
+    assert acknowledgement['to'] == FORM['email']
+    for value in FORM.values():
+        if value != FORM['email']:
+            assert value not in acknowledgement['body']
+            assert value not in acknowledgement['subject']
+
+
+def test_submissions_are_rate_limited_per_client(app, client):
+    app.config['CONTACT_RATE_LIMIT'] = (2, 3600)
+
+    assert client.post('/contact', data=FORM).status_code == 302
+    assert client.post('/contact', data=FORM).status_code == 302
+    assert client.post('/contact', data=FORM).status_code == 429
+    assert len(queued_mail()) == 2
+
+    other = app.test_client()
+    response = other.post('/contact', data=FORM, environ_base={'REMOTE_ADDR': '198.51.100.4'})
+    assert response.status_code == 302
+
+
+def test_invalid_submissions_queue_nothing(client):
+    response = client.post('/contact', data={**FORM, 'email': 'not-an-address'})
+
+    assert response.status_code == 200
+    assert queued_mail() == []
+
+
+def test_newsletter_welcomes_each_subscriber_once(client):
+    for email in ('reader@example.com', 'Reader@example.com', 'reader@example.com'):
+        response = client.post('/api/newsletter', json={'email': email})
+        assert response.status_code == 200
+
+    assert NewsletterSubscriber.query.count() == 1
+    assert [mail['to'] for mail in queued_mail()] == ['reader@example.com']
+
+
+def test_newsletter_signups_are_rate_limited_per_client(app, client):
+    app.config['NEWSLETTER_RATE_LIMIT'] = (2, 3600)
+
+    for i in range(2):
+        assert client.post('/api/newsletter', json={'email': f'victim{i}@example.com'}).status_code == 200
+    response = client.post('/api/newsletter', json={'email': 'victim9@example.com'})
+
+    assert response.status_code == 429
+    assert len(queued_mail()) == 2
@@ -0,0 +1,73 @@
+"""Denormalized dashboard counters."""
+from app import db
+from models.metrics import MetricCounter
+from models.order import Order
+from services.counters import dashboard_counters, increment, reconcile
+
+
+def make_order(total=25.0):
+    order = Order(customer_name='Carla', customer_email='c@example.com', total_amount=total)
+    db.session.add(order)
+    db.session.commit()
+    return order
+
+
+def test_fresh_database_is_reconciled_on_first_read(app, catalog, users):
+    counters = dashboard_counters()
+
+    assert counters['users'] == 2
+    assert counters['products'] == 20
+    assert counters['orders'] == 0
+    assert counters['recent_revenue'] == 0
+
+
+def test_paying_twice_counts_revenue_once(app):
+    dashboard_counters()
+    order = make_order()
+
+    assert order.mark_as_paid() is True
+    assert order.mark_as_paid() is False
+    db.session.commit()
+
+    assert dashboard_counters()['recent_revenue'] == 25.0
+    assert dashboard_counters()['paid_orders'] == 1
+
+
+def test_refund_takes_the_order_out_of_revenue(app):
+    dashboard_counters()
+    order = make_order()
+    order.mark_as_paid()
+    db.session.commit()
+
+    assert order.mark_as_refunded() is True
+    assert order.mark_as_refunded() is False
+    db.session.commit()
+
+    assert dashboard_counters()['recent_revenue'] == 0
+    assert dashboard_counters()['paid_orders'] == 0
+
+
+def test_reconcile_corrects_drift(app, catalog):
+    dashboard_counters()
+    increment('products', 7)
+    make_order().mark_as_paid()
+    increment('revenue:1999-01-01', 5)
+    db.session.commit()
+    db.session.query(MetricCounter).filter(MetricCounter.key.like('revenue:%')).delete()
+    db.session.commit()
+
+    reconcile()
+    db.session.commit()
+
+    counters = dashboard_counters()
+    assert counters['products'] == 20
+    assert counters['recent_revenue'] == 25.0
+
+
+def test_dashboard_reads_counters_in_one_query(app, count_queries):
+    dashboard_counters()
+
+    with count_queries() as queries:
+        dashboard_counters()
+
+    assert queries.count == 1
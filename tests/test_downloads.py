@@ -0,0 +1,103 @@
+"""Customer image downloads support ranges, validators and server offload."""
+import pytest
+
+from app import db
+from models.order import Order, OrderItem
+from services.blobs import blob_path, store_bytes
+
+IMAGE = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 4
+
+
+@pytest.fixture(params=['memory', 'local'])
+def item(request, app, users, catalog):
+    app.config['BLOB_STORE'] = request.param
+    key = store_bytes(IMAGE, 'image/png')
+    order = Order(customer_name='Carla', customer_email='carla@example.com', total_amount=10,
+                  status='pending', payment_status='paid', user_id=users[1].id)
+    db.session.add(order)
+    db.session.flush()
+    item = OrderItem(order_id=order.id, product_id=catalog[0][1].id, product_name='Retrato',
+                     product_price=10, quantity=1, customer_image=key)
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+@pytest.fixture
+def download(app, client, login, item):
+    login('admin')
+    url = f'/shop/download-customer-image/{item.id}'
+    return lambda **headers: client.get(url, headers=headers)
+
+
+def test_full_download(download, item):
+    response = download()
+
+    assert response.status_code == 200
+    assert response.data == IMAGE
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'] == f'"{item.customer_image}"'
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert response.cache_control.private and not response.cache_control.public
+
+
+def test_range_returns_partial_content(download):
+    response = download(Range='bytes=8-15')
+
+    assert response.status_code == 206
+    assert response.data == IMAGE[8:16]
+    assert response.headers['Content-Range'] == f'bytes 8-15/{len(IMAGE)}'
+
+
+def test_unsatisfiable_range(download):
+    response = download(Range=f'bytes={len(IMAGE) + 10}-')
+
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(IMAGE)}'
+
+
+def test_matching_etag_is_not_modified(download, item):
+    response = download(**{'If-None-Match': f'"{item.customer_image}"'})
+
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_if_modified_since_is_not_modified(download):
+    last_modified = download().headers['Last-Modified']
+
+    assert download(**{'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_stale_etag_downloads_again(download):
+    response = download(**{'If-None-Match': '"something-else"'})
+
+    assert response.status_code == 200
+    assert response.data == IMAGE
+
+
+def test_offload_sends_headers_only(app, download, item):
+    app.config['BLOB_DOWNLOAD_OFFLOAD'] = 'x-accel-redirect'
+
+    response = download()
+
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == '/_blobs/' + blob_path(item.customer_image)
+    assert response.headers['ETag'] == f'"{item.customer_image}"'
+
+
+def test_other_customers_cannot_download(app, item):
+    from models.user import User
+
+    stranger = User(username='otro', email='otro@example.com', first_name='Otro', last_name='Cliente')
+    stranger.set_password('pw')
+    db.session.add(stranger)
+    db.session.commit()
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'otro', 'password': 'pw'})
+
+    response = client.get(f'/shop/download-customer-image/{item.id}')
+
+    assert response.status_code == 302
+    assert response.data != IMAGE
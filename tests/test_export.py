@@ -0,0 +1,59 @@
+"""Streaming NDJSON/CSV exports."""
+import csv
+import io
+import json
+from datetime import datetime
+
+from app import db
+
+
+def test_products_ndjson_streams_one_row_per_line(client, catalog):
+    response = client.get('/api/export/products.ndjson')
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['id'] for row in rows] == sorted(row['id'] for row in rows)
+    assert len(rows) == 20
+
+
+def test_portfolio_csv_has_a_header_row(client, catalog):
+    response = client.get('/api/export/portfolio.csv')
+
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert response.headers['Content-Disposition'] == 'attachment; filename=portfolio.csv'
+    assert len(rows) == 20
+    assert rows[0]['title'] == 'Obra 0'
+
+
+def test_updated_since_filters_rows(client, catalog):
+    products, _ = catalog
+    for product in products:
+        product.updated_at = datetime(2026, 1, 1)
+    products[3].updated_at = datetime(2026, 6, 1)
+    db.session.commit()
+
+    response = client.get('/api/export/products.ndjson?updated_since=2026-03-01T00:00:00')
+
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['id'] for row in rows] == [products[3].id]
+
+
+def test_bad_updated_since_is_rejected(client):
+    assert client.get('/api/export/products.ndjson?updated_since=yesterday').status_code == 400
+
+
+def test_order_exports_require_an_admin(app, users):
+    anonymous = app.test_client()
+    assert anonymous.get('/api/export/orders.ndjson').status_code == 403
+
+    for username, status in (('cliente', 403), ('admin', 200)):
+        client = app.test_client()
+        client.post('/auth/login', data={'username': username, 'password': 'pw'})
+        assert client.get('/api/export/orders.ndjson').status_code == status
+
+
+def test_unknown_export_is_not_found(client):
+    assert client.get('/api/export/users.ndjson').status_code == 404
+    assert client.get('/api/export/products.xml').status_code == 404
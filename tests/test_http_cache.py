@@ -0,0 +1,94 @@
+"""ETag revalidation of the catalog and stats API."""
+from app import db
+from models.order import Order
+from services.catalog import catalog_version, get_catalog
+from services.stock import release_stock, reserve_stock
+
+
+def revalidate(client, url):
+    etag = client.get(url).headers['ETag']
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+def test_unchanged_catalog_answers_304(client, catalog, count_queries):
+    etag = client.get('/api/products').headers['ETag']
+
+    with count_queries() as queries:
+        response = client.get('/api/products', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert queries.count == 0
+
+
+def test_etag_depends_on_the_query_string(client, catalog):
+    first = client.get('/api/products?limit=5').headers['ETag']
+    second = client.get('/api/products?limit=6').headers['ETag']
+
+    assert first != second
+
+
+def test_stock_changes_invalidate_the_etag(client, catalog):
+    products, _ = catalog
+    product = products[0]
+    product.digital_product = False
+    product.stock_quantity = 3
+    order = Order(customer_name='Carla', customer_email='c@example.com', total_amount=10)
+    db.session.add(order)
+    db.session.commit()
+
+    etag = client.get('/api/products').headers['ETag']
+    reserve_stock(order, [{'product': product, 'quantity': 2}])
+    db.session.commit()
+    assert client.get('/api/products', headers={'If-None-Match': etag}).status_code == 200
+
+    etag = client.get('/api/products').headers['ETag']
+    release_stock(order.id)
+    db.session.commit()
+    assert client.get('/api/products', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_stock_changes_leave_the_catalog_alone(client, catalog):
+    products, _ = catalog
+    product = products[0]
+    product.digital_product = False
+    product.stock_quantity = 3
+    order = Order(customer_name='Carla', customer_email='c@example.com', total_amount=10)
+    db.session.add(order)
+    db.session.commit()
+    version, snapshot = catalog_version(), get_catalog()
+
+    reserve_stock(order, [{'product': product, 'quantity': 2}])
+    db.session.commit()
+    release_stock(order.id)
+    db.session.commit()
+
+    assert catalog_version() == version
+    assert get_catalog() is snapshot
+
+
+def test_stats_revalidation_reads_only_the_counter(client, catalog, count_queries):
+    client.get('/api/stats')
+    etag = client.get('/api/stats').headers['ETag']
+
+    with count_queries() as queries:
+        response = client.get('/api/stats', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert queries.count == 1
+    assert 'metric_counters' in queries.statements[0]
+    assert 'FROM orders' not in queries.statements[0]
+
+
+def test_paying_an_order_changes_the_stats_etag(client, catalog):
+    order = Order(customer_name='Carla', customer_email='c@example.com', total_amount=10)
+    db.session.add(order)
+    db.session.commit()
+    etag = client.get('/api/stats').headers['ETag']
+
+    order.mark_as_paid()
+    db.session.commit()
+
+    response = client.get('/api/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['orders']['total_orders'] == 1
@@ -0,0 +1,90 @@
+"""Catalog images get srcsets from a resizing host or generated derivatives."""
+import os
+
+import pytest
+
+from models.job import Job
+from services.catalog import catalog_version
+from services.images import (derivative_key, derive_image, image_sources, local_image_path,
+                             queue_derivatives, render_derivatives, supported_formats)
+
+pytestmark = pytest.mark.skipif(not supported_formats(['webp']), reason='Pillow cannot encode WebP')
+
+
+@pytest.fixture
+def static(app, tmp_path):
+    app.static_folder = str(tmp_path / 'static')
+    os.makedirs(os.path.join(app.static_folder, 'img'))
+    app.config['IMAGE_FORMATS'] = ('webp',)
+    return app.static_folder
+
+
+def save_image(static, name='img/print.png', size=(800, 400)):
+    from PIL import Image
+
+    Image.new('RGB', size, 'teal').save(os.path.join(static, name))
+    return f'/static/{name}'
+
+
+def test_resizing_host_gets_width_variants(app):
+    sources = image_sources('https://images.unsplash.com/photo-1?w=400')
+
+    assert sources['srcset'].count('w=') == len(app.config['IMAGE_WIDTHS'])
+    assert 'w=320&auto=format 320w' in sources['srcset']
+    assert sources['sources'] == []
+
+
+def test_local_image_without_derivatives_is_left_alone(static):
+    url = save_image(static)
+
+    assert image_sources(url) == {'src': url, 'srcset': None, 'sources': []}
+
+
+@pytest.mark.parametrize('url', ['/static/../config.py', 'https://example.com/a.png', '//cdn/a.png', ''])
+def test_only_files_under_static_are_local(static, url):
+    assert local_image_path(url) is None
+
+
+def test_derivatives_skip_widths_beyond_the_original(app, static):
+    source = local_image_path(save_image(static))
+    target = os.path.join(static, 'derivatives', derivative_key(source))
+    os.makedirs(os.path.dirname(target))
+
+    _, manifest = render_derivatives(source, target, (320, 640, 960), ('webp',), 80)
+
+    assert manifest == {'webp': [320, 640]}
+    assert sorted(os.listdir(target)) == ['320.webp', '640.webp', 'manifest.json']
+
+
+def test_derive_job_publishes_sources_and_bumps_the_catalog(static):
+    url = save_image(static)
+    before = catalog_version()
+
+    derive_image(url)
+
+    sources = image_sources(url)['sources']
+    assert sources[0]['type'] == 'image/webp'
+    assert '/640.webp 640w' in sources[0]['srcset']
+    assert catalog_version() == before + 1
+
+
+def test_changed_source_gets_a_new_derivative_set(static):
+    url = save_image(static)
+    first = derivative_key(local_image_path(url))
+
+    save_image(static, size=(1000, 500))
+
+    assert derivative_key(local_image_path(url)) != first
+
+
+def test_replaced_image_is_queued_again_under_a_bounded_key(static):
+    url = save_image(static, name='img/' + 'a' * 150 + '.png')
+
+    queue_derivatives(url)
+    queue_derivatives(url)
+    save_image(static, name='img/' + 'a' * 150 + '.png', size=(1000, 500))
+    queue_derivatives(url)
+
+    keys = [job.unique_key for job in Job.query.filter_by(name='images.derive')]
+    assert len(keys) == 2
+    assert all(len(key) <= Job.unique_key.type.length for key in keys)
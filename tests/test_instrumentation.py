@@ -0,0 +1,59 @@
+"""Opt-in per-request SQL instrumentation."""
+import logging
+
+import pytest
+
+from app import create_app, db
+from config import TestingConfig
+
+
+@pytest.fixture
+def instrumented_app(tmp_path):
+    class Config(TestingConfig):
+        SQL_INSTRUMENTATION = True
+        SLOW_QUERY_THRESHOLD_MS = 0
+        CATALOG_GENERATION_FILE = str(tmp_path / 'catalog.generation')
+        STOCK_GENERATION_FILE = str(tmp_path / 'stock.generation')
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_disabled_by_default(client):
+    response = client.get('/api/products')
+
+    assert 'Server-Timing' not in response.headers
+
+
+def test_responses_carry_server_timing(instrumented_app):
+    response = instrumented_app.test_client().get('/api/products')
+
+    timings = response.headers.getlist('Server-Timing')
+    assert timings[0].startswith('db;dur=')
+    assert 'queries"' in timings[0]
+    assert timings[1].startswith('app;dur=')
+
+
+def test_stats_are_grouped_by_blueprint(instrumented_app):
+    from services.instrumentation import query_stats
+
+    client = instrumented_app.test_client()
+    client.get('/api/products')
+    client.get('/api/products')
+
+    stats = query_stats()['api']['endpoints']['api.products_api']
+    assert stats['requests'] == 2
+    assert stats['queries'] >= 2
+    assert stats['slowest']
+
+
+def test_slow_queries_are_logged(instrumented_app, caplog):
+    with caplog.at_level(logging.WARNING):
+        instrumented_app.test_client().get('/api/products')
+
+    assert any('Slow query' in record.message and 'api.products_api' in record.message
+               for record in caplog.records)
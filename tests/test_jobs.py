@@ -0,0 +1,101 @@
+"""Database-backed job queue: retries with backoff, dead-lettering, idempotent enqueue."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from models.job import Job
+from services.jobs import claim, enqueue, job, requeue_stale, run
+
+calls = []
+
+
+@job('test.record')
+def record(value):
+    calls.append(value)
+
+
+@job('test.fail', max_attempts=2)
+def fail():
+    db.session.add(Job(name='leftover', payload='{}', run_at=datetime.utcnow()))
+    raise RuntimeError('boom')
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+def run_next(worker='worker-1'):
+    claimed = claim(worker)
+    assert claimed is not None
+    return run(claimed, worker)
+
+
+def make_due(job_id):
+    db.session.get(Job, job_id).run_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_jobs_run_once_committed(app):
+    enqueue('test.record', value=42)
+    db.session.commit()
+
+    assert run_next() == 'ok'
+    assert calls == [42]
+    assert Job.query.one().status == 'done'
+    assert claim('worker-1') is None
+
+
+def test_failed_jobs_retry_with_backoff_then_die(app):
+    enqueue('test.fail')
+    db.session.commit()
+
+    assert run_next() == 'retry'
+    failed = Job.query.filter_by(name='test.fail').one()
+    assert failed.status == 'queued'
+    assert failed.attempts == 1
+    assert failed.run_at > datetime.utcnow()
+    assert 'RuntimeError: boom' in failed.last_error
+    assert Job.query.filter_by(name='leftover').count() == 0
+    assert claim('worker-1') is None
+
+    make_due(failed.id)
+    assert run_next() == 'dead'
+    db.session.refresh(failed)
+    assert failed.status == 'dead'
+    assert failed.attempts == 2
+    assert claim('worker-1') is None
+
+
+def test_unknown_handlers_are_dead_lettered(app):
+    db.session.add(Job(name='test.missing', payload='{}', max_attempts=1, run_at=datetime.utcnow()))
+    db.session.commit()
+
+    assert run_next() == 'dead'
+    assert 'No job handler' in Job.query.one().last_error
+
+
+def test_unique_key_enqueues_once(app):
+    assert enqueue('test.record', unique_key='once', value=1) is True
+    assert enqueue('test.record', unique_key='once', value=2) is False
+    db.session.commit()
+
+    assert Job.query.count() == 1
+
+
+def test_stale_running_jobs_are_requeued(app):
+    enqueue('test.record', value=7)
+    db.session.commit()
+    claimed = claim('crashed-worker')
+    claimed.locked_at = datetime.utcnow() - timedelta(hours=1)
+    db.session.commit()
+
+    assert requeue_stale(timeout=600) == 1
+    assert run_next('worker-2') == 'ok'
+    assert calls == [7]
+
+
+def test_enqueueing_an_unregistered_job_fails(app):
+    with pytest.raises(LookupError):
+        enqueue('test.nope')
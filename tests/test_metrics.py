@@ -0,0 +1,63 @@
+"""Prometheus metrics at /metrics."""
+import pytest
+
+from app import create_app, db
+from config import TestingConfig
+
+TOKEN = 'scrape-secret'
+
+
+@pytest.fixture
+def app(tmp_path):
+    class Config(TestingConfig):
+        METRICS_ENABLED = True
+        METRICS_TOKEN = TOKEN
+        CATALOG_GENERATION_FILE = str(tmp_path / 'catalog.generation')
+        STOCK_GENERATION_FILE = str(tmp_path / 'stock.generation')
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def scrape(client):
+    return client.get('/metrics', headers={'Authorization': f'Bearer {TOKEN}'}).get_data(as_text=True)
+
+
+def test_metrics_expose_request_latency_by_route(client, catalog):
+    client.get('/api/products')
+
+    body = scrape(client)
+
+    assert 'http_request_duration_seconds_bucket{blueprint="api",endpoint="api.products_api"' in body
+    assert 'http_requests_total{blueprint="api",endpoint="api.products_api",method="GET",status="200"}' in body
+    assert 'db_pool_checkout_wait_seconds' in body
+
+
+def test_cache_lookups_are_counted(client, catalog):
+    client.get('/shop/')
+    client.get('/shop/')
+
+    body = scrape(client)
+
+    assert 'cache_requests_total{cache="page",result="hit"}' in body
+    assert 'cache_requests_total{cache="page",result="miss"}' in body
+
+
+def test_metrics_are_off_by_default():
+    assert TestingConfig.METRICS_ENABLED is False
+
+
+@pytest.mark.parametrize('headers', [{}, {'Authorization': 'Bearer wrong'}, {'Authorization': TOKEN}])
+def test_scrapes_need_the_token(client, headers):
+    assert client.get('/metrics', headers=headers).status_code == 403
+
+
+def test_allowlisted_addresses_may_scrape(app, client):
+    app.config['METRICS_ALLOWED_IPS'] = ('10.0.0.5',)
+
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.5'}).status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.6'}).status_code == 403
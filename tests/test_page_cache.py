@@ -0,0 +1,67 @@
+"""Rendered page cache for anonymous visitors."""
+import os
+
+from services.cache import FileSystemBackend
+from services.catalog import bump_catalog_version
+from services.page_cache import get_page_cache
+
+
+def test_second_anonymous_view_is_a_hit(client, catalog, count_queries):
+    assert client.get('/shop/').headers['X-Page-Cache'] == 'miss'
+
+    with count_queries() as queries:
+        response = client.get('/shop/')
+
+    assert response.headers['X-Page-Cache'] == 'hit'
+    assert queries.count == 0
+
+
+def test_catalog_bump_invalidates_pages(client, catalog):
+    client.get('/portfolio/')
+    bump_catalog_version()
+
+    assert client.get('/portfolio/').headers['X-Page-Cache'] == 'miss'
+
+
+def test_known_categories_are_cached_separately(client, catalog):
+    client.get('/shop/?category=logos')
+
+    assert client.get('/shop/?category=logos').headers['X-Page-Cache'] == 'hit'
+    assert client.get('/shop/?category=retratos').headers['X-Page-Cache'] == 'miss'
+
+
+def test_unknown_categories_are_not_cached(client, catalog):
+    for attempt in range(3):
+        response = client.get(f'/shop/?category=junk{attempt}')
+        assert response.status_code == 200
+        assert 'X-Page-Cache' not in response.headers
+
+    assert len(get_page_cache()._cache) == 0
+
+
+def test_logged_in_users_bypass_the_cache(client, catalog, users, login):
+    login('cliente')
+
+    assert 'X-Page-Cache' not in client.get('/shop/').headers
+
+
+def test_filesystem_backend_prunes_expired_entries(tmp_path):
+    cache = FileSystemBackend(str(tmp_path), prune_interval=0)
+
+    cache.set('page:1|old', b'x', timeout=-5)
+    cache.set('page:2|new', b'y', timeout=60)
+
+    assert os.listdir(tmp_path) == [os.path.basename(cache._path('page:2|new'))]
+    assert cache.get('page:2|new') == b'y'
+
+
+def test_filesystem_backend_keeps_at_most_maxsize_entries(tmp_path):
+    cache = FileSystemBackend(str(tmp_path), maxsize=3, prune_interval=0)
+    for index in range(10):
+        cache.set(f'page:{index}', b'html', timeout=60)
+        os.utime(cache._path(f'page:{index}'), (index, index))
+
+    assert cache.prune() == 0
+    assert len(os.listdir(tmp_path)) == 3
+    assert cache.get('page:9') == b'html'
+    assert cache.get('page:0') is None
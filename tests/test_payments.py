@@ -0,0 +1,93 @@
+"""Checkout creates one payment intent per cart through the gateway."""
+import pytest
+
+from app import db
+from models.order import Order
+from services.payments import get_payment_gateway
+
+CUSTOMER = {'name': 'Carla Cliente', 'email': 'carla@example.com'}
+
+
+@pytest.fixture
+def cart(client, catalog):
+    products, _ = catalog
+    for product in products[:2]:
+        client.post('/shop/add_to_cart', json={'product_id': product.id, 'quantity': 1})
+    return products[:2]
+
+
+def checkout(client, **data):
+    return client.post('/shop/create-payment-intent', json={**CUSTOMER, **data})
+
+
+def test_checkout_creates_a_pending_order_and_intent(client, cart):
+    response = checkout(client)
+
+    assert response.status_code == 200
+    data = response.get_json()
+    order = db.session.get(Order, data['order_id'])
+    assert order.payment_status == 'pending'
+    assert order.stripe_payment_intent_id == data['client_secret'].rsplit('_secret', 1)[0]
+    assert get_payment_gateway().calls[0]['amount'] == int(round(sum(p.price for p in cart) * 100))
+
+
+def test_resubmitting_reuses_the_order_and_idempotency_key(client, cart):
+    first = checkout(client).get_json()
+    second = checkout(client).get_json()
+
+    calls = get_payment_gateway().calls
+    assert first['order_id'] == second['order_id']
+    assert first['client_secret'] == second['client_secret']
+    assert calls[0]['idempotency_key'] == calls[1]['idempotency_key']
+    assert Order.query.count() == 1
+
+
+def test_changed_cart_gets_a_new_key(client, cart, catalog):
+    products, _ = catalog
+    checkout(client)
+    client.post('/shop/add_to_cart', json={'product_id': products[5].id, 'quantity': 1})
+    checkout(client)
+
+    calls = get_payment_gateway().calls
+    assert calls[0]['idempotency_key'] != calls[1]['idempotency_key']
+
+
+def test_gateway_errors_keep_the_order_for_a_retry(client, cart):
+    gateway = get_payment_gateway()
+    gateway.fail_with = 'connection reset'
+
+    response = checkout(client)
+
+    assert response.status_code == 500
+    order = Order.query.one()
+    assert order.payment_status == 'pending'
+
+    gateway.fail_with = None
+    assert checkout(client).get_json()['order_id'] == order.id
+    assert gateway.calls[0]['idempotency_key'] == gateway.calls[1]['idempotency_key']
+
+
+def test_empty_cart_is_rejected(client):
+    assert checkout(client).status_code == 400
+
+
+def test_success_page_alone_does_not_mark_the_order_paid(client, cart):
+    order_id = checkout(client).get_json()['order_id']
+
+    response = client.get(f'/shop/payment-success?order_id={order_id}')
+
+    assert response.status_code == 200
+    assert 'Estamos confirmando tu pago' in response.get_data(as_text=True)
+    assert db.session.get(Order, order_id).payment_status == 'pending'
+
+
+def test_success_page_marks_a_succeeded_intent_paid(client, cart):
+    order_id = checkout(client).get_json()['order_id']
+    order = db.session.get(Order, order_id)
+    get_payment_gateway().succeed(order.stripe_payment_intent_id)
+
+    client.get(f'/shop/payment-success?order_id={order_id}')
+
+    db.session.refresh(order)
+    assert order.payment_status == 'paid'
+    assert client.get('/shop/cart_count').get_json()['count'] == 0
@@ -0,0 +1,60 @@
+"""Query budgets: order pages must not issue more SQL as order histories grow."""
+import pytest
+
+from app import db
+from models.order import Order, OrderItem
+
+
+def place_orders(user, products, count, items_per_order=3):
+    for index in range(count):
+        order = Order(user_id=user.id, customer_name=user.username, customer_email=user.email,
+                      total_amount=0)
+        for product in products[index:index + items_per_order]:
+            order.items.append(OrderItem(product_id=product.id, product_name=product.name,
+                                         product_price=product.price, quantity=1))
+            order.total_amount += product.price
+        db.session.add(order)
+    db.session.commit()
+
+
+def queries_for(client, count_queries, url):
+    with count_queries() as queries:
+        response = client.get(url)
+    assert response.status_code == 200, url
+    return queries.count
+
+
+# Upper bounds per page; each also has to hold with a long order history
+BUDGETS = {
+    'admin_order_detail': 6,
+    'admin_user_detail': 6,
+    'auth_my_orders': 6,
+    'shop_my_orders': 4,
+}
+
+
+def order_page_urls(admin, customer):
+    first_order = Order.query.filter_by(user_id=customer.id).order_by(Order.id).first()
+    return {
+        'admin_order_detail': (admin, f'/admin/orders/{first_order.id}'),
+        'admin_user_detail': (admin, f'/admin/users/{customer.id}'),
+        'auth_my_orders': (customer, '/auth/orders'),
+        'shop_my_orders': (None, f'/shop/my-orders?email={customer.email}'),
+    }
+
+
+@pytest.mark.parametrize('page', sorted(BUDGETS))
+def test_order_pages_stay_within_query_budget(app, catalog, users, count_queries, page):
+    products, _ = catalog
+    admin, customer = users
+    counts = []
+    for orders in (1, 10):
+        place_orders(customer, products, orders)
+        user, url = order_page_urls(admin, customer)[page]
+        client = app.test_client()
+        if user is not None:
+            assert client.post('/auth/login', data={'username': user.username, 'password': 'pw'}).status_code == 302
+        counts.append(queries_for(client, count_queries, url))
+
+    assert counts[1] <= BUDGETS[page], f'{page} ran {counts[1]} queries'
+    assert counts[1] == counts[0], f'{page} grew from {counts[0]} to {counts[1]} queries'
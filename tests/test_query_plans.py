@@ -0,0 +1,113 @@
+"""Hot queries must be served by their index, never by a full table scan."""
+import re
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from models.order import Order
+from models.portfolio import Portfolio
+
+
+@contextmanager
+def captured_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def explain(statement, parameters=()):
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+
+def explain_query(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    return explain(str(compiled), tuple(compiled.params[name] for name in compiled.positiontup))
+
+
+def plan_for(statements, table):
+    """Plan of the first captured SELECT reading ``table``."""
+    pattern = re.compile(rf'\bFROM {table}\b')
+    for statement, parameters in statements:
+        if statement.startswith('SELECT') and pattern.search(statement):
+            return explain(statement, parameters)
+    raise AssertionError(f'no query on {table}')
+
+
+def assert_uses_index(plan, table, index):
+    assert any(f'{table} USING INDEX {index}' in step or f'{table} USING COVERING INDEX {index}' in step
+               for step in plan), plan
+    assert not any(step.startswith(f'SCAN {table}') for step in plan), plan
+
+
+@pytest.fixture
+def orders(app, catalog, users):
+    _, customer = users
+    for index in range(3):
+        db.session.add(Order(user_id=customer.id, customer_name='Carla', customer_email=customer.email,
+                             total_amount=10, payment_status='paid' if index else 'pending'))
+    db.session.commit()
+
+
+def test_orders_by_customer_email(client, orders):
+    with captured_statements() as statements:
+        client.get('/shop/my-orders?email=cliente@example.com')
+
+    assert_uses_index(plan_for(statements, 'orders'), 'orders', 'ix_orders_customer_email_created_at')
+    assert_uses_index(plan_for(statements, 'order_items'), 'order_items', 'ix_order_items_order_id')
+
+
+def test_orders_by_user_id(client, orders, login):
+    login('cliente')
+
+    with captured_statements() as statements:
+        client.get('/auth/orders')
+
+    assert_uses_index(plan_for(statements, 'orders'), 'orders', 'ix_orders_user_id_created_at')
+
+
+def test_orders_by_payment_status(orders):
+    query = Order.query.filter_by(payment_status='paid').order_by(Order.created_at.desc())
+
+    assert_uses_index(explain_query(query), 'orders', 'ix_orders_payment_status_created_at')
+
+
+def test_products_by_category_and_availability(client, catalog):
+    with captured_statements() as statements:
+        client.get('/api/products?category=logos')
+
+    assert_uses_index(plan_for(statements, 'product'), 'product', 'ix_product_category_is_available')
+
+
+@pytest.mark.parametrize('url, table, index', [
+    ('/api/products', 'product', 'ix_product_created_at_id'),
+    ('/api/portfolio', 'portfolio', 'ix_portfolio_created_at_id'),
+])
+def test_keyset_pages(client, catalog, url, table, index):
+    cursor = client.get(f'{url}?limit=5').get_json()['next_cursor']
+
+    with captured_statements() as statements:
+        client.get(f'{url}?limit=5&cursor={cursor}')
+
+    assert_uses_index(plan_for(statements, table), table, index)
+
+
+def test_portfolio_by_featured(catalog):
+    query = Portfolio.query.filter_by(featured=True)
+
+    assert_uses_index(explain_query(query), 'portfolio', 'ix_portfolio_featured')
+
+
+def test_portfolio_by_category(catalog):
+    query = Portfolio.query.filter_by(category='branding')
+
+    assert_uses_index(explain_query(query), 'portfolio', 'ix_portfolio_category')
@@ -0,0 +1,33 @@
+"""Fixed-window rate limit counters shared by every worker."""
+from datetime import datetime, timedelta
+
+from app import db
+from models.rate_limit import RateLimit
+from services.rate_limit import hit, purge_expired
+
+
+def test_hits_beyond_the_limit_are_refused(app):
+    assert [hit('contact', '203.0.113.7', 2, 60) for _ in range(3)] == [True, True, False]
+    assert hit('contact', '203.0.113.8', 2, 60) is True
+    assert hit('checkout', '203.0.113.7', 2, 60) is True
+
+
+def test_window_restarts_after_it_expires(app):
+    for _ in range(3):
+        hit('contact', '203.0.113.7', 2, 60)
+    db.session.get(RateLimit, 'contact:203.0.113.7').expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    assert hit('contact', '203.0.113.7', 2, 60) is True
+    assert db.session.get(RateLimit, 'contact:203.0.113.7').count == 1
+
+
+def test_purge_deletes_expired_counters(app):
+    hit('contact', 'old', 2, 60)
+    hit('contact', 'new', 2, 60)
+    db.session.get(RateLimit, 'contact:old').expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    purge_expired()
+
+    assert [row.key for row in RateLimit.query.all()] == ['contact:new']
@@ -0,0 +1,63 @@
+def test_search_renders_ranked_matches(client, catalog):
+    response = client.get('/search?q=retr')
+
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert '10 resultados' in body
+    assert 'Retrato 1' in body
+    assert 'Logo 2' not in body
+
+
+def test_search_paginates(app, client, catalog):
+    app.config['POSTS_PER_PAGE'] = 4
+
+    first = client.get('/search?q=retr').get_data(as_text=True)
+    last = client.get('/search?q=retr&page=3').get_data(as_text=True)
+
+    assert first.count('class="search-result"') == 4
+    assert '/search?q=retr&amp;page=2' in first
+    assert last.count('class="search-result"') == 2
+    assert '<span class="current">3</span>' in last
+    assert 'Siguiente' not in last
+
+
+def test_search_without_query_redirects(client):
+    response = client.get('/search?q=')
+
+    assert response.status_code == 302
+
+
+def test_suggest_matches_title_prefixes(client, catalog):
+    response = client.get('/api/search/suggest?q=obra 1')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    titles = [s['title'] for s in data['suggestions']]
+    assert titles[0] == 'Obra 1'
+    assert all(title.startswith('Obra 1') for title in titles)
+    assert data['suggestions'][0]['url'].startswith('/portfolio/')
+
+
+def test_suggest_caps_the_limit(client, catalog):
+    data = client.get('/api/search/suggest?q=retr&limit=100').get_json()
+
+    assert len(data['suggestions']) == 8
+    assert {s['type'] for s in data['suggestions']} == {'product'}
+
+
+def test_suggest_caches_per_catalog_version(client, catalog, count_queries):
+    from services.catalog import bump_catalog_version
+
+    client.get('/api/search/suggest?q=logo')
+    with count_queries() as queries:
+        client.get('/api/search/suggest?q=logo')
+    assert queries.count == 0
+
+    bump_catalog_version()
+    with count_queries() as queries:
+        client.get('/api/search/suggest?q=logo')
+    assert queries.count > 0
+
+
+def test_suggest_without_query_is_empty(client):
+    assert client.get('/api/search/suggest?q=').get_json()['suggestions'] == []
@@ -0,0 +1,212 @@
+"""Checkout holds physical stock until the order is paid, cancelled or expires."""
+import re
+import threading
+
+import pytest
+
+from app import create_app, db
+from config import TestingConfig
+from models.order import Order
+from models.product import Product
+from models.stock import StockReservation
+from services.stock import held_quantity, release_expired
+
+CUSTOMER = {'name': 'Carla Cliente', 'email': 'carla@example.com'}
+
+
+@pytest.fixture
+def print_product(app):
+    product = Product(name='Limited print', price=40, image_url='x', category='print',
+                      digital_product=False, stock_quantity=3)
+    db.session.add(product)
+    db.session.commit()
+    return product
+
+
+@pytest.fixture
+def admin(app, users):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'admin', 'password': 'pw'})
+    return client
+
+
+def checkout(client, product, quantity=1):
+    client.post('/shop/update_cart', json={'product_id': product.id, 'quantity': quantity})
+    return client.post('/shop/create-payment-intent', json=CUSTOMER)
+
+
+def stock_of(product):
+    return db.session.get(Product, product.id).stock_quantity
+
+
+def test_checkout_holds_stock(client, print_product):
+    client.post('/shop/add_to_cart', json={'product_id': print_product.id, 'quantity': 2})
+    response = client.post('/shop/create-payment-intent', json=CUSTOMER)
+
+    assert response.status_code == 200
+    assert stock_of(print_product) == 1
+    assert held_quantity(print_product.id) == 2
+
+
+def test_checkout_beyond_stock_is_refused(client, print_product):
+    client.post('/shop/add_to_cart', json={'product_id': print_product.id, 'quantity': 3})
+    other = client.application.test_client()
+    other.post('/shop/add_to_cart', json={'product_id': print_product.id, 'quantity': 1})
+    assert client.post('/shop/create-payment-intent', json=CUSTOMER).status_code == 200
+
+    response = other.post('/shop/create-payment-intent', json=CUSTOMER)
+
+    assert response.status_code == 400
+    assert stock_of(print_product) == 0
+    assert Order.query.count() == 1
+
+
+def test_payment_commits_the_hold(client, print_product):
+    client.post('/shop/add_to_cart', json={'product_id': print_product.id, 'quantity': 1})
+    order = db.session.get(Order, client.post('/shop/create-payment-intent', json=CUSTOMER).get_json()['order_id'])
+
+    order.mark_as_paid()
+    db.session.commit()
+
+    assert StockReservation.query.one().status == 'committed'
+    assert release_expired() == 0
+    assert stock_of(print_product) == 2
+
+
+def test_expired_holds_return_to_stock(app, client, print_product):
+    app.config['STOCK_RESERVATION_TTL'] = -1
+    client.post('/shop/add_to_cart', json={'product_id': print_product.id, 'quantity': 2})
+    order_id = client.post('/shop/create-payment-intent', json=CUSTOMER).get_json()['order_id']
+
+    assert release_expired() == 1
+    db.session.commit()
+
+    assert stock_of(print_product) == 3
+    assert db.session.get(Order, order_id).status == 'cancelled'
+
+
+def test_changed_cart_releases_the_superseded_hold(client, print_product):
+    client.post('/shop/add_to_cart', json={'product_id': print_product.id, 'quantity': 3})
+    first = client.post('/shop/create-payment-intent', json=CUSTOMER).get_json()['order_id']
+
+    client.post('/shop/update_cart', json={'product_id': print_product.id, 'quantity': 2})
+    response = client.post('/shop/create-payment-intent', json=CUSTOMER)
+
+    assert response.status_code == 200
+    assert db.session.get(Order, first).status == 'cancelled'
+    assert stock_of(print_product) == 1
+    assert held_quantity(print_product.id) == 2
+
+
+def test_holds_are_rate_limited_per_client(app, client, print_product):
+    app.config['STOCK_HOLD_RATE_LIMIT'] = (2, 3600)
+    client.post('/shop/add_to_cart', json={'product_id': print_product.id, 'quantity': 1})
+    for quantity in (1, 2):
+        assert checkout(client, print_product, quantity).status_code == 200
+
+    response = checkout(client, print_product, 3)
+
+    assert response.status_code == 429
+    assert Order.query.count() == 2
+    assert held_quantity(print_product.id) == 2
+
+
+def test_cancelling_an_order_releases_its_hold(admin, client, print_product):
+    client.post('/shop/add_to_cart', json={'product_id': print_product.id, 'quantity': 2})
+    order_id = client.post('/shop/create-payment-intent', json=CUSTOMER).get_json()['order_id']
+
+    admin.post(f'/admin/orders/{order_id}/update-status', data={'status': 'cancelled'})
+
+    assert stock_of(print_product) == 3
+    assert held_quantity(print_product.id) == 0
+
+
+def test_admin_stock_edit_counts_held_units(admin, client, print_product):
+    client.post('/shop/add_to_cart', json={'product_id': print_product.id, 'quantity': 2})
+    order_id = client.post('/shop/create-payment-intent', json=CUSTOMER).get_json()['order_id']
+
+    admin.post(f'/admin/products/{print_product.id}/edit', data={
+        'name': print_product.name, 'price': '40', 'image_url': 'x', 'category': 'print',
+        'stock_quantity': '5'
+    })
+    assert stock_of(print_product) == 3
+
+    # Once the hold is released stock is back to what the admin entered, not 7
+    admin.post(f'/admin/orders/{order_id}/update-status', data={'status': 'cancelled'})
+    assert stock_of(print_product) == 5
+
+
+def test_admin_edit_form_shows_held_units_on_hand(admin, client, print_product):
+    client.post('/shop/add_to_cart', json={'product_id': print_product.id, 'quantity': 2})
+    client.post('/shop/create-payment-intent', json=CUSTOMER)
+
+    response = admin.get(f'/admin/products/{print_product.id}/edit')
+
+    assert response.status_code == 200
+    assert re.search(r'id="stock_quantity"[^>]*value="3"', response.get_data(as_text=True))
+
+
+def test_admin_edit_form_for_digital_product_without_stock(admin, print_product):
+    print_product.digital_product = True
+    print_product.stock_quantity = None
+    db.session.commit()
+
+    response = admin.get(f'/admin/products/{print_product.id}/edit')
+
+    assert response.status_code == 200
+    assert 'no tienen límite de stock' in response.get_data(as_text=True)
+
+
+def test_admin_new_product_form(admin):
+    response = admin.get('/admin/products/new')
+
+    assert response.status_code == 200
+    assert b'Crear Producto' in response.data
+
+
+class ConcurrentConfig(TestingConfig):
+    CART_STORE = 'database'
+    METRICS_ENABLED = False
+    # One connection per checkout thread, as each gunicorn worker would have
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 32, 'max_overflow': 0}
+
+
+def test_concurrent_checkouts_never_oversell(tmp_path):
+    """The pytest form of benchmarks/stress_stock.py on a shared SQLite file."""
+    stock, threads = 3, 12
+
+    class Config(ConcurrentConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'stock.db')
+        CATALOG_GENERATION_FILE = str(tmp_path / 'catalog.generation')
+        STOCK_GENERATION_FILE = str(tmp_path / 'stock.generation')
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        product = Product(name='Limited print', price=40, image_url='x', category='print',
+                          digital_product=False, stock_quantity=stock)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+
+    clients = [app.test_client() for _ in range(threads)]
+    for client in clients:
+        client.post('/shop/add_to_cart', json={'product_id': product_id, 'quantity': 1})
+    barrier = threading.Barrier(threads)
+    statuses = []
+
+    def run(client):
+        barrier.wait()
+        statuses.append(client.post('/shop/create-payment-intent', json=CUSTOMER).status_code)
+
+    workers = [threading.Thread(target=run, args=(client,)) for client in clients]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    with app.app_context():
+        assert statuses.count(200) == stock
+        assert db.session.get(Product, product_id).stock_quantity == 0
+        assert held_quantity(product_id) == stock
+        db.engine.dispose()
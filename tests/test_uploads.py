@@ -0,0 +1,122 @@
+"""Customer images are streamed, type-checked by content and size-limited."""
+import io
+import os
+
+import pytest
+
+from app import db
+from models.blob import Blob
+from models.job import Job
+from services.uploads import MAX_SESSION_UPLOADS, UploadError, receive_image, sniff_image_type
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+def upload(client, data):
+    return client.post('/shop/upload-customer-image', data=data,
+                       content_type='application/octet-stream')
+
+
+@pytest.mark.parametrize('head, expected', [
+    (b'\xff\xd8\xff\xe0' + b'\x00' * 12, 'image/jpeg'),
+    (PNG[:16], 'image/png'),
+    (b'GIF89a' + b'\x00' * 10, 'image/gif'),
+    (b'RIFF\x00\x00\x00\x00WEBPVP8 ', 'image/webp'),
+    (b'<svg xmlns="http:', None),
+    (b'%PDF-1.7\n', None),
+])
+def test_sniffs_type_from_content(head, expected):
+    assert sniff_image_type(head) == expected
+
+
+def test_upload_returns_a_token_for_checkout(client):
+    response = upload(client, PNG)
+
+    assert response.status_code == 200
+    data = response.get_json()
+    blob = db.session.get(Blob, data['token'])
+    assert blob.content_type == 'image/png'
+    assert data['size'] == blob.size == len(PNG)
+    assert Job.query.filter_by(name='uploads.process').count() == 1
+
+
+@pytest.mark.parametrize('data', [
+    b'<html><script>alert(1)</script></html>',
+    b'GIF8',
+    b'',
+])
+def test_non_images_are_rejected(client, data):
+    response = upload(client, data)
+
+    assert response.status_code == 415
+    assert Blob.query.count() == 0
+
+
+def test_oversized_uploads_are_rejected_up_front(app, client):
+    app.config['CUSTOMER_IMAGE_MAX_SIZE'] = 32
+
+    response = upload(client, PNG)
+
+    assert response.status_code == 413
+    assert Blob.query.count() == 0
+
+
+def test_oversized_streams_are_cut_off_and_cleaned_up(app, tmp_path):
+    app.config.update(BLOB_STORE='local', CUSTOMER_IMAGE_MAX_SIZE=32)
+
+    with pytest.raises(UploadError) as exc_info:
+        receive_image(io.BytesIO(PNG))
+
+    assert exc_info.value.status == 413
+    assert os.listdir(tmp_path / 'blobs' / 'tmp') == []
+
+
+def test_checkout_rejects_tokens_from_other_sessions(app, client, catalog):
+    products, _ = catalog
+    token = upload(app.test_client(), PNG).get_json()['token']
+    client.post('/shop/add_to_cart', json={'product_id': products[1].id, 'quantity': 1})
+
+    response = client.post('/shop/create-payment-intent', json={
+        'name': 'Carla Cliente', 'email': 'carla@example.com', 'customer_image_token': token
+    })
+
+    assert response.status_code == 400
+    assert db.session.get(Blob, token).refcount == 0
+
+
+def test_uploads_are_rate_limited_per_client(app, client):
+    app.config['UPLOAD_RATE_LIMIT'] = (2, 3600)
+    for i in range(2):
+        assert upload(app.test_client(), PNG + bytes([i])).status_code == 200
+
+    response = upload(client, PNG + b'\x02')
+
+    assert response.status_code == 429
+    assert Blob.query.count() == 2
+
+
+def test_a_session_can_only_stage_a_few_unused_uploads(client):
+    for i in range(MAX_SESSION_UPLOADS):
+        assert upload(client, PNG + bytes([i])).status_code == 200
+
+    response = upload(client, PNG + b'\xff')
+
+    assert response.status_code == 429
+    assert Blob.query.count() == MAX_SESSION_UPLOADS
+
+
+def test_checkout_uses_up_the_upload_but_can_be_resubmitted(client, catalog):
+    products, _ = catalog
+    products[1].requires_image = True
+    db.session.commit()
+    token = upload(client, PNG).get_json()['token']
+    client.post('/shop/add_to_cart', json={'product_id': products[1].id, 'quantity': 1})
+    checkout = {'name': 'Carla Cliente', 'email': 'carla@example.com', 'customer_image_token': token}
+
+    first = client.post('/shop/create-payment-intent', json=checkout)
+    with client.session_transaction() as session:
+        assert token not in session['customer_uploads']
+    second = client.post('/shop/create-payment-intent', json=checkout)
+
+    assert first.status_code == second.status_code == 200
+    assert first.get_json()['order_id'] == second.get_json()['order_id']
@@ -0,0 +1,127 @@
+"""Stripe webhook ingestion: signed, deduplicated, applied in batches."""
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from app import db
+from models.order import Order
+from models.webhook import WebhookEvent
+from services.counters import dashboard_counters
+from services.webhooks import apply_pending_events
+
+
+def event(event_id, event_type, obj):
+    return json.dumps({'id': event_id, 'type': event_type, 'data': {'object': obj}})
+
+
+def paid(event_id, intent_id):
+    return event(event_id, 'payment_intent.succeeded', {'id': intent_id, 'object': 'payment_intent'})
+
+
+def refund(event_id, intent_id, amount, amount_refunded):
+    return event(event_id, 'charge.refunded', {
+        'id': f'ch_{event_id}', 'object': 'charge', 'payment_intent': intent_id,
+        'amount': amount, 'amount_refunded': amount_refunded, 'refunded': amount_refunded >= amount
+    })
+
+
+def post(client, payload, signature=None):
+    headers = {'Stripe-Signature': signature} if signature else {}
+    return client.post('/shop/webhook', data=payload, headers=headers, content_type='application/json')
+
+
+@pytest.fixture
+def order(app):
+    dashboard_counters()
+    order = Order(customer_name='Carla', customer_email='c@example.com', total_amount=40.0,
+                  stripe_payment_intent_id='pi_1')
+    db.session.add(order)
+    db.session.commit()
+    return order
+
+
+def test_redelivered_events_are_stored_once(client, order):
+    assert post(client, paid('evt_1', 'pi_1')).get_json()['result'] == 'stored'
+    assert post(client, paid('evt_1', 'pi_1')).get_json()['result'] == 'duplicate'
+
+    assert WebhookEvent.query.count() == 1
+
+
+def test_paid_event_applies_once(client, order):
+    post(client, paid('evt_1', 'pi_1'))
+    post(client, paid('evt_2', 'pi_1'))
+
+    assert apply_pending_events() == 2
+    assert apply_pending_events() == 0
+    db.session.refresh(order)
+    assert order.payment_status == 'paid'
+    assert dashboard_counters()['paid_orders'] == 1
+    assert dashboard_counters()['recent_revenue'] == 40.0
+
+
+def test_ignored_event_types_are_not_stored(client):
+    response = post(client, event('evt_x', 'customer.created', {'id': 'cus_1'}))
+
+    assert response.get_json()['result'] == 'ignored'
+    assert WebhookEvent.query.count() == 0
+
+
+def test_partial_refund_leaves_the_order_paid(client, order):
+    post(client, paid('evt_1', 'pi_1'))
+    post(client, refund('evt_2', 'pi_1', amount=4000, amount_refunded=1000))
+    apply_pending_events()
+
+    db.session.refresh(order)
+    assert order.payment_status == 'paid'
+    assert dashboard_counters()['recent_revenue'] == 40.0
+
+
+def test_full_refund_marks_the_order_refunded(client, order):
+    post(client, paid('evt_1', 'pi_1'))
+    apply_pending_events()
+    post(client, refund('evt_2', 'pi_1', amount=4000, amount_refunded=1000))
+    post(client, refund('evt_3', 'pi_1', amount=4000, amount_refunded=4000))
+    apply_pending_events()
+
+    db.session.refresh(order)
+    assert order.payment_status == 'refunded'
+    assert dashboard_counters()['recent_revenue'] == 0
+    assert dashboard_counters()['paid_orders'] == 0
+
+
+def test_events_for_unknown_orders_are_retried_then_dead_lettered(app, client):
+    app.config['WEBHOOK_MAX_ATTEMPTS'] = 2
+    post(client, paid('evt_1', 'pi_missing'))
+
+    assert apply_pending_events() == 0
+    stored = db.session.get(WebhookEvent, 'evt_1')
+    assert stored.processed_at is None
+    assert stored.retry_at is not None
+
+    stored.retry_at = None
+    db.session.commit()
+    assert apply_pending_events() == 0
+    db.session.refresh(stored)
+    assert stored.processed_at is not None
+    assert stored.last_error == 'No order for pi_missing'
+
+
+def test_signatures_are_verified_when_a_secret_is_set(app, client, order):
+    app.config['STRIPE_WEBHOOK_SECRET'] = 'whsec_test'
+    payload = paid('evt_1', 'pi_1')
+    timestamp = int(time.time())
+    digest = hmac.new(b'whsec_test', f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+
+    assert post(client, payload).status_code == 400
+    assert post(client, payload, f't={timestamp},v1={"0" * 64}').status_code == 400
+    assert post(client, payload, f't={timestamp},v1={digest}').status_code == 200
+
+
+def test_unsigned_events_are_rejected_without_a_secret_in_production(app, client):
+    app.config['TESTING'] = False
+    app.config['PAYMENT_GATEWAY'] = 'stripe'
+
+    assert post(client, paid('evt_1', 'pi_1')).status_code == 400